@@ -0,0 +1,121 @@
+"""Hit statistics of EXIF fallback backends, used to order the cascade in ExifData.get_exif_fallback."""
+import json
+import logging
+import os
+
+STATS_VERSION = 2
+MIN_CALLS = 50  # a backend is skipped only after this many calls for the key
+SKIP_RATE = 0.01  # ... and if it gave the date to fewer files
+EXPLORE_EVERY = 32  # every n-th file of a key runs all backends in default order
+
+
+class BackendStats:
+    """
+    For each (extension, file size bucket) count calls of backends and hits (the backend
+    gave the date or the screenshot flag). With 'adaptive' backends are tried by hit rate
+    and skipped if the rate is near zero, otherwise default order is kept.
+    Camera model is not a part of the key: the fallback runs only for files the native
+    header reader could not parse, so the model is not known yet.
+    Backends read different date tags, so with 'adaptive' the date (and the destination day)
+    of a file with several dates may depend on files processed before it.
+    """
+
+    def __init__(self, adaptive: bool = False):
+        self.adaptive = adaptive
+        # key -> backend name -> [calls, hits]
+        self._stats: dict[tuple, dict[str, list[int]]] = {}
+        self._delta: dict[tuple, dict[str, list[int]]] = {}
+        self._seen: dict[tuple, int] = {}
+
+    @staticmethod
+    def key(ext: str, size) -> tuple:
+        """Size buckets grow by 4 times: 16-64 B, 64-256 B, ..."""
+        return ext.lower(), int(size or 0).bit_length() // 2
+
+    def order(self, key: tuple, names: list[str]) -> list[str]:
+        """Backends to try for the key: by smoothed hit rate, without useless ones."""
+        stats = self._stats.get(key)
+        if not self.adaptive or not stats:
+            return names
+        seen = self._seen[key] = self._seen.get(key, 0) + 1
+        if seen % EXPLORE_EVERY == 0:
+            return names
+
+        def rate(name: str) -> float:
+            calls, hits = stats.get(name, (0, 0))
+            return (hits + 1) / (calls + 2)
+
+        def useless(name: str) -> bool:
+            calls, hits = stats.get(name, (0, 0))
+            return calls >= MIN_CALLS and hits < calls * SKIP_RATE
+
+        return [name for name in sorted(names, key=rate, reverse=True) if not useless(name)]
+
+    def record(self, key: tuple, name: str, hit: bool) -> None:
+        for stats in (self._stats, self._delta):
+            counts = stats.setdefault(key, {}).setdefault(name, [0, 0])
+            counts[0] += 1
+            counts[1] += hit
+
+    def counts(self) -> dict:
+        """Copy of all counts (sent to worker processes)."""
+        return {key: {name: list(counts) for name, counts in backends.items()} for key, backends in self._stats.items()}
+
+    def pop_delta(self) -> dict:
+        """Return counts recorded since the last call (sent by worker processes)."""
+        delta, self._delta = self._delta, {}
+        return delta
+
+    def merge(self, delta: dict) -> None:
+        for key, backends in delta.items():
+            for name, (calls, hits) in backends.items():
+                counts = self._stats.setdefault(key, {}).setdefault(name, [0, 0])
+                counts[0] += calls
+                counts[1] += hits
+
+    def to_dict(self) -> dict:
+        """Stats for inspection: keys with calls, hits and hit rate of backends."""
+        return {
+            'version': STATS_VERSION,
+            'stats': [
+                {
+                    'ext': key[0],
+                    'size_bucket': key[1],
+                    'backends': {
+                        name: {'calls': calls, 'hits': hits, 'hit_rate': round(hits / calls, 4) if calls else None}
+                        for name, (calls, hits) in backends.items()
+                    },
+                }
+                for key, backends in sorted(self._stats.items())
+            ],
+        }
+
+    def load(self, path: str) -> None:
+        """Add stats saved by 'save', missing or broken file is ignored."""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != STATS_VERSION:
+                return
+            for entry in data['stats']:
+                key = (entry['ext'], entry['size_bucket'])
+                self.merge({key: {name: (value['calls'], value['hits']) for name, value in entry['backends'].items()}})
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.error(f"backend stats: can't load {path} error: {e}")
+
+    def save(self, path: str) -> None:
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+    def reset(self, adaptive: bool = False) -> None:
+        self.adaptive = adaptive
+        self._stats = {}
+        self._delta = {}
+        self._seen = {}
+
+
+BACKEND_STATS = BackendStats()
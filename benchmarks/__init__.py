@@ -0,0 +1 @@
+"""Benchmarks of sort_files stages (run as 'python -m benchmarks.<name>')."""
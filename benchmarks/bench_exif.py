@@ -0,0 +1,65 @@
+"""Compare native EXIF header reader with the PIL/pyexiv2/exifread/piexif cascade."""
+import argparse
+import os
+import time
+
+import exif_utils
+from exif_utils import ExifData
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests')
+
+
+def _fixture_files(folder: str) -> list[str]:
+    return [
+        os.path.join(folder, name)
+        for name in sorted(os.listdir(folder))
+        if name.lower().endswith(exif_utils.NATIVE_EXTENSIONS)
+    ]
+
+
+def _cascade(file_path: str) -> ExifData:
+    """Old get_exif: every backend until one returns the date."""
+    exifdata = ExifData(file_path=file_path)
+    exifdata.get_exif_pil()
+    if exifdata.date is None:
+        exifdata.get_exif_pyexiv()
+    if exifdata.date is None:
+        exifdata.get_exif_exifread()
+    if exifdata.date is None:
+        exifdata.get_exif_piexif()
+    return exifdata
+
+
+def _native(file_path: str) -> ExifData:
+    exifdata = ExifData(file_path=file_path)
+    exifdata.get_exif_native()
+    return exifdata
+
+
+def _measure(func, files: list[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for file_path in files:
+            func(file_path)
+    return time.perf_counter() - start
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--folder', default=FIXTURES_FOLDER)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    files = _fixture_files(args.folder)
+    for file_path in files:
+        old, new = _cascade(file_path), _native(file_path)
+        print(f'{os.path.basename(file_path)}: cascade date={old.date}, native date={new.date}')
+
+    count = len(files) * args.repeat
+    for name, func in (('cascade', _cascade), ('native', _native)):
+        seconds = _measure(func, files, args.repeat)
+        print(f'{name:>8}: {count / seconds:10.1f} files/s ({seconds * 1000 / count:.3f} ms/file)')
+
+
+if __name__ == '__main__':
+    main()
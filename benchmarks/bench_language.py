@@ -0,0 +1,55 @@
+"""Compare langdetect path check with Unicode-script check used before pyexiv2."""
+import argparse
+import os
+import time
+
+from language_utils import contain_any, detect_languages, is_ascii_path
+
+FOLDERS = (
+    os.path.join('photos', '2019', 'summer trip'),
+    os.path.join('photos', 'Отпуск', 'море'),
+    os.path.join('camera', 'DCIM', '100APPLE'),
+)
+NAMES = ('IMG_{n:04d}.jpg', 'Фото_{n:04d}.jpg', 'DSC{n:05d}.JPG')
+CYR_LANG = ('bg', 'ru', 'uk', 'mk', 'et', 'me', 'sr')  # languages of the old check
+
+
+def _make_paths(files_per_folder: int) -> list[str]:
+    return [
+        os.path.join(folder, name.format(n=n))
+        for folder in FOLDERS
+        for name in NAMES
+        for n in range(files_per_folder)
+    ]
+
+
+def _langdetect(file_path: str) -> bool:
+    """Old check in ExifData.get_exif."""
+    path, file = os.path.split(file_path)
+    langs = []
+    langs.extend(detect_languages(file))
+    langs.extend(detect_languages(path))
+    return not contain_any(langs, CYR_LANG)
+
+
+def _measure(func, paths: list[str]) -> float:
+    start = time.perf_counter()
+    for file_path in paths:
+        func(file_path)
+    return time.perf_counter() - start
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files-per-folder', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    paths = _make_paths(args.files_per_folder)
+    for name, func in (('langdetect', _langdetect), ('script', is_ascii_path)):
+        func(paths[0])  # warm up (langdetect loads profiles on first call)
+        seconds = _measure(func, paths)
+        print(f'{name:>10}: {len(paths) / seconds:12.1f} paths/s ({seconds * 1e6 / len(paths):.1f} us/path)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Memory of per-file structures (tracemalloc bytes per file): scanned (path, file) tuples and
+full path strings against FileTable rows, ExifData records and the dedupe ContentIndex.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import tracemalloc
+
+from exif_utils import ExifData
+from hash_utils import ContentIndex
+from table_utils import FileTable
+
+FILES_PER_FOLDER = 200
+TARGET_FILES = 5_000_000  # memory of a run of this size is estimated from bytes per file
+
+
+def _make_names(files: int, seed: int = 0) -> list[tuple[str, str]]:
+    """(folder, name) of a source tree, files of a folder share its path string."""
+    rng = random.Random(seed)
+    names = []
+    folder = None
+    for n in range(files):
+        if n % FILES_PER_FOLDER == 0:
+            folder = os.path.join('/media', 'source', f'{2000 + rng.randrange(25)}', f'DCIM_{n // FILES_PER_FOLDER:05d}')
+        names.append((folder, f'IMG_{rng.randrange(10 ** 8):08d}.JPG'))
+    return names
+
+
+def _tuples(names):
+    # a name of the listing stays alive with the tuple, so it is copied here to be counted
+    return [(folder, name.encode().decode()) for folder, name in names]
+
+
+def _paths(names):
+    return [os.path.join(folder, name) for folder, name in names]
+
+
+def _table(names):
+    table = FileTable()
+    for folder, name in names:
+        table.add(folder, name)
+    return table
+
+
+def _exif_data(names):
+    rng = random.Random(1)
+    return [
+        ExifData(
+            file_path=os.path.join(folder, name),
+            file_ext='.JPG',
+            file_type='photo',
+            date=1_500_000_000 + rng.randrange(10 ** 8),
+            height=3024,
+            width=4032,
+            brand='Apple',
+            model='iPhone 12 Pro',
+            lens='iPhone 12 Pro back camera',
+            size=rng.randrange(10 ** 6, 10 ** 7),
+            is_screenshot=False,
+        )
+        for folder, name in names
+    ]
+
+
+def _content_index(names):
+    rng = random.Random(2)
+    content = ContentIndex()
+    for folder, name in names:
+        content.add(os.path.join(folder, name), rng.randrange(10 ** 6, 10 ** 7))
+    return content
+
+
+STRUCTURES = (
+    ('tuples', _tuples),
+    ('paths', _paths),
+    ('file_table', _table),
+    ('exif_data', _exif_data),
+    ('content_index', _content_index),
+)
+
+
+def measure(files: int) -> dict:
+    """Bytes per file of each structure built from 'files' names."""
+    names = _make_names(files)
+    results = {}
+    for label, build in STRUCTURES:
+        gc.collect()
+        tracemalloc.start()
+        value = build(names)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del value
+        results[label] = {
+            'bytes_per_file': round(size / files, 1),
+            'estimated_mb': round(size / files * TARGET_FILES / 1024 / 1024),
+        }
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=200_000)
+    parser.add_argument('--output', help='write results JSON to the file')
+    args = parser.parse_args(argv)
+
+    results = measure(args.files)
+    for label, result in results.items():
+        print(f'{label:>14}: {result["bytes_per_file"]:8.1f} B/file, {result["estimated_mb"]} MB for {TARGET_FILES} files')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
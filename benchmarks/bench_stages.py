@@ -0,0 +1,248 @@
+"""
+Time sort stages separately on a synthetic (or given) corpus: scan, get_exif per backend,
+make_timestamp, make_new_path, duplicate checks (names and content) and moves. Report files/s and peak RSS
+as JSON and compare them with a saved baseline.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from itertools import islice
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import config
+import exif_utils
+import timestamp_utils
+from benchmarks.corpus import make_corpus
+from exif_utils import ExifData
+from fs_utils import FolderIndex, MoveEngine, duples_in_folder, make_sidecar_index, move_files, walk_folders
+from hash_utils import ContentIndex
+from table_utils import FileTable
+
+BACKENDS = (
+    ('native', 'get_exif_native', ('.jpg', '.tiff')),
+    ('pil', 'get_exif_pil', ('.jpg', '.png', '.tiff')),
+    ('pyexiv2', 'get_exif_pyexiv', ('.jpg', '.png', '.tiff')),
+    ('exifread', 'get_exif_exifread', ('.jpg', '.tiff')),
+    ('piexif', 'get_exif_piexif', ('.jpg', '.tiff')),
+    ('media', 'get_exif_media', ('.mp4', '.mov', '.avi', '.mp3', '.m4a')),
+    ('os', 'get_exif_os', config.SUPPORTED_EXTENSIONS),
+)
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of the process."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _stage(results: dict, name: str, func, count: int | None = None):
+    """Run 'func', store its time; 'count' is number of items (default is len of the result)."""
+    start = time.perf_counter()
+    value = func()
+    seconds = time.perf_counter() - start
+    if count is None:
+        count = len(value)
+    results[name] = {
+        'items': count,
+        'seconds': round(seconds, 4),
+        'files_per_sec': round(count / seconds, 1) if seconds else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    print(f'{name:>16}: {count:8d} items {seconds:8.3f} s {results[name]["files_per_sec"]} files/s')
+    return value
+
+
+class ScanResult:
+    """Scanned files in a FileTable with setting files index of each folder (by folder id)."""
+
+    def __init__(self):
+        self.table = FileTable()
+        self.sidecars: dict[int, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __iter__(self):
+        """Yield (path, file, sidecars) items."""
+        table = self.table
+        for row in range(len(table)):
+            yield table.folder(row), table.name(row), self.sidecars.get(table.row_folder_id(row), {})
+
+    def file_paths(self):
+        return map(self.table.path, range(len(self.table)))
+
+
+def _scan(top: str) -> ScanResult:
+    items = ScanResult()
+    for path, _, folder_files in walk_folders(top):
+        sidecars = make_sidecar_index(folder_files)
+        if sidecars:
+            items.sidecars[items.table.folder_id(path)] = sidecars
+        for file in folder_files:
+            if file.lower().endswith(config.SUPPORTED_EXTENSIONS):
+                items.table.add(path, file)
+    return items
+
+
+def _backend(method: str, file_paths) -> list[ExifData]:
+    result = []
+    for file_path in file_paths:
+        exifdata = ExifData(file_path=file_path, file_ext=os.path.splitext(file_path)[1])
+        getattr(exifdata, method)()
+        result.append(exifdata)
+    return result
+
+
+def _timestamps(values: list[str]) -> list:
+    timestamp_utils._make_timestamp.cache_clear()
+    return [timestamp_utils.make_timestamp(value) for value in values]
+
+
+def _new_paths(exifs: list[ExifData], result_path: str, index: FolderIndex) -> list[str]:
+    return [exifdata.make_new_path(path=result_path, index=index) for exifdata in exifs]
+
+
+def _duplicates(items: list, exifs: list[ExifData], new_paths: list[str], index: FolderIndex) -> list:
+    """Destinations of files (None for duplicates), planned files are added to the dry-run index."""
+    destinations = []
+    for (path, file, _), exifdata, new_path in zip(items, exifs, new_paths):
+        new_path, skip = duples_in_folder(new_path=new_path, file=file, file_exif=exifdata, index=index)
+        if skip:
+            destinations.append(None)
+        else:
+            index.add(new_path, file, source_path=os.path.join(path, file))
+            destinations.append(new_path)
+    return destinations
+
+
+def _dedupe(file_paths, exifs: list[ExifData]) -> int:
+    """Number of files with the same content as an earlier file (renamed duplicates)."""
+    content = ContentIndex()
+    found = 0
+    for file_path, exifdata in zip(file_paths, exifs):
+        if content.find(file_path, exifdata.size):
+            found += 1
+        else:
+            content.add(file_path, exifdata.size)
+    return found
+
+
+def _move(items: list, destinations: list, source_path: str, work_path: str) -> int:
+    """Move files (with setting files) of the work copy to planned destinations."""
+    moved = 0
+    index = FolderIndex()
+    with MoveEngine() as engine:
+        for (path, file, sidecars), new_path in zip(items, destinations):
+            if new_path is None:
+                continue
+            path = os.path.join(work_path, os.path.relpath(path, source_path))
+            new_path = os.path.join(work_path, os.path.relpath(new_path, source_path))
+            os.makedirs(new_path, exist_ok=True)
+            files = [file] + sidecars.get(os.path.splitext(file)[0], [])
+            if move_files(files=files, path=path, new_path=new_path, index=index, engine=engine):
+                moved += 1
+    return moved
+
+
+def run_stages(source_path: str, work_path: str, sample: int) -> dict:
+    """Time all stages on 'source_path', moves are done in its copy 'work_path'."""
+    results: dict = {}
+    items = _stage(results, 'scan', lambda: _scan(source_path))
+
+    for name, method, extensions in BACKENDS:
+        if name == 'pyexiv2' and not exif_utils.HAS_PYEXIV2:
+            continue
+        files = list(islice((path for path in items.file_paths() if path.lower().endswith(extensions)), sample))
+        exifs = _stage(results, f'exif:{name}', lambda: _backend(method, files))
+        results[f'exif:{name}']['hit_rate'] = round(sum(e.date is not None for e in exifs) / len(exifs), 3) if exifs else None
+
+    exifs = _stage(results, 'get_exif', lambda: [exif_utils.get_exif(file_path) for file_path in items.file_paths()])
+    values = [time.strftime('%Y:%m:%d %H:%M:%S', time.localtime(e.date)) for e in exifs if e.date]
+    _stage(results, 'make_timestamp', lambda: _timestamps(values))
+
+    # destination is planned inside the source, so the work copy gets the same layout
+    result_path = os.path.join(source_path, config.RESULT_FOLDER)
+    index = FolderIndex(dry_run=True)
+    new_paths = _stage(results, 'make_new_path', lambda: _new_paths(exifs, result_path, index))
+    destinations = _stage(results, 'duplicates', lambda: _duplicates(items, exifs, new_paths, index))
+    results['duplicates']['skipped'] = destinations.count(None)
+    found = _stage(results, 'dedupe', lambda: _dedupe(items.file_paths(), exifs), count=len(items))
+    results['dedupe']['found'] = found
+
+    shutil.copytree(source_path, work_path)
+    moved = _stage(results, 'move', lambda: _move(items, destinations, source_path, work_path), count=len(items))
+    results['move']['moved'] = moved
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Print speed of stages relative to the baseline, return stages slower than 1 - tolerance."""
+    slower = []
+    for name, stage in results['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if not base or not base.get('files_per_sec') or not stage.get('files_per_sec'):
+            continue
+        ratio = stage['files_per_sec'] / base['files_per_sec']
+        mark = ''
+        if ratio < 1 - tolerance:
+            slower.append(name)
+            mark = '  SLOWER'
+        print(f'{name:>16}: {ratio:6.2f}x of baseline ({base["files_per_sec"]} files/s){mark}')
+    if results.get('peak_rss_mb') and baseline.get('peak_rss_mb'):
+        print(f'{"peak RSS":>16}: {results["peak_rss_mb"]} MB, baseline {baseline["peak_rss_mb"]} MB')
+    return slower
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--corpus', help='existing source folder (default is a generated corpus)')
+    parser.add_argument('--files', type=int, default=5000, help='size of the generated corpus')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sample', type=int, default=1000, help='files per metadata backend')
+    parser.add_argument('--output', help='write results JSON to the file')
+    parser.add_argument('--baseline', help='results JSON to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown of a stage')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='sort_files_bench_') as temp_path:
+        source_path = args.corpus
+        corpus = None
+        if source_path is None:
+            source_path = os.path.join(temp_path, 'source')
+            corpus = make_corpus(source_path, args.files, seed=args.seed)
+        stages = run_stages(os.path.abspath(source_path), os.path.join(temp_path, 'work'), args.sample)
+
+    results = {
+        'files': stages['scan']['items'],
+        'corpus': corpus,
+        'python': sys.version.split()[0],
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': stages,
+    }
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        if slower:
+            sys.exit(f'slower than baseline: {", ".join(slower)}')
+
+
+if __name__ == '__main__':
+    main()
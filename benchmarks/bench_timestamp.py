@@ -0,0 +1,50 @@
+"""Throughput of make_timestamp: regex parser, fast path with memoization and batch API."""
+import argparse
+import random
+import time
+
+import timestamp_utils
+
+
+def _make_values(count: int, distinct: int) -> list[str]:
+    rng = random.Random(0)
+    pool = [
+        f'20{rng.randint(0, 23):02d}:{rng.randint(1, 12):02d}:{rng.randint(1, 28):02d} '
+        f'{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}'
+        for _ in range(distinct)
+    ]
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def _parse(values: list[str]) -> None:
+    for value in values:
+        timestamp_utils.parse_timestamp(value)
+
+
+def _single(values: list[str]) -> None:
+    timestamp_utils._make_timestamp.cache_clear()
+    for value in values:
+        timestamp_utils.make_timestamp(value)
+
+
+def _batch(values: list[str]) -> None:
+    timestamp_utils._make_timestamp.cache_clear()
+    timestamp_utils.make_timestamps(values)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=200000)
+    parser.add_argument('--distinct', type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    values = _make_values(args.count, args.distinct)
+    for name, func in (('regex', _parse), ('fast path', _single), ('batch', _batch)):
+        start = time.perf_counter()
+        func(values)
+        seconds = time.perf_counter() - start
+        print(f'{name:>10}: {len(values) / seconds:12.1f} values/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Synthetic source corpus: JPEGs with varied EXIF, PNG screenshots, files without EXIF,
+.AAE setting files, MP4 videos, renamed duplicates, Cyrillic and deep folders."""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import struct
+import time
+
+from PIL import Image
+
+from media_reader import MP4_EPOCH_OFFSET
+
+CAMERAS = (
+    ('Apple', 'iPhone 8'),
+    ('Apple', 'iPhone 12 Pro'),
+    ('Canon', 'Canon EOS 5D Mark III'),
+    ('NIKON CORPORATION', 'NIKON D750'),
+    ('samsung', 'SM-G991B'),
+    ('SONY', 'ILCE-7M3'),
+)
+FOLDER_NAMES = ('DCIM', '100APPLE', 'camera', 'backup', 'summer trip', 'phone', 'export', 'old')
+CYRILLIC_FOLDER_NAMES = ('Отпуск', 'Дача', 'Новый год', 'Фото с телефона')
+
+# share of each kind of file, the rest are JPEGs with EXIF
+KINDS = (
+    ('png_screenshot', 0.08),
+    ('no_exif', 0.08),
+    ('video', 0.04),
+    ('duplicate', 0.05),
+)
+SIDECAR_SHARE = 0.1  # JPEGs with .AAE setting file
+CYRILLIC_SHARE = 0.15  # folders with Cyrillic names
+
+AAE_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<plist version="1.0"><dict><key>adjustmentFormatIdentifier</key>'
+    '<string>com.apple.photo</string><key>adjustmentTimestamp</key><date>{date}</date></dict></plist>\n'
+)
+
+EXIF_IFD = 0x8769
+TAG_MAKE, TAG_MODEL, TAG_DATETIME = 0x010F, 0x0110, 0x0132
+TAG_DATETIME_ORIGINAL, TAG_USER_COMMENT = 0x9003, 0x9286
+TAG_WIDTH, TAG_HEIGHT = 0xA002, 0xA003
+
+
+def _exif_date(timestamp: int) -> str:
+    return time.strftime('%Y:%m:%d %H:%M:%S', time.localtime(timestamp))
+
+
+def _image(rng: random.Random, file_format: str, exif=None) -> bytes:
+    color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+    image = Image.new('RGB', (16, 16), color)
+    image.putpixel((rng.randrange(16), rng.randrange(16)), (255 - color[0], 255 - color[1], 255 - color[2]))
+    buffer = io.BytesIO()
+    if exif is None:
+        image.save(buffer, file_format)
+    else:
+        image.save(buffer, file_format, exif=exif)
+    return buffer.getvalue()
+
+
+def make_jpeg(rng: random.Random, timestamp: int) -> bytes:
+    """JPEG with camera make/model, dates and dimensions (some files have DateTime only)."""
+    brand, model = rng.choice(CAMERAS)
+    exif = Image.Exif()
+    exif[TAG_MAKE] = brand
+    exif[TAG_MODEL] = model
+    exif[TAG_DATETIME] = _exif_date(timestamp)
+    if rng.random() < 0.8:
+        exif_ifd = exif.get_ifd(EXIF_IFD)
+        exif_ifd[TAG_DATETIME_ORIGINAL] = _exif_date(timestamp)
+        exif_ifd[TAG_WIDTH] = 16
+        exif_ifd[TAG_HEIGHT] = 16
+    return _image(rng, 'JPEG', exif)
+
+
+def make_png_screenshot(rng: random.Random) -> bytes:
+    """PNG with UserComment 'Screenshot' in IFD0 (where PIL reads it)."""
+    exif = Image.Exif()
+    exif[TAG_USER_COMMENT] = 'Screenshot'
+    return _image(rng, 'PNG', exif)
+
+
+def make_mp4(timestamp: int) -> bytes:
+    """ftyp and moov/mvhd boxes, enough for media_reader."""
+    mvhd_data = struct.pack('>B3xLLLL', 0, timestamp + MP4_EPOCH_OFFSET, timestamp + MP4_EPOCH_OFFSET, 1000, 0)
+    mvhd = struct.pack('>L4s', 8 + len(mvhd_data), b'mvhd') + mvhd_data
+    moov = struct.pack('>L4s', 8 + len(mvhd), b'moov') + mvhd
+    ftyp = struct.pack('>L4s4sL4s', 20, b'ftyp', b'isom', 0, b'isom')
+    return ftyp + moov
+
+
+def _make_folders(rng: random.Random, count: int, depth: int) -> list[str]:
+    folders = ['']
+    while len(folders) < count:
+        parent = rng.choice(folders)
+        if parent.count(os.sep) + 1 >= depth:
+            continue
+        names = CYRILLIC_FOLDER_NAMES if rng.random() < CYRILLIC_SHARE else FOLDER_NAMES
+        folders.append(os.path.join(parent, f'{rng.choice(names)} {len(folders)}'))
+    return folders
+
+
+def make_corpus(root: str, files: int, depth: int = 6, files_per_folder: int = 50, seed: int = 0) -> dict[str, int]:
+    """Write 'files' media files (setting files are not counted) to 'root', return counts by kind."""
+    rng = random.Random(seed)
+    folders = _make_folders(rng, max(files // files_per_folder, 1), depth)
+    for folder in folders:
+        os.makedirs(os.path.join(root, folder), exist_ok=True)
+
+    counts = dict.fromkeys(('jpeg', 'sidecar') + tuple(kind for kind, _ in KINDS), 0)
+    written: list[str] = []
+    start = int(time.mktime((2005, 1, 1, 0, 0, 0, 0, 0, -1)))
+    for n in range(files):
+        folder = os.path.join(root, rng.choice(folders))
+        timestamp = start + rng.randrange(20 * 365 * 24 * 3600)
+        kind, choice = 'jpeg', rng.random()
+        for name, share in KINDS:
+            if choice < share:
+                kind = name
+                break
+            choice -= share
+        if kind == 'duplicate' and not written:
+            kind = 'jpeg'
+        counts[kind] += 1
+
+        if kind == 'duplicate':
+            # the same content under another name, usually in another folder
+            shutil.copy2(rng.choice(written), os.path.join(folder, f'copy_{n:07d}.jpg'))
+        elif kind == 'png_screenshot':
+            _write(os.path.join(folder, f'Screenshot_{n:07d}.png'), make_png_screenshot(rng))
+        elif kind == 'no_exif':
+            _write(os.path.join(folder, f'image_{n:07d}.jpg'), _image(rng, 'JPEG'))
+        elif kind == 'video':
+            _write(os.path.join(folder, f'VID_{n:07d}.mp4'), make_mp4(timestamp))
+        else:
+            file_path = os.path.join(folder, f'IMG_{n:07d}.jpg')
+            _write(file_path, make_jpeg(rng, timestamp))
+            written.append(file_path)
+            if rng.random() < SIDECAR_SHARE:
+                date = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
+                _write(os.path.join(folder, f'IMG_{n:07d}.AAE'), AAE_TEMPLATE.format(date=date).encode())
+                counts['sidecar'] += 1
+
+    counts['folders'] = len(folders)
+    return counts
+
+
+def _write(file_path: str, data: bytes) -> None:
+    with open(file_path, 'wb') as f:
+        f.write(data)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('root', help='folder of the corpus (created)')
+    parser.add_argument('--files', type=int, default=10000)
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--files-per-folder', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    counts = make_corpus(args.root, args.files, depth=args.depth, files_per_folder=args.files_per_folder, seed=args.seed)
+    print(json.dumps(counts, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
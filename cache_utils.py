@@ -0,0 +1,150 @@
+import logging
+import os
+import sqlite3
+import time
+
+from exif_utils import ExifData
+from similar_utils import HASH_EXTENSIONS
+
+CACHE_VERSION = 3  # 2: width and height are ints, 3: image_hash
+CACHE_MAX_ENTRIES = 2_000_000
+CACHE_BATCH_SIZE = 1000
+SQL_VARIABLES = 500  # parameters of one query, old SQLite allows 999
+
+FIELDS = (
+    'file_ext',
+    'file_type',
+    'date',
+    'height',
+    'width',
+    'brand',
+    'model',
+    'lens',
+    'size',
+    'is_screenshot',
+    'image_hash',
+)
+
+
+class ExifCache:
+    """
+    SQLite cache of ExifData (without OS date) keyed by
+    (path, size, mtime_ns, inode) of the file.
+    """
+
+    def __init__(self, path: str, max_entries: int = CACHE_MAX_ENTRIES, batch_size: int = CACHE_BATCH_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._puts: list[tuple] = []
+        self._touches: list[tuple] = []
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != CACHE_VERSION:
+            # readers changed, old values are not valid
+            self.connection.execute('DROP TABLE IF EXISTS exif')
+            self.connection.execute(f'PRAGMA user_version={CACHE_VERSION}')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS exif ('
+            'path TEXT PRIMARY KEY, st_size INTEGER, mtime_ns INTEGER, inode INTEGER, '
+            f'{", ".join(FIELDS)}, last_used INTEGER)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS exif_last_used ON exif (last_used)')
+        self.connection.commit()
+        # kept up to date by flush, the table is not counted again
+        self._count = self.connection.execute('SELECT COUNT(*) FROM exif').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def key(file_path: str) -> tuple | None:
+        """Stat identity of the file."""
+        try:
+            stat = os.stat(file_path)
+        except OSError as e:
+            logging.error(f"cache: can't stat file {file_path}\nerror: {e}")
+            return None
+        return file_path, stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+    def get(self, key: tuple, image_hash: bool = False) -> ExifData | None:
+        """Return cached exif of the file or None (also if 'image_hash' is needed but not saved)."""
+        row = self.connection.execute(
+            f'SELECT {", ".join(FIELDS)} FROM exif WHERE path=? AND st_size=? AND mtime_ns=? AND inode=?',
+            key,
+        ).fetchone()
+        if row is None or (image_hash and self._needs_hash(row)):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._touches.append((int(time.time()), key[0]))
+        if len(self._touches) >= self.batch_size:
+            self.flush()
+
+        exifdata = ExifData(file_path=key[0], **dict(zip(FIELDS, row)))
+        if exifdata.is_screenshot is not None:
+            exifdata.is_screenshot = bool(exifdata.is_screenshot)
+        return exifdata
+
+    @staticmethod
+    def _needs_hash(row: tuple) -> bool:
+        """Entry was saved without image hash, which is read only when it is needed."""
+        values = dict(zip(FIELDS, row))
+        return (
+            values['image_hash'] is None
+            and values['file_type'] == 'photo'
+            and values['file_ext'].lower() in HASH_EXTENSIONS
+        )
+
+    def put(self, key: tuple, exifdata: ExifData) -> None:
+        """Queue exif of the file to be saved with the next batch."""
+        self._puts.append((*key, *(exifdata[field] for field in FIELDS), int(time.time())))
+        if len(self._puts) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write queued values, drop least recently used entries over 'max_entries'."""
+        # the last value of a path wins, as with INSERT OR REPLACE one by one
+        puts = list({row[0]: row for row in self._puts}.values())
+        with self.connection:
+            if puts:
+                self._count += len(puts) - self._count_existing([row[0] for row in puts])
+                self.connection.executemany(
+                    f'INSERT OR REPLACE INTO exif VALUES ({", ".join("?" * (len(FIELDS) + 5))})',
+                    puts,
+                )
+            if self._touches:
+                self.connection.executemany('UPDATE exif SET last_used=? WHERE path=?', self._touches)
+            if self._count > self.max_entries:
+                self.connection.execute(
+                    'DELETE FROM exif WHERE path IN '
+                    '(SELECT path FROM exif ORDER BY last_used LIMIT ?)',
+                    (self._count - self.max_entries,),
+                )
+                self._count = self.max_entries
+        self._puts = []
+        self._touches = []
+
+    def _count_existing(self, paths: list[str]) -> int:
+        """Number of the paths already in the table (primary key lookups)."""
+        count = 0
+        for start in range(0, len(paths), SQL_VARIABLES):
+            chunk = paths[start:start + SQL_VARIABLES]
+            count += self.connection.execute(
+                f'SELECT COUNT(*) FROM exif WHERE path IN ({", ".join("?" * len(chunk))})', chunk
+            ).fetchone()[0]
+        return count
+
+    def close(self) -> None:
+        """Flush and close the database."""
+        self.flush()
+        self.connection.close()
+        logging.info(f'EXIF cache {self.path}: {self.hits} hits, {self.misses} misses')
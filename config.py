@@ -9,7 +9,6 @@ SETTING_EXTENSIONS = ('.AAE', '.aae', '.THM', '.thm')
 
 FIND_SETS_FILES = True  # example .AAE, .THM
 GROUP_NO_EXIF = True  # /result/no_exif
-CYR_LANG = ['bg', 'ru', 'uk', 'mk', 'et', 'me', 'sr']
 
 SCREENSHOTS_FOLDER = 'screenshots'
 NO_EXIF_FOLDER = 'no_exif'
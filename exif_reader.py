@@ -0,0 +1,229 @@
+"""Single-pass reader of EXIF/XMP headers of JPEG and TIFF files."""
+import re
+import struct
+
+JPEG_SOI = b'\xff\xd8'
+TIFF_HEADERS = (b'II*\x00', b'MM\x00*')
+EXIF_HEADER = b'Exif\x00\x00'
+XMP_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+
+MAX_HEADER_BYTES = 256 * 1024  # stop looking for APP1 segments after this offset
+MAX_IFD_ENTRIES = 1024
+MAX_VALUE_BYTES = 64 * 1024
+
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_DATETIME = 0x0132
+TAG_XMP = 0x02BC
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_DATETIME_DIGITIZED = 0x9004
+TAG_USER_COMMENT = 0x9286
+TAG_PIXEL_X = 0xA002
+TAG_PIXEL_Y = 0xA003
+TAG_LENS_MODEL = 0xA434
+
+IFD0_TAGS = (TAG_MAKE, TAG_MODEL, TAG_DATETIME, TAG_XMP, TAG_EXIF_IFD)
+EXIF_IFD_TAGS = (
+    TAG_DATETIME_ORIGINAL,
+    TAG_DATETIME_DIGITIZED,
+    TAG_USER_COMMENT,
+    TAG_PIXEL_X,
+    TAG_PIXEL_Y,
+    TAG_LENS_MODEL,
+)
+DATE_TAGS = (TAG_DATETIME, TAG_DATETIME_ORIGINAL, TAG_DATETIME_DIGITIZED)
+
+# type: (size of one value, struct format or None for raw bytes)
+TIFF_TYPES = {
+    1: (1, 'B'),
+    2: (1, None),
+    3: (2, 'H'),
+    4: (4, 'L'),
+    7: (1, None),
+    9: (4, 'l'),
+}
+
+XMP_USER_COMMENT = re.compile(
+    r'exif:UserComment(?:\s*=\s*"([^"]*)"|\s*>(.*?)</exif:UserComment>)', re.DOTALL
+)
+
+
+class ExifHeader:
+    """Tags of the header needed by ExifData."""
+
+    __slots__ = ('dates', 'brand', 'model', 'width', 'height', 'lens', 'user_comment', 'xmp')
+
+    def __init__(self):
+        self.dates: list[str] = []
+        self.brand = None
+        self.model = None
+        self.width = None
+        self.height = None
+        self.lens = None
+        self.user_comment = None
+        self.xmp = None
+
+    def is_screenshot(self) -> bool:
+        """Check UserComment of EXIF and XMP for 'screenshot'."""
+        comments = [self.user_comment]
+        if self.xmp:
+            for match in XMP_USER_COMMENT.finditer(self.xmp):
+                comments.extend(match.groups())
+        return any(comment and 'screenshot' in comment.lower() for comment in comments)
+
+
+def read_exif_header(file_path: str) -> ExifHeader | None:
+    """
+    Read EXIF tags of JPEG (APP1) or TIFF file in one pass.
+    Return None if the file format is not supported or the header is broken.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(4)
+            if head[:2] == JPEG_SOI:
+                f.seek(2)
+                return _read_jpeg(f)
+            if head in TIFF_HEADERS:
+                return _read_tiff(_file_reader(f), ExifHeader())
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
+
+    return None
+
+
+def _read_jpeg(f) -> ExifHeader | None:
+    """
+    Walk JPEG markers up to the image data, parse Exif and XMP APP1 segments.
+    Return None if there is no such segment or the image data is not reached in MAX_HEADER_BYTES.
+    """
+    header = ExifHeader()
+    parsed = False
+    while True:
+        if f.tell() >= MAX_HEADER_BYTES:
+            # big segments (ICC profiles, previews) before APP1: left to library backends
+            return None
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError('bad JPEG marker')
+        code = marker[1]
+        while code == 0xFF:  # fill bytes
+            code = f.read(1)[0]
+        if code in (0xD9, 0xDA):  # EOI, SOS - image data starts
+            break
+        if code == 0x01 or 0xD0 <= code <= 0xD7:  # markers without length
+            continue
+
+        length = struct.unpack('>H', f.read(2))[0] - 2
+        if length < 0:
+            raise ValueError('bad JPEG segment length')
+        if code != 0xE1:
+            f.seek(length, 1)
+            continue
+
+        data = f.read(length)
+        if data.startswith(EXIF_HEADER):
+            tiff = memoryview(data)[len(EXIF_HEADER):]
+            _read_tiff(lambda offset, size: bytes(tiff[offset:offset + size]), header)
+            parsed = True
+        elif data.startswith(XMP_HEADER):
+            header.xmp = data[len(XMP_HEADER):].decode('utf-8', 'ignore')
+            parsed = True
+
+    return header if parsed else None
+
+
+def _file_reader(f):
+    """Return read_at(offset, size) function for TIFF file."""
+
+    def read_at(offset: int, size: int) -> bytes:
+        f.seek(offset)
+        return f.read(size)
+
+    return read_at
+
+
+def _read_tiff(read_at, header: ExifHeader) -> ExifHeader:
+    """Parse IFD0 and Exif IFD of TIFF structure."""
+    head = read_at(0, 8)
+    if head[:4] not in TIFF_HEADERS:
+        raise ValueError('bad TIFF header')
+    order = '<' if head[:2] == b'II' else '>'
+    ifd0_offset = struct.unpack(f'{order}L', head[4:8])[0]
+
+    ifd0 = _read_ifd(read_at, order, ifd0_offset, IFD0_TAGS)
+    exif_ifd = {}
+    if isinstance(ifd0.get(TAG_EXIF_IFD), int):
+        exif_ifd = _read_ifd(read_at, order, ifd0[TAG_EXIF_IFD], EXIF_IFD_TAGS)
+    tags = {**ifd0, **exif_ifd}
+
+    for tag in DATE_TAGS:
+        value = _to_str(tags.get(tag))
+        if value:
+            header.dates.append(value)
+
+    header.brand = _to_str(tags.get(TAG_MAKE))
+    header.model = _to_str(tags.get(TAG_MODEL))
+    header.lens = _to_str(tags.get(TAG_LENS_MODEL))
+    header.width = tags.get(TAG_PIXEL_X)
+    header.height = tags.get(TAG_PIXEL_Y)
+    header.user_comment = _user_comment(tags.get(TAG_USER_COMMENT), order)
+    if isinstance(tags.get(TAG_XMP), bytes):
+        header.xmp = tags[TAG_XMP].decode('utf-8', 'ignore')
+
+    return header
+
+
+def _read_ifd(read_at, order: str, offset: int, wanted: tuple) -> dict:
+    """Read values of 'wanted' tags from IFD at 'offset'."""
+    count = struct.unpack(f'{order}H', read_at(offset, 2))[0]
+    if count > MAX_IFD_ENTRIES:
+        raise ValueError(f'too many IFD entries: {count}')
+
+    entries = read_at(offset + 2, count * 12)
+    if len(entries) < count * 12:
+        raise ValueError('truncated IFD')
+
+    tags = {}
+    for n in range(count):
+        tag, tag_type, value_count = struct.unpack_from(f'{order}HHL', entries, n * 12)
+        if tag not in wanted or tag_type not in TIFF_TYPES:
+            continue
+
+        type_size, fmt = TIFF_TYPES[tag_type]
+        size = type_size * value_count
+        if size > MAX_VALUE_BYTES:
+            continue
+        if size <= 4:
+            raw = entries[n * 12 + 8:n * 12 + 8 + size]
+        else:
+            value_offset = struct.unpack_from(f'{order}L', entries, n * 12 + 8)[0]
+            raw = read_at(value_offset, size)
+
+        if fmt is None:
+            tags[tag] = raw
+        elif value_count:
+            tags[tag] = struct.unpack_from(f'{order}{fmt}', raw)[0]
+
+    return tags
+
+
+def _to_str(value) -> str | None:
+    """Decode ASCII value of a tag."""
+    if not isinstance(value, bytes):
+        return None
+    value = value.split(b'\x00', 1)[0]
+    try:
+        return value.decode('utf-8')
+    except UnicodeDecodeError:
+        return value.decode('MacCyrillic')
+
+
+def _user_comment(value, order: str) -> str | None:
+    """Decode UserComment (8 bytes of character code and text)."""
+    if not isinstance(value, bytes):
+        return None
+    code, text = value[:8], value[8:]
+    if code.startswith(b'UNICODE'):
+        return text.decode('utf-16-le' if order == '<' else 'utf-16-be', 'ignore')
+    return text.decode('utf-8', 'ignore')
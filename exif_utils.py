@@ -1,6 +1,11 @@
 import logging
+import multiprocessing
 import os
 import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from typing import Iterable, Iterator
 
 import exifread
 import piexif
@@ -17,8 +22,14 @@ except Exception as e:
     logging.warning(f'win32com is not available, skip Windows metadata reader: {e}')
 
 import config
-from language_utils import contain_any, detect_languages
-from timestamp_utils import make_timestamp
+from backend_utils import BACKEND_STATS
+from exif_reader import read_exif_header
+from filename_utils import CROSS_CHECK_SECONDS, NAME_CROSS_CHECK, NAME_PRIMARY, parse_names
+from language_utils import is_ascii_path
+from media_reader import read_media_dates
+from metrics_utils import METRICS
+from similar_utils import HASH_EXTENSIONS, image_hash
+from timestamp_utils import make_timestamp, make_timestamps
 
 try:
     from pyexiv2 import Image as pyexiv2_Image
@@ -30,15 +41,235 @@ except Exception as e:  # библиотека может отсутствова
 import fs_utils
 
 
-def get_exif(file_path: str, ext=None):
-    """Return exif of file."""
+EXIF_BATCH_SIZE = 64
+NATIVE_EXTENSIONS = ('.jpg', '.tiff')
+
+
+def get_exif(file_path: str, ext=None, name_dates=None):
+    """Return exif of file, dates of the file name are used by 'name_dates' mode as in iter_exif."""
+    if name_dates:
+        return next(iter_exif([file_path], name_dates=name_dates))
     exifdata = ExifData(file_path=file_path, file_ext=ext)
     exifdata.get_exif()
     return exifdata
 
 
+def iter_exif(
+    file_paths: Iterable[str],
+    jobs: int = 1,
+    cache=None,
+    name_dates=None,
+    image_hash: bool = False,
+    executor: ProcessPoolExecutor | None = None,
+) -> Iterator['ExifData']:
+    """
+    Yield exif of files in input order, parse them in 'jobs' processes
+    (of 'executor' made by exif_executor if it is set, e.g. kept by the watch daemon).
+    Files found in 'cache' (cache_utils.ExifCache) are not opened.
+    Dates and screenshot flags of file names (filename_utils.NAME_MODES of 'name_dates') are used
+    instead of EXIF ('primary', such files are not opened), when EXIF has no date ('fallback')
+    or are compared with EXIF dates ('cross-check').
+    """
+    for exifdata in _iter_exif_tags(
+        file_paths, jobs=jobs, cache=cache, name_dates=name_dates, image_hash=image_hash, executor=executor
+    ):
+        if not config.GROUP_NO_EXIF:
+            exifdata.read_backend('os', exifdata.get_exif_os)
+        yield exifdata
+
+
+def exif_jobs(jobs: int | None) -> int:
+    """Number of EXIF processes, 0 or less is the number of CPUs."""
+    if jobs is not None and jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs or 1
+
+
+# workers are started on demand, while scanner, copy and metrics threads run: a forked worker
+# may get a lock held by one of them (METRICS, logging) and hang, so workers start clean
+EXIF_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def exif_executor(jobs: int | None) -> ProcessPoolExecutor | None:
+    """
+    Pool of EXIF worker processes for iter_exif, None if files are read in this process.
+    Workers get config and backend stats of the moment the pool is made,
+    the metrics switch is sent with each batch (metrics may be enabled later).
+    """
+    jobs = exif_jobs(jobs)
+    if jobs == 1:
+        return None
+    settings = {'GROUP_NO_EXIF': config.GROUP_NO_EXIF}
+    initargs = (settings, BACKEND_STATS.adaptive, BACKEND_STATS.counts())
+    return ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=multiprocessing.get_context(EXIF_START_METHOD),
+        initializer=_init_worker,
+        initargs=initargs,
+    )
+
+
+def _iter_exif_tags(
+    file_paths: Iterable[str],
+    jobs: int,
+    cache,
+    name_dates=None,
+    image_hash: bool = False,
+    executor: ProcessPoolExecutor | None = None,
+) -> Iterator['ExifData']:
+    """Yield exif (without OS date) of files in input order."""
+    jobs = exif_jobs(jobs)
+    if executor is not None:
+        yield from _iter_pool_batches(file_paths, jobs, executor, cache, name_dates, image_hash)
+        return
+    if jobs == 1:
+        read_batch = partial(_get_exif_batch, image_hash=image_hash)
+        for file_path in file_paths:
+            yield from _get_cached_batch([file_path], cache, read_batch, name_dates, image_hash)
+        return
+
+    with exif_executor(jobs) as executor:
+        yield from _iter_pool_batches(file_paths, jobs, executor, cache, name_dates, image_hash)
+
+
+def _iter_pool_batches(
+    file_paths: Iterable[str], jobs: int, executor, cache, name_dates=None, image_hash: bool = False
+) -> Iterator['ExifData']:
+    """Read batches of files by 'executor' processes, yield exif in input order."""
+    read_batch = partial(
+        executor.submit, _get_exif_batch_worker, image_hash=image_hash, metrics_enabled=METRICS.enabled
+    )
+    pending = deque()
+    for batch in _batches(file_paths, EXIF_BATCH_SIZE):
+        pending.append(_get_cached_batch(batch, cache, read_batch, name_dates, image_hash))
+        # keep a bounded number of batches in flight
+        if len(pending) >= jobs * 4:
+            yield from pending.popleft()
+    while pending:
+        yield from pending.popleft()
+
+
+def _get_cached_batch(
+    file_paths: list[str], cache, read_batch, name_dates=None, image_hash: bool = False
+) -> Iterator['ExifData']:
+    """
+    Take exif of files from their names ('name_dates' is 'primary') or from cache and read the rest
+    by 'read_batch' (returns list or Future of (list, worker state: metrics and backend stats)).
+    With 'image_hash' photos need image hashes, cached entries and names without them are read.
+    Reading starts before the first next(). Names of the batch are parsed in one pass.
+    """
+    name_list = parse_names(map(os.path.basename, file_paths)) if name_dates else [None] * len(file_paths)
+    found = [
+        _exif_from_name(file_path, name_date, image_hash)
+        if name_dates == NAME_PRIMARY and name_date is not None
+        else None
+        for file_path, name_date in zip(file_paths, name_list)
+    ]
+    keys = [
+        cache.key(file_path) if cache is not None and exifdata is None else None
+        for file_path, exifdata in zip(file_paths, found)
+    ]
+    found = [
+        cache.get(key, image_hash) if key is not None else exifdata
+        for key, exifdata in zip(keys, found)
+    ]
+    missed = [file_path for file_path, exifdata in zip(file_paths, found) if exifdata is None]
+    result = read_batch(missed) if missed else []
+
+    def merge() -> Iterator['ExifData']:
+        batch = result
+        if isinstance(result, Future):
+            batch, state = result.result()
+            if state['metrics'] is not None:
+                METRICS.merge(state['metrics'])
+            BACKEND_STATS.merge(state['backends'])
+        read = iter(batch)
+        for key, exifdata, name_date in zip(keys, found, name_list):
+            if exifdata is None:
+                exifdata = next(read)
+                if key is not None:
+                    cache.put(key, exifdata)
+            if name_date is not None:
+                exifdata.apply_name_date(name_date, name_dates)
+            yield exifdata
+
+    return merge()
+
+
+def _exif_from_name(file_path: str, name_date: tuple, image_hash: bool = False) -> 'ExifData | None':
+    """Exif of a file by its name, None if the file must be opened anyway (image hash)."""
+    exifdata = ExifData(file_path=file_path)
+    exifdata.set_file_type()
+    if image_hash and exifdata.needs_image_hash():
+        return None
+    exifdata.get_size_os()
+    exifdata.apply_name_date(name_date, NAME_PRIMARY)
+    METRICS.count('exif.name')
+    return exifdata
+
+
+def _init_worker(settings: dict, adaptive: bool = False, backend_counts=None) -> None:
+    """Copy parent config and backend stats to a worker process (needed for 'spawn')."""
+    for key, value in settings.items():
+        setattr(config, key, value)
+    BACKEND_STATS.reset(adaptive)
+    if backend_counts:
+        BACKEND_STATS.merge(backend_counts)
+
+
+def _get_exif_batch(file_paths: list[str], image_hash: bool = False) -> list['ExifData']:
+    """Return exif (without OS date) of files, with 'image_hash' hashes of photos; runs in a worker process."""
+    result = []
+    for file_path in file_paths:
+        exifdata = ExifData(file_path=file_path)
+        exifdata.get_exif_tags()
+        if image_hash and exifdata.needs_image_hash():
+            exifdata.read_backend('dhash', exifdata.get_image_hash)
+        result.append(exifdata)
+    return result
+
+
+def _get_exif_batch_worker(
+    file_paths: list[str], image_hash: bool = False, metrics_enabled: bool = False
+) -> tuple[list['ExifData'], dict]:
+    """Return exif of files, metrics and backend stats of the batch (merged by the parent process)."""
+    if METRICS.enabled != metrics_enabled:
+        METRICS.enable(metrics_enabled)
+    result = _get_exif_batch(file_paths, image_hash)
+    return result, {'metrics': METRICS.pop() if METRICS.enabled else None, 'backends': BACKEND_STATS.pop_delta()}
+
+
+def _batches(items: Iterable, size: int) -> Iterator[list]:
+    """Split iterable to lists of 'size' elements."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+INT_FIELDS = ('width', 'height', 'size')
+
+
+def _to_int(value) -> int | None:
+    """Number of a tag value (int, numeric string or library tag object), None if it is not a number."""
+    if isinstance(value, int):
+        return value
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        return None
+
+
 class ExifData:
-    """Abstract dict-like class for EXIF data."""
+    """
+    Dict-like record of EXIF data, slotted without '__dict__' to stay small;
+    'date', 'width', 'height' and 'size' are ints, 'image_hash' is similar_utils.image_hash
+    of photos (only when iter_exif is asked for it).
+    """
 
     __slots__ = (
         'file_path',
@@ -52,7 +283,7 @@ class ExifData:
         'lens',
         'size',
         'is_screenshot',
-        '__dict__',
+        'image_hash',
     )
 
     def __init__(
@@ -68,6 +299,7 @@ class ExifData:
         lens=None,
         size=None,
         is_screenshot=None,
+        image_hash=None,
     ):
         self.file_path = file_path
         self.file_ext = file_ext
@@ -80,13 +312,14 @@ class ExifData:
         self.lens = lens
         self.size = size
         self.is_screenshot = is_screenshot
+        self.image_hash = image_hash
 
     def __repr__(self):
         return (
             f'{type(self).__name__}({repr(self.file_path)}, {repr(self.file_ext)}, '
             f'{repr(self.file_type)}, {repr(self.date)}, {repr(self.height)}, '
             f'{repr(self.width)}, {repr(self.brand)}, {repr(self.model)}, '
-            f'{repr(self.lens)}, {repr(self.size)}, {repr(self.is_screenshot)})'
+            f'{repr(self.lens)}, {repr(self.size)}, {repr(self.is_screenshot)}, {repr(self.image_hash)})'
         )
 
     def __getitem__(self, key):
@@ -104,6 +337,13 @@ class ExifData:
         elif key == 'is_screenshot':
             if not self.is_screenshot:
                 self.is_screenshot = value
+        elif key in INT_FIELDS:
+            value = _to_int(value)
+            if value is not None:
+                last = self[key]
+                if last is not None and last != value:
+                    logging.warning(f'change {key} from {last} to {value}')
+                self[key] = value
         else:
             last = self[key]
             if last is not None and last != value:
@@ -112,10 +352,43 @@ class ExifData:
             self[key] = value
 
     def get_exif(self):
+        """Custom exif information, if not GROUP_NO_EXIF add date from OS."""
+        self.get_exif_tags()
+        if not config.GROUP_NO_EXIF:
+            self.read_backend('os', self.get_exif_os)
+
+    def read_backend(self, name: str, read):
+        """Call backend 'read', with metrics count its time and whether it gave the date."""
+        if not METRICS.enabled:
+            return read()
+        had_date = self.date is not None
+        with METRICS.timer(f'exif.{name}'):
+            value = read()
+        if not had_date and self.date is not None:
+            METRICS.count(f'exif.{name}.date')
+        return value
+
+    def get_exif_tags(self):
         """
-        Custom exif information by
-        pyexiv2, PIL, exifread and piexif libraries.
+        Custom exif information by native header reader (JPEG, TIFF),
+        falls back to PIL, pyexiv2, exifread and piexif libraries (see get_exif_fallback).
         """
+        self.set_file_type()
+        ext = self.file_ext.lower()
+        self.get_size_os()
+        if self.file_type == 'photo':
+            if int(self.size or 0) > 15 and not (
+                ext in NATIVE_EXTENSIONS and self.read_backend('native', self.get_exif_native)
+            ):
+                self.get_exif_fallback(ext)
+
+        elif self.file_type in ('video', 'audio'):
+            self.read_backend('media', self.get_exif_media)
+            if self.date is None and HAS_WIN32COM:
+                self.read_backend('win32com', self.get_exif_win32com)
+
+    def set_file_type(self):
+        """File type by extension."""
         if self.file_ext is None:
             f, self.file_ext = os.path.splitext(self.file_path)
 
@@ -129,32 +402,75 @@ class ExifData:
         else:
             self.file_type = 'other'
 
-        self.get_size_os()
-        if self.file_type == 'photo':
-            if int(self.size) > 15:
-                self.get_exif_pil()
-                if self.date is None and ext not in ('.gif',):
-                    path, file = os.path.split(self.file_path)
-
-                    langs = []
-                    langs.extend(detect_languages(file))
-                    langs.extend(detect_languages(path))
-                    if not contain_any(langs, config.CYR_LANG):
-                        # pyexiv2 can't open files with cyrillic paths
-                        self.get_exif_pyexiv()
-
-                if self.date is None and ext not in ('.png',):
-                    self.get_exif_exifread()
-
-                if self.date is None and ext in ('.jpg', '.tiff'):
-                    self.get_exif_piexif()
-
-        elif self.file_type in ('video', 'audio'):
-            if HAS_WIN32COM:
-                self.get_exif_win32com()
+    def apply_name_date(self, name_date: tuple, mode: str):
+        """
+        Use (date, is screenshot) of the file name (filename_utils.parse_name) by 'mode':
+        name date replaces EXIF date ('primary'), is used without EXIF date ('fallback') or is only
+        compared with EXIF date ('cross-check'). Screenshot flag of the name is set in all modes.
+        """
+        date, is_screenshot = name_date
+        if is_screenshot:
+            self.change_value('is_screenshot', True)
+        if date is None:
+            return
+        if mode == NAME_PRIMARY or self.date is None:
+            self.date = date
+        elif mode == NAME_CROSS_CHECK and abs(self.date - date) > CROSS_CHECK_SECONDS:
+            METRICS.count('exif.name.mismatch')
+            logging.warning(f'name date {date} of {self.file_path} differs from EXIF date {self.date}')
 
-        if not config.GROUP_NO_EXIF:
-            self.get_exif_os()
+    def get_exif_fallback(self, ext: str):
+        """
+        Run library backends until one gives the date. Default order is PIL, pyexiv2,
+        exifread, piexif; adaptive BACKEND_STATS reorders them by hit rate of similar files.
+        """
+        backends = {'pil': self.get_exif_pil}
+        if HAS_PYEXIV2 and ext not in ('.gif',) and is_ascii_path(self.file_path):
+            # pyexiv2 can't open files with cyrillic (non-ASCII) paths
+            backends['pyexiv2'] = self.get_exif_pyexiv
+        if ext not in ('.png',):
+            backends['exifread'] = self.get_exif_exifread
+        if ext in ('.jpg', '.tiff'):
+            backends['piexif'] = self.get_exif_piexif
+
+        key = BACKEND_STATS.key(ext, self.size)
+        for name in BACKEND_STATS.order(key, list(backends)):
+            is_screenshot = self.is_screenshot
+            self.read_backend(name, backends[name])
+            BACKEND_STATS.record(key, name, self.date is not None or self.is_screenshot != is_screenshot)
+            if self.date is not None:
+                break
+
+    def get_exif_native(self) -> bool:
+        """
+        Get exif by built-in JPEG/TIFF header reader, return False if the file is not supported
+        or its header gave no date (library backends are tried then).
+        """
+        header = read_exif_header(self.file_path)
+        if header is None:
+            return False
+
+        for value in make_timestamps(header.dates):
+            self.change_value('date', value)
+        if header.is_screenshot():
+            self.change_value('is_screenshot', True)
+        if header.brand is not None:
+            self.change_value('brand', header.brand)
+        if header.model is not None:
+            self.change_value('model', header.model)
+        if header.width is not None:
+            self.change_value('width', header.width)
+        if header.height is not None:
+            self.change_value('height', header.height)
+        if header.lens is not None:
+            self.change_value('lens', header.lens)
+
+        return self.date is not None
+
+    def get_exif_media(self):
+        """Get date of media files (video, audio) from MP4/MOV/M4A, AVI and MP3 headers."""
+        for value in read_media_dates(self.file_path):
+            self.change_value('date', value)
 
     def get_exif_win32com(self):
         """Get exif for media files (video, audio) by win32com."""
@@ -218,10 +534,10 @@ class ExifData:
                         self.change_value('model', str(value))
                     elif tag == 'Exif.Photo.PixelXDimension':
                         value = tags.get(tag)
-                        self.change_value('width', str(value))
+                        self.change_value('width', value)
                     elif tag == 'Exif.Photo.PixelYDimension':
                         value = tags.get(tag)
-                        self.change_value('height', str(value))
+                        self.change_value('height', value)
                     elif tag == 'Exif.Photo.LensModel':
                         value = tags.get(tag)
                         self.change_value('lens', str(value))
@@ -256,10 +572,10 @@ class ExifData:
                     self.change_value('model', str(value))
                 elif tag == 'EXIF ExifImageWidth':
                     value = tags.get(tag)
-                    self.change_value('width', str(value))
+                    self.change_value('width', value)
                 elif tag == 'EXIF ExifImageLength':
                     value = tags.get(tag)
-                    self.change_value('height', str(value))
+                    self.change_value('height', value)
                 elif tag == 'EXIF LensModel':
                     value = tags.get(tag)
                     self.change_value('lens', str(value))
@@ -309,9 +625,9 @@ class ExifData:
                     elif tag == 'Model':
                         self.change_value('model', str(value))
                     elif tag == 'PixelXDimension':
-                        self.change_value('width', str(value))
+                        self.change_value('width', value)
                     elif tag == 'PixelYDimension':
-                        self.change_value('height', str(value))
+                        self.change_value('height', value)
                     elif tag == 'LensModel':
                         self.change_value('lens', str(value))
 
@@ -350,9 +666,9 @@ class ExifData:
                     elif tag == 'Model':
                         self.change_value('model', str(value))
                     elif tag == 'ExifImageWidth':
-                        self.change_value('width', str(value))
+                        self.change_value('width', value)
                     elif tag == 'ExifImageHeight':
-                        self.change_value('height', str(value))
+                        self.change_value('height', value)
                     elif tag == 'LensModel':
                         self.change_value('lens', str(value))
 
@@ -367,9 +683,25 @@ class ExifData:
         except Exception as e:
             logging.error(f"OS: can't open file {self}\nerror: {e}")
 
+    def needs_image_hash(self) -> bool:
+        """Photo of a format with image hash (similar_utils.HASH_EXTENSIONS)."""
+        if self.file_type is None:
+            self.set_file_type()
+        return self.file_type == 'photo' and self.file_ext.lower() in HASH_EXTENSIONS
+
+    def get_image_hash(self):
+        """Get perceptual hash of the image (near-duplicates, see similar_utils)."""
+        try:
+            self.image_hash = image_hash(self.file_path)
+        except Exception as e:
+            logging.error(f"dhash: can't read image {self}\nerror: {e}")
+
     def get_size_os(self):
-        """Get data from OS (size)."""
-        self.change_value('size', int(os.path.getsize(self.file_path)))
+        """Get data from OS (size), the file may be removed or renamed since it was found."""
+        try:
+            self.change_value('size', int(os.path.getsize(self.file_path)))
+        except OSError as e:
+            logging.error(f"OS: can't open file {self}\nerror: {e}")
 
     def is_same_with(self, file_exif):
         """Compare 2 exif."""
@@ -387,22 +719,22 @@ class ExifData:
 
         return False
 
-    def make_new_path(self, path):
-        """Custom creation a directory."""
+    def make_new_path(self, path, index=None):
+        """Custom creation a directory, 'index' is fs_utils.FolderIndex of the sort run."""
         if self.is_screenshot:
-            path = fs_utils.make_new_folder(path=path, folder_name=config.SCREENSHOTS_FOLDER)
+            path = fs_utils.make_new_folder(path=path, folder_name=config.SCREENSHOTS_FOLDER, index=index)
         else:
             if self.date:
                 try:
                     struct_time = time.localtime(self.date)
                     n = 0
                     while n < 3:
-                        path = fs_utils.make_new_folder(path=path, folder_name=struct_time[n])
+                        path = fs_utils.make_new_folder(path=path, folder_name=struct_time[n], index=index)
                         n += 1
                 except Exception as e:
                     logging.info(f'Error in make_new_path: {self} error: {e}')
 
             else:
-                path = fs_utils.make_new_folder(path=path, folder_name=config.NO_EXIF_FOLDER)
+                path = fs_utils.make_new_folder(path=path, folder_name=config.NO_EXIF_FOLDER, index=index)
 
         return path
@@ -0,0 +1,92 @@
+"""
+Dates and screenshot flags from file names of cameras, phones and messengers
+('IMG_20190312_143501.jpg', 'VID-20200101-WA0003.mp4', 'Screenshot_2021-05-04-10-20-30.png'),
+no file is opened.
+"""
+import datetime
+import re
+import time
+from typing import Iterable
+
+from timestamp_utils import DATE_START
+
+NAME_PRIMARY = 'primary'  # name date is used instead of EXIF, files with it are not opened
+NAME_FALLBACK = 'fallback'  # name date is used when EXIF has no date
+NAME_CROSS_CHECK = 'cross-check'  # EXIF date is used, mismatching name dates are logged
+NAME_MODES = (NAME_PRIMARY, NAME_FALLBACK, NAME_CROSS_CHECK)
+CROSS_CHECK_SECONDS = 24 * 3600  # names without time give midnight, times may be in another zone
+
+NAME_PREFIXES = (
+    'img', 'vid', 'pxl', 'mvimg', 'pano', 'burst', 'photo', 'video', 'image', 'movie',
+    'whatsapp image', 'whatsapp video', 'signal', 'telegram', 'snapchat', 'camera',
+)
+SCREENSHOT_PREFIXES = (
+    'screenshot', 'screen shot', 'screenshots', 'screen recording', 'screenrecorder', 'screenrecord',
+    'скриншот', 'снимок экрана',
+)
+_PREFIXES = {prefix: False for prefix in NAME_PREFIXES} | {prefix: True for prefix in SCREENSHOT_PREFIXES}
+# one pattern for all known names: prefix, date with or without separators, optional time
+NAME_PATTERN = re.compile(
+    r'(?P<prefix>[^\W\d_]+(?:[ _-][^\W\d_]+)*)?[ _-]?'
+    r'(?P<year>(?:19|20)\d\d)(?P<sep>[-_.]?)(?P<month>\d\d)(?P=sep)(?P<day>\d\d)'
+    r'(?:(?:[ _T-]|[ _](?:at|в)[ _])(?P<hour>\d{1,2})[-_.:]?(?P<minute>\d\d)[-_.:]?(?P<second>\d\d)'
+    r'(?: ?(?P<ampm>[AP]M)\b)?)?',
+    re.IGNORECASE,
+)
+SCREENSHOT_PATTERN = re.compile(rf'(?:{"|".join(map(re.escape, SCREENSHOT_PREFIXES))})(?![^\W\d_])', re.IGNORECASE)
+
+
+def parse_name(name: str) -> tuple[int | None, bool] | None:
+    """
+    (timestamp or None, is screenshot) of the file name, None if the name is not known.
+    Names without a prefix are accepted only with a valid date and time ('20190312_143501.jpg'),
+    names with an unknown prefix ('Holiday_20190312_143501.jpg') are always rejected.
+    An impossible time after a valid date ('IMG_20190312_996612.jpg') gives midnight of the date.
+    """
+    match = NAME_PATTERN.match(name)
+    if match is None:
+        return (None, True) if SCREENSHOT_PATTERN.match(name) else None
+
+    prefix = match['prefix']
+    if prefix is None:
+        if match['hour'] is None:
+            return None
+        is_screenshot = False
+    else:
+        # 'Screen_Shot', 'whatsapp-image' are the same prefixes
+        is_screenshot = _PREFIXES.get(prefix.lower().replace('_', ' ').replace('-', ' '))
+        if is_screenshot is None:
+            return (None, True) if SCREENSHOT_PATTERN.match(name) else None
+    # without a prefix only a valid time tells a date from other digits
+    date = _timestamp(match, need_time=prefix is None)
+    if date is None and not is_screenshot:
+        return None
+    return date, is_screenshot
+
+
+def parse_names(names: Iterable[str]) -> list[tuple[int | None, bool] | None]:
+    """parse_name of many names (a batch of scanned files)."""
+    return [parse_name(name) for name in names]
+
+
+def _timestamp(match: re.Match, need_time: bool = False) -> int | None:
+    hour = int(match['hour'] or 0)
+    if match['ampm'] is not None:
+        hour = hour % 12 + (12 if match['ampm'].upper() == 'PM' else 0)
+    try:
+        date_value = datetime.datetime(int(match['year']), int(match['month']), int(match['day']))
+    except ValueError:
+        # digits of a counter, not a date
+        return None
+    try:
+        date_value = date_value.replace(
+            hour=hour, minute=int(match['minute'] or 0), second=int(match['second'] or 0)
+        )
+    except ValueError:
+        # a counter after the date ('IMG_20190312_996612'), the date is kept
+        if need_time:
+            return None
+    date_stamp = int(date_value.timestamp())
+    if date_stamp < DATE_START or date_stamp > time.time() + CROSS_CHECK_SECONDS:
+        return None
+    return date_stamp
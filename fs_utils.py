@@ -1,56 +1,428 @@
+import errno
 import logging
 import os
 import shutil
-from typing import Iterable
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 import config
 from language_utils import contain_any
+from metrics_utils import METRICS
+
+MOVE_WORKERS = 4
+
+# how files are placed to the result folder, all but 'move' keep the source
+MODE_MOVE = 'move'
+MODE_COPY = 'copy'
+MODE_LINK = 'link'
+MODE_REFLINK = 'reflink'
+MODES = (MODE_MOVE, MODE_COPY, MODE_LINK, MODE_REFLINK)
+
+FICLONE = getattr(fcntl, 'FICLONE', 0x40049409)  # _IOW(0x94, 9, int), fcntl.FICLONE is Python 3.12+
+# link or clone is not possible on these file systems or devices, the file is copied
+FALLBACK_ERRORS = (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS)
+# hardlinks are not supported (FAT, some network shares), rename_file checks the name instead
+NO_LINK_ERRORS = (errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP, errno.ENOSYS)
+
 
+def walk_folders(top: str, on_error=None) -> Iterator[tuple[str, list[str], list[str]]]:
+    """
+    os.walk on os.scandir (top-down): yield (path, folder names, file names).
+    Folders that can't be listed are logged and passed to 'on_error(path, error)'.
+    """
+    folders = [top]
+    while folders:
+        path = folders.pop()
+        sub_folders: list[str] = []
+        folder_files: list[str] = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        sub_folders.append(entry.name)
+                    else:
+                        folder_files.append(entry.name)
+        except OSError as e:
+            logging.error(f"can't scan {path} error: {e}")
+            if on_error is not None:
+                on_error(path, e)
+            continue
+
+        yield path, sub_folders, folder_files
+        folders.extend(os.path.join(path, name) for name in reversed(sub_folders))
+
+
+def make_sidecar_index(folder_files: Iterable[str]) -> dict[str, list[str]]:
+    """Map file stem to setting files (SETTING_EXTENSIONS) of one folder listing."""
+    index: dict[str, list[str]] = {}
+    if config.FIND_SETS_FILES:
+        for name in folder_files:
+            file_name, file_ext = os.path.splitext(name)
+            if file_ext in config.SETTING_EXTENSIONS:
+                index.setdefault(file_name, []).append(name)
 
-def make_files_list(file: str, path: str) -> list[str]:
-    """Make file list, if FIND_SETS_FILES add setting files."""
+    return index
+
+
+def make_files_list(file: str, path: str, sidecars: dict[str, list[str]] | None = None) -> list[str]:
+    """
+    Make file list, if FIND_SETS_FILES add setting files.
+    'sidecars' is make_sidecar_index of the folder, without it the folder is listed.
+    """
     files = [file]
     if config.FIND_SETS_FILES:
         file_name, file_ext = os.path.splitext(file)
-        folder_elements = os.listdir(path)
-        temp_files = []
-        for temp_ext in config.SETTING_EXTENSIONS:
-            temp_files.append(''.join((file_name, temp_ext)))
-        temp_files = list(set(temp_files) & set(folder_elements))
-        if temp_files:
-            files.extend(temp_files)
+        if sidecars is None:
+            sidecars = make_sidecar_index(os.listdir(path))
+        files.extend(sidecars.get(file_name, ()))
 
     return files
 
 
-def move_files(files: list, path: str, new_path: str) -> bool:
-    """Move files to 'new_path' directory."""
+def move_files(
+    files: list,
+    path: str,
+    new_path: str,
+    index: 'FolderIndex | None' = None,
+    journal=None,
+    engine: 'MoveEngine | None' = None,
+    cleaner: 'FolderCleaner | None' = None,
+    on_placed=None,
+) -> bool:
+    """
+    Move files to 'new_path' directory, write moves to 'journal' (journal_utils.MoveJournal),
+    count them out of the source folder in 'cleaner'.
+    With 'engine' cross-device moves run in its thread pool and may finish later:
+    True means the moves are started, 'on_placed' is called when the first of 'files' is in place.
+    """
     ans = False
-    exist_folder_elements = get_folder_elements(new_path)
+    if index is not None:
+        exist_folder_elements = index.names(new_path)
+    else:
+        exist_folder_elements = get_folder_elements(new_path)
 
-    for file in files:
+    for n, file in enumerate(files):
         if file.lower() not in exist_folder_elements:
             file_path = os.path.join(path, file)
+            new_file_path = os.path.join(new_path, file)
+            if index is not None and index.dry_run:
+                index.add(new_path, file, source_path=file_path)
+                if n == 0 and on_placed is not None:
+                    on_placed()
+                ans = True
+                continue
             try:
-                shutil.move(file_path, new_path)
+                if journal is not None:
+                    journal.intent(file_path, new_file_path)
+                on_done = _moved_callback(journal, cleaner, file_path, new_file_path, on_placed if n == 0 else None)
+                if METRICS.enabled:
+                    METRICS.count('bytes_moved', os.path.getsize(file_path))
+                with METRICS.timer('move'):
+                    if engine is not None:
+                        engine.move(file_path, new_file_path, on_done=on_done)
+                    else:
+                        shutil.move(file_path, new_path)
+                        if on_done is not None:
+                            on_done()
                 ans = True
+                if index is not None:
+                    # the name is taken while a copy is pending, see duples_in_folder
+                    index.add(new_path, file)
+            except FileExistsError as e:
+                # written by another process after the folder was listed, it is kept
+                logging.error(f"can't move files {files} to {new_path}, the name is taken: {e}")
+                if index is not None:
+                    index.add(new_path, file)
             except OSError as e:
                 logging.error(f"can't move files {files} to {new_path} error: {e}")
 
     return ans
 
 
-def make_new_folder(path: str, folder_name: str):
+def rename_file(src: str, dst: str) -> None:
+    """
+    Rename the file without replacing 'dst' (os.rename replaces it on POSIX), FileExistsError if it exists.
+    The name is taken by a hardlink, so a file created there meanwhile is never lost;
+    without hardlinks the name is checked before os.rename.
+    """
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno not in NO_LINK_ERRORS:
+            raise
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst) from e
+        os.rename(src, dst)
+        return
+    try:
+        os.unlink(src)
+    except OSError:
+        os.unlink(dst)
+        raise
+
+
+def _moved_callback(journal, cleaner: 'FolderCleaner | None', src: str, dst: str, on_placed=None):
+    """Called when the file is in place: write the journal and release the source entry."""
+    if journal is None and cleaner is None and on_placed is None:
+        return None
+
+    def on_done():
+        if journal is not None:
+            journal.done(src, dst)
+        if cleaner is not None:
+            cleaner.release(os.path.dirname(src))
+        if on_placed is not None:
+            on_placed()
+
+    return on_done
+
+
+class MoveEngine:
+    """
+    Place files to the result folder by 'mode' (MODES):
+    'move' renames files on the same device, cross-device files are copied and
+    only then the source is removed; 'link' makes hardlinks, 'reflink' clones
+    file extents (FICLONE on btrfs, XFS), 'copy' copies. Links and clones are
+    metadata operations done in the calling thread, where the file system can't
+    do them the file is copied. Copies (copy_file_range/sendfile, metadata preserved)
+    run in a bounded thread pool, or in the calling thread with 'sync', and are
+    optionally verified by size. Destinations of pending copies are kept until
+    the copy ends, 'wait' blocks on them. A file is never placed over an existing
+    one (see rename_file): a name taken after the folder was listed fails with FileExistsError.
+    """
+
+    def __init__(self, workers: int = MOVE_WORKERS, verify: bool = False, mode: str = MODE_MOVE, sync: bool = False):
+        if mode not in MODES:
+            raise ValueError(f'unknown mode {mode}, expected one of {MODES}')
+        self.verify = verify
+        self.mode = mode
+        self.sync = sync
+        self.bytes_copied = 0
+        self.linked = 0
+        self.fallbacks = 0
+        self.errors = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='move')
+        self._slots = threading.BoundedSemaphore(max(workers, 1) * 2)
+        self._lock = threading.Lock()
+        self._pending: dict[str, threading.Event] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def move(self, src: str, dst: str, on_done=None) -> None:
+        """Place file by the engine mode, 'on_done' is called when the file is in place."""
+        try:
+            if self.mode == MODE_MOVE:
+                rename_file(src, dst)
+            elif self.mode == MODE_LINK:
+                os.link(src, dst)
+            elif self.mode == MODE_REFLINK:
+                reflink_file(src, dst)
+        except OSError as e:
+            if self.mode == MODE_MOVE:
+                if e.errno != errno.EXDEV:
+                    raise
+            elif e.errno in FALLBACK_ERRORS:
+                self._fallback(src, e)
+            else:
+                raise
+        else:
+            if self.mode in (MODE_LINK, MODE_REFLINK):
+                with self._lock:
+                    self.linked += 1
+            if self.mode != MODE_COPY:
+                if on_done is not None:
+                    on_done()
+                return
+
+        if self.sync:
+            self._copy(src, dst, on_done)
+            return
+        self._slots.acquire()
+        with self._lock:
+            self._pending[dst] = threading.Event()
+        future = self._executor.submit(self._copy, src, dst, on_done)
+        future.add_done_callback(lambda _: self._slots.release())
+
+    def wait(self, dst: str) -> bool:
+        """Wait for a pending copy to 'dst', return True if the file is in place."""
+        with self._lock:
+            pending = self._pending.get(dst)
+        if pending is not None:
+            pending.wait()
+        return os.path.exists(dst)
+
+    def _fallback(self, src: str, error: OSError) -> None:
+        with self._lock:
+            self.fallbacks += 1
+            first = self.fallbacks == 1
+        # logged once, the rest of the files of the device would fail the same way
+        if first:
+            logging.warning(f"{self.mode}: can't place {src} ({error}), files are copied instead")
+        METRICS.count(f'{self.mode}_fallbacks')
+
+    def _copy(self, src: str, dst: str, on_done) -> None:
+        """Copy file to 'dst' (through a temporary file), remove the source in 'move' mode."""
+        try:
+            self._copy_file(src, dst, on_done)
+        finally:
+            with self._lock:
+                pending = self._pending.pop(dst, None)
+            if pending is not None:
+                pending.set()
+
+    def _copy_file(self, src: str, dst: str, on_done) -> None:
+        temp_path = f'{dst}.part'
+        try:
+            with METRICS.timer('move.copy'):
+                size = copy_file(src, temp_path)
+            if self.verify and os.stat(temp_path).st_size != os.stat(src).st_size:
+                raise OSError(f'size of copy {temp_path} differs from {src}')
+            rename_file(temp_path, dst)
+            if self.mode == MODE_MOVE:
+                os.unlink(src)
+        except OSError as e:
+            logging.error(f"can't move {src} to {dst} error: {e}")
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            with self._lock:
+                self.errors += 1
+            return
+
+        with self._lock:
+            self.bytes_copied += size
+        METRICS.count('bytes_copied', size)
+        if on_done is not None:
+            on_done()
+
+    def close(self) -> None:
+        """Wait for all copies."""
+        self._executor.shutdown(wait=True)
+
+
+def reflink_file(src: str, dst: str) -> None:
+    """Clone file extents (FICLONE ioctl, btrfs and XFS) and metadata, OSError if it is not supported."""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, 'reflink is not supported on this platform')
+    temp_path = f'{dst}.part'
+    try:
+        with open(src, 'rb') as fsrc, open(temp_path, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, temp_path)
+        rename_file(temp_path, dst)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def copy_file(src: str, dst: str) -> int:
+    """Copy file content with copy_file_range (sendfile in shutil as fallback) and metadata."""
+    size = os.stat(src).st_size
+    copied = False
+    if hasattr(os, 'copy_file_range'):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                offset = 0
+                while offset < size:
+                    sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+            copied = offset == size
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    if not copied:
+        shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
+    return size
+
+
+def make_new_folder(path: str, folder_name: str, index: 'FolderIndex | None' = None):
     """Custom creation a directory."""
     if folder_name is not None:
         folder_name = str(folder_name)
         path = os.path.join(path, folder_name)
-        if not os.path.exists(path):
+        if index is not None:
+            index.make_folder(path)
+        elif not os.path.exists(path):
             os.mkdir(path)
 
     return path
 
 
+class FolderCleaner:
+    """
+    Remaining entries (files and subfolders) of scanned source folders. A folder is
+    removed as soon as all its entries are moved out or removed, then its parent has
+    one entry less. The top folder is never removed.
+    """
+
+    def __init__(self, top: str):
+        self.top = top
+        self.removed = 0
+        self._remaining: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add_folder(self, path: str, entries: int) -> None:
+        """Register a scanned folder before its files are processed."""
+        if path == self.top:
+            return
+        with self._lock:
+            self._remaining[path] = entries
+        if not entries:
+            self.release(path, 0)
+
+    def release(self, path: str, count: int = 1) -> None:
+        """'count' entries left the folder (thread-safe, called by move threads)."""
+        while path != self.top:
+            with self._lock:
+                remaining = self._remaining.get(path)
+                if remaining is None:
+                    return
+                remaining -= count
+                if remaining > 0:
+                    self._remaining[path] = remaining
+                    return
+                del self._remaining[path]
+            try:
+                os.rmdir(path)
+            except OSError as e:
+                logging.error(f"can't remove folder {path} error: {e}")
+                with self._lock:
+                    self._remaining[path] = 0
+                return
+            with self._lock:
+                self.removed += 1
+            path, count = os.path.dirname(path), 1
+
+    def sweep(self) -> None:
+        """Try to remove counted folders bottom-up, they may be emptied by other processes."""
+        for path in sorted(self._remaining, key=len, reverse=True):
+            try:
+                os.rmdir(path)
+            except OSError:
+                continue
+            with self._lock:
+                self._remaining.pop(path, None)
+                self.removed += 1
+
+    def not_empty(self) -> list[tuple[str, int]]:
+        """Folders left in the source with their remaining entries."""
+        with self._lock:
+            return sorted(self._remaining.items())
+
+
 def remove_file(path: str) -> bool:
     """Custom remove a file."""
     answer = False
@@ -93,15 +465,88 @@ def get_folder_elements(path: str) -> list[str]:
     return temp_list
 
 
-def is_file_in_folder(file: str, path: str) -> bool:
+class FolderIndex:
+    """
+    Lowercase names of destination folders. Each folder is listed once on first
+    use, then the index is updated on moves and folder creation.
+    With 'dry_run' folders are not created and files are not moved, the index
+    remembers planned files and their source paths instead.
+    """
+
+    def __init__(self, dry_run: bool = False):
+        self.dry_run = dry_run
+        self._names: dict[str, set[str]] = {}
+        self._folders: set[str] = set()
+        self._planned: dict[str, str] = {}
+
+    def names(self, path: str) -> set[str]:
+        """Lowercase names of folder elements."""
+        names = self._names.get(path)
+        if names is None:
+            names = set(get_folder_elements(path)) if os.path.isdir(path) else set()
+            self._names[path] = names
+        return names
+
+    def add(self, path: str, name: str, source_path: str | None = None) -> None:
+        """Register new element of the folder, 'source_path' - where a planned file is now."""
+        self.names(path).add(name.lower())
+        if source_path is not None:
+            self._planned[os.path.join(path, name.lower())] = source_path
+
+    def resolve(self, path: str, name: str) -> str:
+        """Current path of the folder element (source path for planned files)."""
+        return self._planned.get(os.path.join(path, name.lower()), os.path.join(path, name))
+
+    def discard(self, path: str, name: str) -> None:
+        """Remove element of the folder (it was not placed)."""
+        self.names(path).discard(name.lower())
+
+    def contains(self, path: str, name: str) -> bool:
+        """Check file in folder."""
+        return name.lower() in self.names(path)
+
+    def forget(self, path: str) -> None:
+        """Drop the cached listing, the folder is listed again on next use."""
+        self._names.pop(path, None)
+
+    def make_folder(self, path: str) -> None:
+        """Create a directory if it is not known yet."""
+        if path in self._folders:
+            return
+        if not os.path.exists(path):
+            try:
+                if not self.dry_run:
+                    os.mkdir(path)
+                self._names[path] = set()
+            except FileExistsError:
+                pass  # created by another sort process
+        parent, name = os.path.split(path)
+        if parent in self._names:
+            self._names[parent].add(name.lower())
+        self._folders.add(path)
+
+
+def is_file_in_folder(file: str, path: str, index: FolderIndex | None = None) -> bool:
     """Check file in folder."""
+    if index is not None:
+        return index.contains(path, file)
     folder_elements = get_folder_elements(path=path)
     files: Iterable[str] = (file, file.lower())
     return contain_any(files, folder_elements)
 
 
-def duples_in_folder(new_path: str, file: str, file_exif=None):
-    """What to do if file exist in folder."""
+def duples_in_folder(
+    new_path: str,
+    file: str,
+    file_exif=None,
+    index: FolderIndex | None = None,
+    name_dates=None,
+    engine: MoveEngine | None = None,
+):
+    """
+    What to do if file exist in folder, exif of the existing file is read as of the new one ('name_dates').
+    A pending copy of the existing file in 'engine' is waited for, a failed one frees the name.
+    """
     # Local import to avoid circular dependency.
     from exif_utils import get_exif
 
@@ -109,16 +554,23 @@ def duples_in_folder(new_path: str, file: str, file_exif=None):
     if file_exif is None:
         skip = True
     else:
-        if is_file_in_folder(file=file, path=new_path):
-            exist_file_path = os.path.join(new_path, file)
-            exist_file_exif = get_exif(file_path=exist_file_path)
+        if is_file_in_folder(file=file, path=new_path, index=index):
+            if index is not None:
+                exist_file_path = index.resolve(new_path, file)
+            else:
+                exist_file_path = os.path.join(new_path, file)
+            if engine is not None and not engine.wait(exist_file_path):
+                if index is not None:
+                    index.discard(new_path, file)
+                return new_path, skip
+            exist_file_exif = get_exif(file_path=exist_file_path, name_dates=name_dates)
 
             if file_exif.is_same_with(exist_file_exif):
                 skip = True
             else:
                 file_name, file_ext = os.path.splitext(file)
-                new_path = make_new_folder(path=new_path, folder_name=file_name)
-                if is_file_in_folder(file=file, path=new_path):
+                new_path = make_new_folder(path=new_path, folder_name=file_name, index=index)
+                if is_file_in_folder(file=file, path=new_path, index=index):
                     skip = True
 
     return new_path, skip
@@ -1,11 +1,13 @@
 import os
 import sys
+import threading
 from typing import Iterable
 
 from PyQt6 import QtCore, QtWidgets
 
 import config
 import version
+from progress_utils import SortProgress
 from sorter import sort_files
 
 
@@ -32,29 +34,47 @@ def _normalize_extensions(raw: str, default: Iterable[str]) -> tuple[str, ...]:
     return tuple(ordered)
 
 
-def _parse_csv(raw: str) -> list[str]:
-    """Split comma/semicolon separated strings, strip empties."""
-    return [part.strip() for part in raw.replace(';', ',').split(',') if part.strip()]
+def _format_progress(progress: SortProgress) -> str:
+    text = (
+        f'Найдено: {progress.scanned}, обработано: {progress.extracted}, перемещено: {progress.moved}, '
+        f'дублей: {progress.duplicates}, ошибок: {progress.errors}'
+    )
+    if progress.files_per_sec:
+        text += f', {progress.files_per_sec} файлов/с'
+    return text
 
 
 class SortWorker(QtCore.QThread):
-    finished = QtCore.pyqtSignal()
+    """Run sort_files in a thread, counters come by 'progress' signal (SortProgress) from the thread."""
+
+    progress = QtCore.pyqtSignal(object)
+    finished = QtCore.pyqtSignal(object)
     failed = QtCore.pyqtSignal(str)
 
     def __init__(self, source_path: str, result_path: str):
         super().__init__()
         self.source_path = source_path
         self.result_path = result_path
+        self.stop_event = threading.Event()
+
+    def cancel(self) -> None:
+        """Stop after the current file, 'finished' is emitted with cancelled result."""
+        self.stop_event.set()
 
     def run(self) -> None:
         try:
             if not os.path.exists(self.result_path):
                 os.makedirs(self.result_path, exist_ok=True)
-            sort_files(source_path=self.source_path, result_path=self.result_path)
+            result = sort_files(
+                source_path=self.source_path,
+                result_path=self.result_path,
+                progress=self.progress.emit,
+                stop_event=self.stop_event,
+            )
         except Exception as exc:  # noqa: BLE001
             self.failed.emit(str(exc))
         else:
-            self.finished.emit()
+            self.finished.emit(result)
 
 
 class SortFilesWindow(QtWidgets.QMainWindow):
@@ -89,7 +109,6 @@ class SortFilesWindow(QtWidgets.QMainWindow):
         self.group_no_exif_checkbox = QtWidgets.QCheckBox('Складывать без EXIF в отдельную папку')
         self.group_no_exif_checkbox.setChecked(bool(config.GROUP_NO_EXIF))
 
-        self.languages_edit = QtWidgets.QLineEdit(', '.join(config.CYR_LANG))
         self.screenshots_edit = QtWidgets.QLineEdit(config.SCREENSHOTS_FOLDER)
         self.no_exif_edit = QtWidgets.QLineEdit(config.NO_EXIF_FOLDER)
         self.temp_edit = QtWidgets.QLineEdit(config.TEMP_FOLDER)
@@ -101,7 +120,6 @@ class SortFilesWindow(QtWidgets.QMainWindow):
         form.addRow('Служебные расширения', self.setting_ext_edit)
         form.addRow(self.find_sets_checkbox)
         form.addRow(self.group_no_exif_checkbox)
-        form.addRow('Языки для проверки пути', self.languages_edit)
         form.addRow('Папка для скриншотов', self.screenshots_edit)
         form.addRow('Папка без EXIF', self.no_exif_edit)
         form.addRow('Временная папка', self.temp_edit)
@@ -117,6 +135,11 @@ class SortFilesWindow(QtWidgets.QMainWindow):
         self.start_button.clicked.connect(self._start_sorting)
         buttons.addWidget(self.start_button)
 
+        self.stop_button = QtWidgets.QPushButton('Остановить')
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self._stop_sorting)
+        buttons.addWidget(self.stop_button)
+
         self.close_button = QtWidgets.QPushButton('Выход')
         self.close_button.clicked.connect(self.close)
         buttons.addWidget(self.close_button)
@@ -165,9 +188,6 @@ class SortFilesWindow(QtWidgets.QMainWindow):
         )
         config.FIND_SETS_FILES = self.find_sets_checkbox.isChecked()
         config.set_group_no_exif(self.group_no_exif_checkbox.isChecked())
-        langs = _parse_csv(self.languages_edit.text())
-        if langs:
-            config.CYR_LANG = langs
 
         screenshots_folder = self.screenshots_edit.text().strip()
         if screenshots_folder:
@@ -200,23 +220,39 @@ class SortFilesWindow(QtWidgets.QMainWindow):
         self._apply_config()
 
         self.start_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
         self.status_label.setText('Сортировка запущена...')
 
         self.worker = SortWorker(source_path=source_path, result_path=result_path)
+        self.worker.progress.connect(self._on_progress)
         self.worker.finished.connect(self._on_finished)
         self.worker.failed.connect(self._on_failed)
         self.worker.start()
 
-    def _on_finished(self) -> None:
-        self.status_label.setText('Готово')
-        QtWidgets.QMessageBox.information(self, 'Готово', 'Сортировка завершена.')
-        self.start_button.setEnabled(True)
-        self.worker = None
+    def _stop_sorting(self) -> None:
+        if self.worker is not None:
+            self.worker.cancel()
+            self.stop_button.setEnabled(False)
+            self.status_label.setText('Остановка...')
+
+    def _on_progress(self, progress: SortProgress) -> None:
+        if not progress.finished:
+            self.status_label.setText(_format_progress(progress))
+
+    def _on_finished(self, result: SortProgress) -> None:
+        title = 'Остановлено' if result.cancelled else 'Готово'
+        self.status_label.setText(f'{title}. {_format_progress(result)}')
+        QtWidgets.QMessageBox.information(self, title, f'Сортировка завершена.\n{_format_progress(result)}')
+        self._reset_buttons()
 
     def _on_failed(self, message: str) -> None:
         self.status_label.setText('Ошибка')
         QtWidgets.QMessageBox.critical(self, 'Ошибка', f'Произошла ошибка:\n{message}')
+        self._reset_buttons()
+
+    def _reset_buttons(self) -> None:
         self.start_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
         self.worker = None
 
 
@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import os
+from array import array
+
+import config
+from table_utils import FileTable
+
+PARTIAL_HASH_BYTES = 64 * 1024
+READ_BYTES = 1024 * 1024
+
+
+def partial_hash(path: str, size: int) -> bytes:
+    """Hash of the first and the last PARTIAL_HASH_BYTES of the file."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(PARTIAL_HASH_BYTES))
+        if size > PARTIAL_HASH_BYTES * 2:
+            f.seek(-PARTIAL_HASH_BYTES, os.SEEK_END)
+            digest.update(f.read(PARTIAL_HASH_BYTES))
+        elif size > PARTIAL_HASH_BYTES:
+            digest.update(f.read())
+    return digest.digest()
+
+
+def full_hash(path: str) -> bytes:
+    """Hash of the whole file."""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        while chunk := f.read(READ_BYTES):
+            digest.update(chunk)
+    return digest.digest()
+
+
+class ContentIndex:
+    """
+    Find files with the same content: files are grouped by size, partial hash
+    is computed only for equal sizes and full hash only for equal partial hashes.
+    Paths are kept in a FileTable, a size maps to a row or to an array of rows.
+    Hashes are keyed by rows, hashes of the searched file by its path until the next 'find'.
+    """
+
+    def __init__(self):
+        self._files = FileTable()
+        self._by_size: dict[int, int | array] = {}
+        self._partial: dict[int | str, bytes] = {}
+        self._full: dict[int | str, bytes] = {}
+        self._searched: str | None = None
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def add(self, path: str, size: int, previous_path: str | None = None) -> None:
+        """Add file to the index, keep hashes computed for 'previous_path' (file was moved)."""
+        row = self._files.add_path(path)
+        rows = self._by_size.get(size)
+        if rows is None:
+            self._by_size[size] = row
+        elif isinstance(rows, int):
+            self._by_size[size] = array('I', (rows, row))
+        else:
+            rows.append(row)
+        searched_path = path if previous_path is None else previous_path
+        if searched_path == self._searched:
+            for hashes in (self._partial, self._full):
+                if searched_path in hashes:
+                    hashes[row] = hashes.pop(searched_path)
+            self._searched = None
+
+    def add_tree(self, top: str) -> None:
+        """Add files with SUPPORTED_EXTENSIONS of the folder tree (only sizes are read)."""
+        folders = [top]
+        while folders:
+            folder = folders.pop()
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            folders.append(entry.path)
+                        elif entry.name.lower().endswith(config.SUPPORTED_EXTENSIONS):
+                            self.add(entry.path, entry.stat().st_size)
+            except OSError as e:
+                logging.error(f"dedupe: can't scan {folder} error: {e}")
+
+    def find(self, path: str, size: int) -> str | None:
+        """Return a file of the index with the same content as 'path'."""
+        rows = self._by_size.get(size)
+        if rows is None:
+            return None
+        if self._searched is not None and self._searched != path:
+            for hashes in (self._partial, self._full):
+                hashes.pop(self._searched, None)
+        self._searched = path
+
+        path_partial = self._hash(self._partial, path, partial_hash, size)
+        if path_partial is None:
+            return None
+        for row in (rows,) if isinstance(rows, int) else rows:
+            # paths of rows are built only for candidates with the same partial hash
+            if self._hash(self._partial, row, partial_hash, size) != path_partial:
+                continue
+            candidate = self._files.path(row)
+            if candidate == path:
+                continue
+            if size <= PARTIAL_HASH_BYTES * 2:
+                # partial hash covers the whole file
+                return candidate
+            path_full = self._hash(self._full, path, full_hash)
+            if path_full is not None and self._hash(self._full, row, full_hash) == path_full:
+                return candidate
+
+        return None
+
+    def _hash(self, hashes: dict[int | str, bytes], key: int | str, func, *args) -> bytes | None:
+        """Cached hash of the file, 'key' is a row of the table or the path of the searched file."""
+        value = hashes.get(key)
+        if value is None:
+            path = key if isinstance(key, str) else self._files.path(key)
+            try:
+                value = func(path, *args)
+            except OSError as e:
+                logging.error(f"dedupe: can't read {path} error: {e}")
+                return None
+            hashes[key] = value
+        return value
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import shutil
+import threading
+
+from fs_utils import MODE_MOVE
+
+JOURNAL_BATCH_SIZE = 256
+
+OP_RUN = 'run'
+OP_INTENT = 'intent'
+OP_DONE = 'done'
+OP_SKIP = 'skip'
+
+
+class MoveJournal:
+    """
+    Append-only JSONL journal of moves: 'intent' is written before a file is moved,
+    'done' after it. Records are flushed and fsynced in batches of 'batch_size'.
+    'mode' of the run (fs_utils.MODES) tells undo whether sources were kept.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        source_path: str,
+        result_path: str,
+        batch_size: int = JOURNAL_BATCH_SIZE,
+        mode: str = MODE_MOVE,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.file = open(path, 'a', encoding='utf-8')
+        self._write({'op': OP_RUN, 'source_root': source_path, 'result_root': result_path, 'mode': mode})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def intent(self, src: str, dst: str) -> None:
+        self._write({'op': OP_INTENT, 'src': src, 'dst': dst})
+
+    def done(self, src: str, dst: str) -> None:
+        self._write({'op': OP_DONE, 'src': src, 'dst': dst})
+
+    def skip(self, src: str, reason: str) -> None:
+        self._write({'op': OP_SKIP, 'src': src, 'reason': reason})
+
+    def _write(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:  # 'done' may be written by move threads
+            self.file.write(line)
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self._sync()
+
+    def sync(self) -> None:
+        """Flush and fsync written records."""
+        with self._lock:
+            self._sync()
+
+    def _sync(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._pending = 0
+
+    def close(self) -> None:
+        self.sync()
+        self.file.close()
+
+
+def _read_records(path: str):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # the last line may be cut by a crash
+                logging.warning(f'journal {path}: skip broken record {line!r}')
+
+
+def read_journal(path: str) -> tuple[dict[str, str], set[str]]:
+    """
+    Return done moves (source -> destination) and skipped sources of the journal.
+    An 'intent' without 'done' is done if the file is found only in the destination.
+    """
+    done: dict[str, str] = {}
+    intents: dict[str, str] = {}
+    skipped: set[str] = set()
+    if not os.path.exists(path):
+        return done, skipped
+
+    for record in _read_records(path):
+        op = record.get('op')
+        if op == OP_INTENT:
+            intents[record['src']] = record['dst']
+        elif op == OP_DONE:
+            done[record['src']] = record['dst']
+            intents.pop(record['src'], None)
+        elif op == OP_SKIP:
+            skipped.add(record['src'])
+
+    for src, dst in intents.items():
+        if os.path.exists(dst) and not os.path.exists(src):
+            done[src] = dst
+
+    return done, skipped
+
+
+def _kept_sources(path: str) -> set[str]:
+    """Destinations of runs which kept the source (copy, link, reflink modes)."""
+    kept: set[str] = set()
+    mode = MODE_MOVE
+    for record in _read_records(path):
+        op = record.get('op')
+        if op == OP_RUN:
+            mode = record.get('mode', MODE_MOVE)
+        elif op == OP_DONE and mode != MODE_MOVE:
+            kept.add(record['dst'])
+    return kept
+
+
+def undo_journal(path: str) -> int:
+    """
+    Move files of the journal back to the source (remove copies and links
+    if the source was kept), remove emptied result folders.
+    """
+    done, _ = read_journal(path)
+    result_roots = {record['result_root'] for record in _read_records(path) if record.get('op') == OP_RUN}
+    kept = _kept_sources(path)
+
+    undone = 0
+    folders: set[str] = set()
+    for src, dst in reversed(list(done.items())):
+        if dst in kept and os.path.exists(src) and os.path.exists(dst):
+            try:
+                os.unlink(dst)
+                undone += 1
+                folders.add(os.path.dirname(dst))
+            except OSError as e:
+                logging.error(f"undo: can't remove {dst} error: {e}")
+            continue
+        if not os.path.exists(dst) or os.path.exists(src):
+            logging.warning(f"undo: can't move {dst} back to {src}")
+            continue
+        try:
+            os.makedirs(os.path.dirname(src), exist_ok=True)
+            shutil.move(dst, src)
+            undone += 1
+            folders.add(os.path.dirname(dst))
+        except OSError as e:
+            logging.error(f"undo: can't move {dst} to {src} error: {e}")
+
+    for folder in sorted(folders, key=len, reverse=True):
+        while any(folder.startswith(root + os.sep) for root in result_roots):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                break
+            folder = os.path.dirname(folder)
+
+    return undone
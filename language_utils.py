@@ -1,11 +1,12 @@
 import logging
 import os
 import re
+from functools import lru_cache
 from typing import Iterable, Set
 
 from langdetect import detect, detect_langs
 
-import config
+CYRILLIC_PATTERN = re.compile('[\u0400-\u052f\u1c80-\u1c8f\u2de0-\u2dff\ua640-\ua69f]')
 
 
 def contain_any(a_list: Iterable, b_list: Iterable) -> bool:
@@ -41,6 +42,28 @@ def detect_languages(value: str, source_path: str | None = None) -> Set[str]:
     return set(langs)
 
 
+@lru_cache(maxsize=65536)
+def contains_cyrillic(value: str) -> bool:
+    """Check string for Cyrillic characters (memoized)."""
+    return CYRILLIC_PATTERN.search(value) is not None
+
+
+@lru_cache(maxsize=65536)
+def _is_ascii_folder(path: str) -> bool:
+    return path.isascii()
+
+
+def is_ascii_path(file_path: str) -> bool:
+    """Check path for non-ASCII characters, the answer for the folder is memoized."""
+    path, file = os.path.split(file_path)
+    return file.isascii() and _is_ascii_folder(path)
+
+
 def path_contains_cyrillic(path: str, source_path: str | None = None) -> bool:
-    """Check path for Cyrillic languages defined in config.CYR_LANG."""
-    return contain_any(detect_languages(path, source_path), config.CYR_LANG)
+    """Check path (only the part below 'source_path') for Cyrillic characters."""
+    if source_path:
+        try:
+            path = os.path.relpath(path, source_path)
+        except ValueError:  # other drive on Windows
+            pass
+    return contains_cyrillic(path)
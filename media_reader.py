@@ -0,0 +1,226 @@
+"""Seek-based date readers of MP4/MOV/M4A (ISO-BMFF), AVI (RIFF) and MP3 (ID3v2) headers."""
+import datetime
+import os
+import struct
+
+from timestamp_utils import make_timestamps
+
+MP4_EPOCH_OFFSET = 2082844800  # seconds from 1904-01-01 to 1970-01-01
+MAX_BOX_BYTES = 1024 * 1024  # metadata boxes larger than this are not read
+MAX_DEPTH = 8
+
+APPLE_CREATION_DATE = b'com.apple.quicktime.creationdate'
+ISO_CONTAINERS = (b'moov', b'udta', b'meta', b'ilst')
+ISO_DATE_BOXES = (b'\xa9day',)
+
+AVI_DATE_CHUNKS = (b'IDIT', b'ICRD')
+AVI_CONTAINERS = (b'hdrl', b'INFO')
+
+ID3_DATE_FRAMES = ('TDRC', 'TDOR', 'TDRL', 'TYER', 'TDAT', 'TIME', 'TYE', 'TDA', 'TIM')
+ID3_ENCODINGS = ('latin-1', 'utf-16', 'utf-16-be', 'utf-8')
+
+
+def read_media_dates(file_path: str) -> list[int]:
+    """
+    Return timestamps found in the container header of a video/audio file.
+    Only headers are read, the media payload is skipped with seeks.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(12)
+            size = os.fstat(f.fileno()).st_size
+            if head[4:8] in (b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip'):
+                values = _read_iso(f, size)
+            elif head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+                values = _read_avi(f, min(size, 8 + struct.unpack('<L', head[4:8])[0]))
+            elif head[:3] == b'ID3':
+                values = _read_id3(f)
+            else:
+                return []
+    except (OSError, ValueError, IndexError, struct.error):
+        return []
+
+    texts = [value for value in values if isinstance(value, str)]
+    timestamps = [value for value in values if isinstance(value, int)]
+    return timestamps + [value for value in make_timestamps(texts) if value]
+
+
+def _iter_iso_boxes(f, start: int, end: int):
+    """Yield (type, data start, data end) of ISO-BMFF boxes between offsets."""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, kind = struct.unpack('>L4s', f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            raise ValueError(f'bad box size {size}')
+        yield kind, offset + header, min(offset + size, end)
+        offset += size
+
+
+def _read_iso(f, size: int) -> list:
+    """Dates of moov/mvhd, Apple keys and ©day boxes."""
+    values: list = []
+    for kind, start, end in _iter_iso_boxes(f, 0, size):
+        if kind == b'moov':
+            _read_iso_container(f, kind, start, end, values, 0)
+            break
+    return values
+
+
+def _read_iso_container(f, kind: bytes, start: int, end: int, values: list, depth: int) -> None:
+    if depth > MAX_DEPTH:
+        return
+    if kind == b'meta':
+        f.seek(start)
+        if f.read(4) == b'\x00\x00\x00\x00':  # ISO 'meta' is a full box, QuickTime one is not
+            start += 4
+
+    keys: list[bytes] = []
+    for child, child_start, child_end in _iter_iso_boxes(f, start, end):
+        if child_end - child_start > MAX_BOX_BYTES and child in (b'mvhd', b'keys', b'\xa9day'):
+            continue
+        if child == b'mvhd':
+            f.seek(child_start)
+            version = f.read(4)[0]
+            if version == 1:
+                creation_time = struct.unpack('>Q', f.read(8))[0]
+            else:
+                creation_time = struct.unpack('>L', f.read(4))[0]
+            if creation_time > MP4_EPOCH_OFFSET:
+                values.append(creation_time - MP4_EPOCH_OFFSET)
+        elif child == b'keys':
+            keys = _read_iso_keys(f, child_start, child_end)
+        elif child in ISO_DATE_BOXES:
+            _append_iso_text(f, child_start, child_end, values)
+        elif child in ISO_CONTAINERS:
+            if child == b'ilst':
+                _read_iso_ilst(f, child_start, child_end, keys, values)
+            else:
+                _read_iso_container(f, child, child_start, child_end, values, depth + 1)
+
+
+def _read_iso_ilst(f, start: int, end: int, keys: list[bytes], values: list) -> None:
+    for child, child_start, child_end in _iter_iso_boxes(f, start, end):
+        if child_end - child_start > MAX_BOX_BYTES:
+            continue
+        if child in ISO_DATE_BOXES:
+            _append_iso_text(f, child_start, child_end, values)
+        else:
+            # item of Apple keys list, type is 1-based index in 'keys'
+            key_index = struct.unpack('>L', child)[0] - 1
+            if 0 <= key_index < len(keys) and keys[key_index] == APPLE_CREATION_DATE:
+                _append_iso_text(f, child_start, child_end, values)
+
+
+def _read_iso_keys(f, start: int, end: int) -> list[bytes]:
+    """Keys of the 'keys' box, a broken entry (size below its header or past the box) ends the list."""
+    f.seek(start + 4)  # version, flags
+    count = struct.unpack('>L', f.read(4))[0]
+    offset = start + 8
+    keys = []
+    for _ in range(min(count, 1024)):
+        size, namespace = struct.unpack('>L4s', f.read(8))
+        if size < 8 or offset + size > end:
+            break
+        keys.append(f.read(size - 8))
+        offset += size
+    return keys
+
+
+def _append_iso_text(f, start: int, end: int, values: list) -> None:
+    """Text of 'data' box (iTunes style) or QuickTime user data string."""
+    f.seek(start)
+    data = f.read(end - start)
+    if data[4:8] == b'data':
+        text = data[16:]
+    else:
+        length = struct.unpack('>H', data[:2])[0]
+        text = data[4:4 + length]
+    values.append(text.decode('utf-8', 'ignore').strip('\x00 '))
+
+
+def _read_avi(f, end: int) -> list:
+    """Dates of IDIT and ICRD chunks from header lists (movi list is skipped)."""
+    values: list = []
+    _read_riff_list(f, 12, end, values, 0)
+    return values
+
+
+def _read_riff_list(f, start: int, end: int, values: list, depth: int) -> None:
+    offset = start
+    while offset + 8 <= end and depth <= MAX_DEPTH:
+        f.seek(offset)
+        chunk_id, size = struct.unpack('<4sL', f.read(8))
+        if chunk_id == b'LIST':
+            list_type = f.read(4)
+            if list_type in AVI_CONTAINERS:
+                _read_riff_list(f, offset + 12, offset + 8 + size, values, depth + 1)
+        elif chunk_id in AVI_DATE_CHUNKS and size <= MAX_BOX_BYTES:
+            value = f.read(size).decode('latin-1').strip('\x00\r\n ')
+            values.append(_avi_date(value))
+        offset += 8 + size + (size & 1)
+
+
+def _avi_date(value: str) -> str:
+    """Convert 'THU OCT 22 13:04:37 2009' to EXIF date format."""
+    try:
+        date = datetime.datetime.strptime(value.title(), '%a %b %d %H:%M:%S %Y')
+    except ValueError:
+        return value
+    return date.strftime('%Y:%m:%d %H:%M:%S')
+
+
+def _read_id3(f) -> list:
+    """Dates of ID3v2 text frames, frames are skipped with seeks."""
+    f.seek(0)
+    header = f.read(10)
+    version, flags = header[3], header[5]
+    end = 10 + _syncsafe(header[6:10])
+    offset = 10
+    if flags & 0x40 and version >= 3:  # extended header
+        f.seek(offset)
+        ext_size = f.read(4)
+        offset += _syncsafe(ext_size) if version == 4 else 4 + struct.unpack('>L', ext_size)[0]
+
+    frames: dict[str, str] = {}
+    while offset < end:
+        f.seek(offset)
+        if version == 2:
+            frame_header = f.read(6)
+            frame_id = frame_header[:3].decode('latin-1')
+            size = int.from_bytes(frame_header[3:6], 'big')
+            header_size = 6
+        else:
+            frame_header = f.read(10)
+            frame_id = frame_header[:4].decode('latin-1')
+            size = _syncsafe(frame_header[4:8]) if version == 4 else struct.unpack('>L', frame_header[4:8])[0]
+            header_size = 10
+        if not frame_id.strip('\x00') or size <= 0:
+            break  # padding
+        if frame_id in ID3_DATE_FRAMES and size <= 256:
+            data = f.read(size)
+            if data[0] < len(ID3_ENCODINGS):
+                frames[frame_id] = data[1:].decode(ID3_ENCODINGS[data[0]], 'ignore').strip('\x00 ')
+        offset += header_size + size
+
+    values = [frames[frame_id] for frame_id in ('TDRC', 'TDOR', 'TDRL') if frame_id in frames]
+    year = frames.get('TYER') or frames.get('TYE')
+    day_month = frames.get('TDAT') or frames.get('TDA')
+    if year and day_month and len(day_month) == 4:
+        hour_minute = frames.get('TIME') or frames.get('TIM') or '0000'
+        values.append(f'{year}:{day_month[2:]}:{day_month[:2]} {hour_minute[:2]}:{hour_minute[2:4]}:00')
+    return values
+
+
+def _syncsafe(data: bytes) -> int:
+    """ID3 size of 7-bit bytes."""
+    value = 0
+    for byte in data:
+        value = (value << 7) | (byte & 0x7F)
+    return value
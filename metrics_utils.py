@@ -0,0 +1,226 @@
+"""Counters and latency histograms of sort stages and metadata backends (--profile, --metrics-json)."""
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+HISTOGRAM_BUCKETS = 32  # bucket n holds latencies below 2**n microseconds
+SNAPSHOT_SECONDS = 10.0
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class Histogram:
+    """Latency histogram with power of two buckets of microseconds."""
+
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[min(int(seconds * 1_000_000).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def merge(self, data: dict) -> None:
+        self.count += data['count']
+        self.total += data['total']
+        self.max = max(self.max, data['max'])
+        for n, value in enumerate(data['buckets']):
+            self.buckets[n] += value
+
+    def to_dict(self) -> dict:
+        return {'count': self.count, 'total': self.total, 'max': self.max, 'buckets': list(self.buckets)}
+
+    def percentile(self, share: float) -> float:
+        """Upper bound (seconds) of the bucket with the 'share' percentile."""
+        rank = share * self.count
+        seen = 0
+        for n, value in enumerate(self.buckets):
+            seen += value
+            if value and seen >= rank:
+                return min((1 << n) / 1_000_000, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'total_s': round(self.total, 4),
+            'mean_ms': round(self.total * 1000 / self.count, 4) if self.count else None,
+            'p50_ms': round(self.percentile(0.5) * 1000, 4),
+            'p95_ms': round(self.percentile(0.95) * 1000, 4),
+            'p99_ms': round(self.percentile(0.99) * 1000, 4),
+            'max_ms': round(self.max * 1000, 4),
+        }
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """
+    Thread-safe counters and histograms. Disabled by default: then 'count',
+    'observe' and 'timer' do nothing, so instrumented code pays one attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.monotonic()
+        self._counters: dict[str, int] = {}
+        self._histograms: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.monotonic()
+            self._counters = {}
+            self._histograms = {}
+
+    def count(self, name: str, value: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.add(seconds)
+
+    def timer(self, name: str):
+        """Context manager adding its duration to the 'name' histogram."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def snapshot(self) -> dict:
+        """Raw counters and histograms (see 'merge')."""
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'histograms': {name: histogram.to_dict() for name, histogram in self._histograms.items()},
+            }
+
+    def pop(self) -> dict:
+        """Return snapshot and reset, used to send metrics of worker processes."""
+        snapshot = self.snapshot()
+        self.reset()
+        return snapshot
+
+    def merge(self, snapshot: dict) -> None:
+        with self._lock:
+            for name, value in snapshot['counters'].items():
+                self._counters[name] = self._counters.get(name, 0) + value
+            for name, data in snapshot['histograms'].items():
+                histogram = self._histograms.get(name)
+                if histogram is None:
+                    histogram = self._histograms[name] = Histogram()
+                histogram.merge(data)
+
+    def summary(self, **extra) -> dict:
+        """
+        Counters, latency summary of stages and hit rates of metadata backends:
+        'exif.<backend>' is time of the backend, 'exif.<backend>.date' counts files it gave the date.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {name: histogram.summary() for name, histogram in self._histograms.items()}
+        elapsed = time.monotonic() - self.started
+        backends = {}
+        for name, stage in histograms.items():
+            if name.startswith('exif.'):
+                dates = counters.get(f'{name}.date', 0)
+                backends[name[5:]] = {'calls': stage['count'], 'dates': dates, 'hit_rate': round(dates / stage['count'], 4)}
+        return {
+            'elapsed_s': round(elapsed, 3),
+            **extra,
+            'counters': counters,
+            'stages': histograms,
+            'backends': backends,
+        }
+
+
+METRICS = Metrics()
+
+
+def write_json(path: str, data: dict) -> None:
+    """Replace the file atomically, readers never see a partial file."""
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+class MetricsReporter(threading.Thread):
+    """Write METRICS summary to 'path' every 'interval' seconds, 'extra' returns run counters."""
+
+    def __init__(self, path: str, interval: float = SNAPSHOT_SECONDS, extra=None):
+        super().__init__(name='metrics-reporter', daemon=True)
+        self.path = path
+        self.interval = interval
+        self.extra = extra
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.write()
+
+    def write(self) -> None:
+        extra = self.extra() if self.extra is not None else {}
+        try:
+            write_json(self.path, METRICS.summary(**extra))
+        except OSError as e:
+            logging.error(f"metrics: can't write {self.path} error: {e}")
+
+    def stop(self) -> None:
+        """Stop snapshots and write the final summary."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.write()
+
+
+def format_summary(summary: dict) -> str:
+    """Text table of stages and backends for --profile."""
+    lines = [f"{'stage':<24}{'count':>10}{'total s':>10}{'mean ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+    for name, stage in sorted(summary['stages'].items(), key=lambda item: -item[1]['total_s']):
+        lines.append(
+            f"{name:<24}{stage['count']:>10}{stage['total_s']:>10.3f}{stage['mean_ms']:>10.3f}"
+            f"{stage['p95_ms']:>10.3f}{stage['max_ms']:>10.3f}"
+        )
+    if summary['backends']:
+        lines.append('')
+        lines.append(f"{'backend':<24}{'calls':>10}{'dates':>10}{'hit rate':>10}")
+        for name, backend in summary['backends'].items():
+            lines.append(f"{name:<24}{backend['calls']:>10}{backend['dates']:>10}{backend['hit_rate']:>10.1%}")
+    lines.append('')
+    lines.extend(f'{name}: {value}' for name, value in sorted(summary['counters'].items()))
+    return '\n'.join(lines)
@@ -0,0 +1,80 @@
+import json
+import logging
+import os
+
+from fs_utils import FolderIndex, move_files, remove_folder
+
+VERDICT_MOVE = 'move'
+VERDICT_DUPLICATE = 'duplicate'
+
+
+class ManifestWriter:
+    """
+    JSONL manifest of a planned sort run: the first line describes the run,
+    each next line is one file with its setting files, destination and verdict.
+    """
+
+    def __init__(self, path: str, source_path: str, result_path: str):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+        self._write({'source_root': source_path, 'result_root': result_path})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, path: str, files: list[str], new_path: str, verdict: str, same_as: str | None = None) -> None:
+        record = {'source': path, 'files': files, 'destination': new_path, 'verdict': verdict}
+        if same_as:
+            record['same_as'] = same_as
+        self._write(record)
+
+    def _write(self, record: dict) -> None:
+        self.file.write(json.dumps(record, ensure_ascii=False))
+        self.file.write('\n')
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def read_manifest(path: str) -> tuple[dict, list[dict]]:
+    """Return run description and file records of the manifest."""
+    with open(path, encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        records = [json.loads(line) for line in f if line.strip()]
+    return header, records
+
+
+def execute_manifest(path: str) -> int:
+    """
+    Move files of the manifest grouped by destination directory,
+    then remove emptied source folders. Return number of moved file sets.
+    """
+    header, records = read_manifest(path)
+
+    moves: dict[str, list[dict]] = {}
+    for record in records:
+        if record['verdict'] == VERDICT_MOVE:
+            moves.setdefault(record['destination'], []).append(record)
+
+    index = FolderIndex()
+    moved = 0
+    for new_path, destination_records in moves.items():
+        os.makedirs(new_path, exist_ok=True)
+        for record in destination_records:
+            if move_files(files=record['files'], path=record['source'], new_path=new_path, index=index):
+                moved += 1
+                logging.info(f"Moved: {record['source']} ({record['files']}) -> {new_path}")
+
+    source_root = header.get('source_root')
+    folders = {record['source'] for record in records}
+    for folder in sorted(folders, key=len, reverse=True):
+        # parents of emptied folders are emptied too
+        while source_root and folder.startswith(source_root + os.sep):
+            if not os.path.isdir(folder) or not remove_folder(folder):
+                break
+            folder = os.path.dirname(folder)
+
+    return moved
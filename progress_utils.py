@@ -0,0 +1,70 @@
+"""Progress of a sort run for callers (GUI, services): counters snapshot and batched callback."""
+import time
+
+PROGRESS_EVERY = 100  # files between progress callbacks
+PROGRESS_INTERVAL = 0.25  # ... or seconds, whichever comes first
+
+
+class SortProgress:
+    """Counters of a sort run, passed to the progress callback and returned by sorter.sort_files."""
+
+    __slots__ = ('scanned', 'extracted', 'moved', 'duplicates', 'errors', 'bytes', 'elapsed', 'finished', 'cancelled')
+
+    def __init__(
+        self,
+        scanned=0,
+        extracted=0,
+        moved=0,
+        duplicates=0,
+        errors=0,
+        bytes=0,
+        elapsed=0.0,
+        finished=False,
+        cancelled=False,
+    ):
+        self.scanned = scanned
+        self.extracted = extracted
+        self.moved = moved
+        self.duplicates = duplicates
+        self.errors = errors
+        self.bytes = bytes
+        self.elapsed = elapsed
+        self.finished = finished
+        self.cancelled = cancelled
+
+    @property
+    def files_per_sec(self) -> float | None:
+        return round(self.extracted / self.elapsed, 1) if self.elapsed else None
+
+    def to_dict(self) -> dict:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['files_per_sec'] = self.files_per_sec
+        return data
+
+    def __repr__(self):
+        counters = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'SortProgress({counters})'
+
+
+class ProgressThrottle:
+    """
+    Call 'callback(SortProgress)' every 'every' files or 'interval' seconds:
+    'tick' is called for each file and only counts it between the calls.
+    """
+
+    def __init__(self, callback, snapshot, every: int = PROGRESS_EVERY, interval: float = PROGRESS_INTERVAL):
+        self.callback = callback
+        self.snapshot = snapshot
+        self.every = max(every, 1)
+        self.interval = interval
+        self._files = 0
+        self._last = time.monotonic()
+
+    def tick(self) -> None:
+        self._files += 1
+        now = time.monotonic()
+        if self._files < self.every and now - self._last < self.interval:
+            return
+        self._files = 0
+        self._last = now
+        self.callback(self.snapshot())
@@ -0,0 +1,172 @@
+"""
+Read order of scanned files for HDD and NAS: files grouped by device in inode order,
+headers prefetched by threads of each device. EXIF is still read and files are moved
+in the resulting order, so a slow device delays the files after it.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+
+SCHEDULE_WINDOW = 1024  # scanned files reordered at once
+SCHEDULE_CHUNK = 64  # files of one device in a row (one EXIF batch)
+DEVICE_JOBS = 2  # prefetch threads per device
+PREFETCH_BYTES = 64 * 1024  # JPEG APP1 segment is at most 64 KB
+
+HAS_FADVISE = hasattr(os, 'posix_fadvise')
+
+
+def prefetch_headers(file_paths: list[str], size: int = PREFETCH_BYTES, sizes: dict | None = None) -> None:
+    """
+    Ask the kernel to read file headers ahead (posix_fadvise WILLNEED), read them where it is missing.
+    File sizes are put to 'sizes' (the file is open anyway, no stat in the sorting thread).
+    """
+    for file_path in file_paths:
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            if sizes is not None:
+                sizes[file_path] = os.fstat(fd).st_size
+            if HAS_FADVISE:
+                os.posix_fadvise(fd, 0, size, os.POSIX_FADV_WILLNEED)
+            else:
+                os.read(fd, size)
+        except OSError as e:
+            logging.debug(f"prefetch: can't read {file_path} error: {e}")
+        finally:
+            os.close(fd)
+
+
+class DeviceStats:
+    """Processed files and bytes of a device since its first scheduled file."""
+
+    __slots__ = ('files', 'bytes', 'first', 'last')
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.first = None
+        self.last = None
+
+    def to_dict(self) -> dict:
+        seconds = (self.last - self.first) if self.last is not None else 0.0
+        return {
+            'files': self.files,
+            'bytes': self.bytes,
+            'seconds': round(seconds, 3),
+            'files_per_sec': round(self.files / seconds, 1) if seconds else None,
+            'mb_per_sec': round(self.bytes / seconds / 1024 / 1024, 2) if seconds else None,
+        }
+
+
+def folder_inodes(path: str) -> tuple[int, dict[str, int]]:
+    """
+    (st_dev, name -> inode) of a folder: one stat and one listing instead of a stat of each file
+    (inodes come with the listing on POSIX). (-1, {}) if the folder can't be read.
+    """
+    try:
+        dev = os.stat(path).st_dev
+        with os.scandir(path) as entries:
+            return dev, {entry.name: entry.inode() for entry in entries}
+    except OSError:
+        return -1, {}  # the error is reported by EXIF reader
+
+
+class DeviceScheduler:
+    """
+    Reorder (path, file, sidecars) items by windows of 'window' files: files are grouped
+    by st_dev of their folder and sorted by inode (close to on-disk order), devices take
+    turns by 'chunk' files. Headers of a window are prefetched by 'device_jobs' threads
+    of each device, so reads of one device don't wait for another one.
+    Items are still yielded (and their EXIF is read) in one stream: this is a read order
+    with prefetch, not a separate extraction queue per device, a slow device delays the
+    files after it. Call 'done' when a file is processed to measure throughput of its device.
+    """
+
+    def __init__(self, window: int = SCHEDULE_WINDOW, device_jobs: int = DEVICE_JOBS, chunk: int = SCHEDULE_CHUNK):
+        self.window = window
+        self.device_jobs = max(device_jobs, 1)
+        self.chunk = chunk
+        self.devices: dict[int, DeviceStats] = {}
+        self._pools: dict[int, ThreadPoolExecutor] = {}
+        self._pending: dict[tuple[str, str], int] = {}
+        # file path -> size, written by prefetch threads
+        self._sizes: dict[str, int] = {}
+        # the last listed folder: a folder bigger than the window is listed once
+        self._folder: tuple[str, int, dict[str, int]] = ('', -1, {})
+
+    def schedule(self, items: Iterable[tuple[str, str, dict]]) -> Iterator[tuple[str, str, dict]]:
+        window = []
+        for item in items:
+            window.append(item)
+            if len(window) >= self.window:
+                yield from self._order(window)
+                window = []
+        if window:
+            yield from self._order(window)
+
+    def _order(self, window: list) -> Iterator[tuple[str, str, dict]]:
+        groups: dict[int, list] = {}
+        folders = {self._folder[0]: self._folder[1:]}
+        for item in window:
+            folder = folders.get(item[0])
+            if folder is None:
+                folder = folders[item[0]] = folder_inodes(item[0])
+            dev, inodes = folder
+            self._folder = (item[0], dev, inodes)
+            self._pending[(item[0], item[1])] = dev
+            groups.setdefault(dev, []).append((inodes.get(item[1], 0), item))
+
+        now = time.monotonic()
+        for dev, group in groups.items():
+            group.sort(key=lambda entry: entry[0])
+            if dev != -1:
+                stats = self.devices.get(dev)
+                if stats is None:
+                    stats = self.devices[dev] = DeviceStats()
+                    stats.first = now
+                pool = self._pool(dev)
+                for start in range(0, len(group), self.chunk):
+                    file_paths = [os.path.join(item[0], item[1]) for _, item in group[start:start + self.chunk]]
+                    pool.submit(prefetch_headers, file_paths, sizes=self._sizes)
+
+        for start in range(0, max(len(group) for group in groups.values()), self.chunk):
+            for group in groups.values():
+                for _, item in group[start:start + self.chunk]:
+                    yield item
+
+    def _pool(self, dev: int) -> ThreadPoolExecutor:
+        pool = self._pools.get(dev)
+        if pool is None:
+            pool = self._pools[dev] = ThreadPoolExecutor(
+                max_workers=self.device_jobs, thread_name_prefix=f'prefetch-{device_name(dev)}'
+            )
+        return pool
+
+    def done(self, path: str, file: str) -> None:
+        """Count processed file for throughput of its device."""
+        dev = self._pending.pop((path, file), None)
+        size = self._sizes.pop(os.path.join(path, file), 0)
+        if dev is None or dev == -1:
+            return
+        stats = self.devices[dev]
+        stats.last = time.monotonic()
+        stats.files += 1
+        stats.bytes += size
+
+    def device_stats(self) -> dict[str, dict]:
+        return {device_name(dev): stats.to_dict() for dev, stats in self.devices.items()}
+
+    def close(self) -> None:
+        for pool in self._pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def device_name(dev: int) -> str:
+    """'major:minor' of the device."""
+    if not hasattr(os, 'major'):
+        return str(dev)
+    return f'{os.major(dev)}:{os.minor(dev)}'
@@ -0,0 +1,265 @@
+"""
+Several sort processes (on one or several machines) on one source tree: work units
+(files of a source folder by name hash) are claimed with O_EXCL lock files in a shared
+folder, destination folders are locked while a file is checked and moved there.
+"""
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+SHARD_BUCKETS = 8  # work units of a folder, a file is in unit crc32(name) % SHARD_BUCKETS
+CLAIM_STALE_SECONDS = 600.0  # claim of a worker without progress for this time is taken over
+LOCK_STALE_SECONDS = 60.0  # destination lock older than this is left by a dead worker
+HEARTBEAT_EVERY = 64  # files between claim heartbeats
+
+
+def _create_exclusive(path: str, text: str = '') -> bool:
+    """Create the file if it does not exist (atomic on local file systems and NFSv3+)."""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+    return True
+
+
+def _take_over_stale(path: str, stale_seconds: float, worker_id: str) -> bool:
+    """Remove the lock file if it was not touched for 'stale_seconds'; only one worker wins."""
+    try:
+        if time.time() - os.stat(path).st_mtime < stale_seconds:
+            return False
+        stale_path = f'{path}.stale.{worker_id}'
+        os.rename(path, stale_path)
+    except FileNotFoundError:
+        return True  # released meanwhile
+    except OSError as e:
+        logging.error(f"shard: can't take over {path} error: {e}")
+        return False
+    logging.warning(f'shard: {path} was left by a stopped worker, taken over by {worker_id}')
+    os.unlink(stale_path)
+    return True
+
+
+def _remove_own(path: str, worker_id: str) -> None:
+    """Remove the lock file if it is still held by 'worker_id' (it may be taken over)."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            owner = f.read()
+        if owner == worker_id:
+            os.unlink(path)
+        else:
+            logging.warning(f'shard: {path} was taken over by {owner}, left to it')
+    except FileNotFoundError:
+        pass
+
+
+def _is_stale(path: str, stale_seconds: float) -> bool:
+    try:
+        return time.time() - os.stat(path).st_mtime >= stale_seconds
+    except FileNotFoundError:
+        return False
+
+
+def default_worker_id() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class WorkClaims:
+    """
+    Work units of the source tree claimed by this worker. A unit is the files of one
+    folder with the same crc32(name) % 'buckets', so a file is in the same unit whenever
+    the folder is listed (workers start at different times, moved files leave the folder).
+    'claims/<unit>' is created with O_EXCL and touched while the unit is processed,
+    'done/<unit>' is written when all its files are processed.
+    A run lasts while workers are registered in 'workers/': the first worker of a run and
+    the last finishing one clear claims and done units, so the next run sees new files.
+    """
+
+    def __init__(
+        self,
+        shard_dir: str,
+        source_path: str,
+        worker_id: str | None = None,
+        buckets: int = SHARD_BUCKETS,
+        stale_seconds: float = CLAIM_STALE_SECONDS,
+    ):
+        self.source_path = source_path
+        self.worker_id = worker_id or default_worker_id()
+        self.buckets = max(buckets, 1)
+        self.stale_seconds = stale_seconds
+        self.claims_dir = os.path.join(shard_dir, 'claims')
+        self.done_dir = os.path.join(shard_dir, 'done')
+        self.workers_dir = os.path.join(shard_dir, 'workers')
+        self.worker_path = os.path.join(self.workers_dir, self.worker_id)
+        for folder in (self.workers_dir, self.claims_dir, self.done_dir):
+            os.makedirs(folder, exist_ok=True)
+        _create_exclusive(self.worker_path, self.worker_id)
+        if self._live_workers() == [self.worker_id]:
+            # files of workers registered later are newer than the registration
+            self._clear(before=os.stat(self.worker_path).st_mtime)
+        self.claimed = 0
+        self._remaining: dict[str, int] = {}
+        self._units: dict[tuple[str, str], str] = {}
+        self._processed = 0
+
+    def _live_workers(self) -> list[str]:
+        """Registered workers, those without heartbeat for 'stale_seconds' are removed."""
+        live = []
+        for name in os.listdir(self.workers_dir):
+            path = os.path.join(self.workers_dir, name)
+            if _is_stale(path, self.stale_seconds):
+                logging.warning(f'shard: worker {name} stopped without finishing the run')
+                _take_over_stale(path, self.stale_seconds, self.worker_id)
+            else:
+                live.append(name)
+        return live
+
+    def _clear(self, before: float | None = None) -> None:
+        """Remove claims and done units of the run (older than 'before' if it is set)."""
+        for folder in (self.claims_dir, self.done_dir):
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        if before is None or entry.stat().st_mtime < before:
+                            os.unlink(entry.path)
+                    except FileNotFoundError:
+                        pass
+
+    def finish(self) -> None:
+        """Unregister the worker, the last one clears the run."""
+        try:
+            os.unlink(self.worker_path)
+        except FileNotFoundError:
+            pass
+        if not self._live_workers():
+            self._clear()
+
+    def unit_id(self, path: str, file: str) -> str:
+        relative_path = os.path.relpath(path, self.source_path)
+        bucket = zlib.crc32(os.fsencode(file)) % self.buckets
+        return f'{hashlib.sha1(os.fsencode(relative_path)).hexdigest()}-{bucket}'
+
+    def claim(self, unit: str) -> bool:
+        """Claim the unit for this worker, False if it is done or claimed by a live worker."""
+        if os.path.exists(os.path.join(self.done_dir, unit)):
+            return False
+        claim_path = os.path.join(self.claims_dir, unit)
+        if _create_exclusive(claim_path, self.worker_id):
+            return True
+        if _take_over_stale(claim_path, self.stale_seconds, self.worker_id):
+            return _create_exclusive(claim_path, self.worker_id)
+        return False
+
+    def claim_items(self, items: Iterable[tuple[str, str, dict]]) -> Iterator[tuple[str, str, dict]]:
+        """Yield scanned (path, file, sidecars) items of units claimed by this worker."""
+        for path, folder_items in self._folders(items):
+            self._heartbeat(self.worker_path)
+            units: dict[str, list] = {}
+            for item in folder_items:
+                units.setdefault(self.unit_id(path, item[1]), []).append(item)
+            for unit, unit_items in units.items():
+                if not self.claim(unit):
+                    continue
+                self.claimed += 1
+                self._remaining[unit] = len(unit_items)
+                for item in unit_items:
+                    self._units[(item[0], item[1])] = unit
+                yield from unit_items
+
+    @staticmethod
+    def _folders(items: Iterable[tuple[str, str, dict]]) -> Iterator[tuple[str, list]]:
+        """Group items of one folder (the scanner yields a folder at once)."""
+        path, folder_items = None, []
+        for item in items:
+            if item[0] != path and folder_items:
+                yield path, folder_items
+                folder_items = []
+            path = item[0]
+            folder_items.append(item)
+        if folder_items:
+            yield path, folder_items
+
+    def done(self, path: str, file: str) -> None:
+        """Count processed file; the unit is done when all its files are processed."""
+        unit = self._units.pop((path, file), None)
+        if unit is None:
+            return
+        self._remaining[unit] -= 1
+        self._processed += 1
+        claim_path = os.path.join(self.claims_dir, unit)
+        if self._remaining[unit] == 0:
+            del self._remaining[unit]
+            _create_exclusive(os.path.join(self.done_dir, unit), self.worker_id)
+            _remove_own(claim_path, self.worker_id)
+        elif self._processed % HEARTBEAT_EVERY == 0:
+            self._heartbeat(claim_path)
+            self._heartbeat(self.worker_path)
+
+    @staticmethod
+    def _heartbeat(path: str) -> None:
+        try:
+            os.utime(path)
+        except OSError as e:
+            logging.error(f"shard: can't touch {path} error: {e}")
+
+
+class DestinationLocks:
+    """
+    Lock files of destination folders: one worker at a time checks duplicates and moves there.
+    Held locks are touched by a keeper thread (copies of big files may take longer than
+    'stale_seconds'), a lock is removed only while this worker still owns it.
+    """
+
+    def __init__(self, shard_dir: str, worker_id: str | None = None, stale_seconds: float = LOCK_STALE_SECONDS):
+        self.worker_id = worker_id or default_worker_id()
+        self.stale_seconds = stale_seconds
+        self.locks_dir = os.path.join(shard_dir, 'locks')
+        os.makedirs(self.locks_dir, exist_ok=True)
+        self._held: set[str] = set()
+        self._held_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._keeper: threading.Thread | None = None
+
+    @contextmanager
+    def lock(self, path: str):
+        lock_path = os.path.join(self.locks_dir, hashlib.sha1(os.fsencode(path)).hexdigest())
+        delay = 0.001
+        while not _create_exclusive(lock_path, self.worker_id):
+            if _take_over_stale(lock_path, self.stale_seconds, self.worker_id):
+                continue
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        with self._held_lock:
+            self._held.add(lock_path)
+            if self._keeper is None:
+                self._keeper = threading.Thread(target=self._keep, name='shard-locks', daemon=True)
+                self._keeper.start()
+        try:
+            yield
+        finally:
+            with self._held_lock:
+                self._held.discard(lock_path)
+            _remove_own(lock_path, self.worker_id)
+
+    def _keep(self) -> None:
+        """Touch held locks several times per 'stale_seconds'."""
+        while not self._closed.wait(self.stale_seconds / 4):
+            with self._held_lock:
+                held = list(self._held)
+            for lock_path in held:
+                try:
+                    os.utime(lock_path)
+                except OSError as e:
+                    logging.error(f"shard: can't touch {lock_path} error: {e}")
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._keeper is not None:
+            self._keeper.join()
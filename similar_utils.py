@@ -0,0 +1,156 @@
+"""
+Near-duplicate photos (resized, re-compressed or edited copies): 64-bit difference hash
+of a reduced decode, multi-index of hashes by Hamming distance, groups of similar files.
+"""
+import json
+import logging
+from array import array
+
+from PIL import Image as PIL_Image
+
+from table_utils import FileTable
+
+HASH_SIZE = 8  # 8x8 differences, 64 bits
+SIMILAR_THRESHOLD = 6  # max Hamming distance of similar photos
+DRAFT_SIZE = HASH_SIZE * 8  # JPEG is decoded at 1/2 .. 1/8 scale, not below this size
+HASH_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp')
+MASK = (1 << 64) - 1
+CHUNKS = 4  # parts of a hash indexed separately
+CHUNK_BITS = 64 // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def image_hash(file_path: str) -> int:
+    """
+    Difference hash (dHash): the image is reduced to 9x8 gray pixels, a bit is set where
+    a pixel is darker than its right neighbour. JPEG is decoded in draft mode (DCT scaling),
+    never at full resolution. Returned as signed 64-bit int (fits SQLite INTEGER).
+    """
+    with PIL_Image.open(file_path) as image:
+        image.draft('L', (DRAFT_SIZE, DRAFT_SIZE))
+        small = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), PIL_Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        start = row * (HASH_SIZE + 1)
+        for col in range(start, start + HASH_SIZE):
+            value = value << 1 | (pixels[col] < pixels[col + 1])
+    return value - (1 << 64) if value >> 63 else value
+
+
+def hamming(a: int, b: int) -> int:
+    return ((a ^ b) & MASK).bit_count()
+
+
+class HashIndex:
+    """
+    Multi-index hashing of 64-bit hashes: a hash is split into CHUNKS parts of 16 bits and
+    each part indexes rows in its own table. Hashes within 'threshold' have at least one part
+    within threshold // CHUNKS bits (pigeonhole), so a search checks only those buckets:
+    about N * CHUNKS * 17 / 65536 candidates for threshold < 8 instead of N.
+    """
+
+    def __init__(self, threshold: int = SIMILAR_THRESHOLD):
+        self.threshold = threshold
+        radius = threshold // CHUNKS
+        self._masks = [mask for mask in range(1 << CHUNK_BITS) if mask.bit_count() <= radius]
+        self._hashes = array('q')
+        self._tables: list[dict[int, array]] = [{} for _ in range(CHUNKS)]
+        self.candidates = 0  # hashes compared by searches (for statistics)
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, value_hash: int) -> int:
+        """Add hash, return its row."""
+        row = len(self._hashes)
+        self._hashes.append(value_hash)
+        for chunk, table in enumerate(self._tables):
+            key = value_hash >> (chunk * CHUNK_BITS) & CHUNK_MASK
+            rows = table.get(key)
+            if rows is None:
+                table[key] = array('I', (row,))
+            else:
+                rows.append(row)
+        return row
+
+    def search(self, value_hash: int) -> list[tuple[int, int]]:
+        """(distance, row) of hashes within 'threshold', nearest first."""
+        found = []
+        seen = set()
+        for chunk, table in enumerate(self._tables):
+            key = value_hash >> (chunk * CHUNK_BITS) & CHUNK_MASK
+            for mask in self._masks:
+                for row in table.get(key ^ mask, ()):
+                    if row in seen:
+                        continue
+                    seen.add(row)
+                    distance = hamming(value_hash, self._hashes[row])
+                    if distance <= self.threshold:
+                        found.append((distance, row))
+        self.candidates += len(seen)
+        found.sort()
+        return found
+
+
+class SimilarIndex:
+    """
+    Image hashes of sorted files. 'add' returns the most similar file added before
+    (within 'threshold') and joins both into a group; groups are reported at the end.
+    """
+
+    def __init__(self, threshold: int = SIMILAR_THRESHOLD):
+        self.threshold = threshold
+        self.found = 0
+        self._files = FileTable()
+        self._hashes = HashIndex(threshold)
+        self._parent: dict[int, int] = {}  # union-find of similar rows
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def add(self, path: str, value_hash: int) -> tuple[str, int] | None:
+        """Add file, return (path, distance) of a similar file added before."""
+        matches = self._hashes.search(value_hash)
+        # rows of the file table and of the hash index are the same
+        row = self._files.add_path(path)
+        self._hashes.add(value_hash)
+        if not matches:
+            return None
+        distance, match_row = matches[0]
+        self.found += 1
+        root, match_root = self._root(row), self._root(match_row)
+        if root != match_root:
+            self._parent[root] = match_root
+        return self._files.path(match_row), distance
+
+    def _root(self, row: int) -> int:
+        while True:
+            parent = self._parent.get(row, row)
+            if parent == row:
+                return row
+            # path halving
+            grand = self._parent.get(parent, parent)
+            self._parent[row] = grand
+            row = grand
+
+    def groups(self) -> list[list[str]]:
+        """Paths of similar files, groups of two and more in order of addition."""
+        groups: dict[int, list[int]] = {}
+        for row in list(self._parent):
+            groups.setdefault(self._root(row), []).append(row)
+        result = []
+        for root, rows in groups.items():
+            rows = sorted(set(rows) | {root})
+            result.append([self._files.path(row) for row in rows])
+        result.sort()
+        return result
+
+    def write_report(self, path: str) -> int:
+        """Write groups as JSON lines, return number of groups."""
+        groups = self.groups()
+        with open(path, 'w', encoding='utf-8') as f:
+            for files in groups:
+                f.write(json.dumps({'files': files}, ensure_ascii=False) + '\n')
+        logging.info(f'similar: {len(groups)} groups written to {path}')
+        return len(groups)
@@ -2,8 +2,15 @@ import argparse
 import sys
 
 import config
+import filename_utils
+import fs_utils
+import scheduler_utils
+import similar_utils
 import version
-from sorter import sort_files
+from journal_utils import undo_journal
+from plan_utils import execute_manifest
+from sorter import SourcePathError, SourceScanError, sort_files, watch_files
+from watch_utils import WatchUnavailableError
 
 
 def _parse_args(argv: list[str]) -> argparse.Namespace:
@@ -19,6 +26,117 @@ def _parse_args(argv: list[str]) -> argparse.Namespace:
         action='store_true',
         help='Не складывать файлы без EXIF в отдельную папку (использовать дату ОС).',
     )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=1,
+        help='Число процессов для чтения EXIF (0 - по числу ядер).',
+    )
+    parser.add_argument('--cache', metavar='PATH', help='SQLite-кэш EXIF для повторных запусков.')
+    parser.add_argument(
+        '--dedupe',
+        action='store_true',
+        help='Пропускать файлы с тем же содержимым, что уже есть в result или среди исходных.',
+    )
+    parser.add_argument(
+        '--name-dates',
+        choices=filename_utils.NAME_MODES,
+        help='Брать дату и признак скриншота из имени файла (IMG_20190312_143501.jpg, Screenshot_...): '
+        'primary - вместо EXIF, такие файлы не открываются; fallback - если в EXIF нет даты; '
+        'cross-check - сверять с датой EXIF и писать расхождения в лог.',
+    )
+    parser.add_argument(
+        '--similar',
+        action='store_true',
+        help='Искать похожие фото (уменьшенные, пересжатые, отредактированные копии) среди новых и уже '
+        'отсортированных, группы пишутся в лог. Требует --cache.',
+    )
+    parser.add_argument(
+        '--similar-threshold',
+        type=int,
+        default=similar_utils.SIMILAR_THRESHOLD,
+        help='Максимальное число различающихся бит хеша изображения (из 64) у похожих фото.',
+    )
+    parser.add_argument('--similar-report', metavar='PATH', help='Записать группы похожих фото (JSONL) в файл.')
+    parser.add_argument(
+        '--plan',
+        '--dry-run',
+        dest='plan',
+        metavar='MANIFEST',
+        help='Ничего не перемещать, записать план (JSONL) в файл MANIFEST.',
+    )
+    parser.add_argument('--execute', metavar='MANIFEST', help='Выполнить перемещения по готовому плану.')
+    parser.add_argument('--journal', metavar='PATH', help='Журнал перемещений (для --resume и --undo).')
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Продолжить прерванный запуск: пропустить файлы, уже обработанные по --journal.',
+    )
+    parser.add_argument('--undo', metavar='JOURNAL', help='Вернуть файлы, перемещённые по журналу, на место.')
+    parser.add_argument(
+        '--mode',
+        choices=fs_utils.MODES,
+        default=fs_utils.MODE_MOVE,
+        help='Как раскладывать файлы: перемещать, копировать, создавать жёсткие ссылки (link) '
+        'или reflink-копии (btrfs, XFS). Кроме move исходные файлы остаются на месте.',
+    )
+    parser.add_argument(
+        '--move-workers',
+        type=int,
+        default=fs_utils.MOVE_WORKERS,
+        help='Число потоков копирования при перемещении на другой диск.',
+    )
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='Сверять размер копии перед удалением исходного файла (перемещение на другой диск).',
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Вывести время этапов и результативность библиотек EXIF в конце.',
+    )
+    parser.add_argument('--metrics-json', metavar='PATH', help='Записать метрики запуска в JSON.')
+    parser.add_argument(
+        '--metrics-interval',
+        type=float,
+        metavar='SECONDS',
+        help='Обновлять --metrics-json каждые SECONDS секунд (для мониторинга).',
+    )
+    parser.add_argument(
+        '--adaptive-backends',
+        action='store_true',
+        help='Пробовать библиотеки EXIF в порядке их результативности для похожих файлов '
+        '(быстрее, но дата файла с несколькими датами может зависеть от порядка файлов).',
+    )
+    parser.add_argument(
+        '--backend-stats',
+        metavar='PATH',
+        help='JSON со статистикой библиотек EXIF: загрузить перед запуском и сохранить после.',
+    )
+    parser.add_argument(
+        '--device-schedule',
+        action='store_true',
+        help='Читать файлы по дискам в порядке inode, с упреждающим чтением заголовков (для HDD и NAS).',
+    )
+    parser.add_argument(
+        '--device-jobs',
+        type=int,
+        default=scheduler_utils.DEVICE_JOBS,
+        help='Число потоков упреждающего чтения на каждый диск (с --device-schedule).',
+    )
+    parser.add_argument(
+        '--shard-dir',
+        metavar='PATH',
+        help='Общая папка нескольких процессов (или машин), сортирующих один источник вместе.',
+    )
+    parser.add_argument('--worker-id', help='Имя процесса в --shard-dir (по умолчанию хост-pid).')
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Следить за папкой source (Linux, inotify) и сортировать новые файлы по мере появления.',
+    )
     parser.add_argument('--version', action='version', version=f'%(prog)s v{version.VERSION}')
 
     args, unknown = parser.parse_known_args(argv)
@@ -27,6 +145,18 @@ def _parse_args(argv: list[str]) -> argparse.Namespace:
     unknown = [item for item in unknown if item != 'no_ex']
     if unknown:
         parser.error(f"Неизвестные аргументы: {' '.join(unknown)}")
+    if args.resume and not args.journal:
+        parser.error('--resume требует --journal')
+    if args.watch and (args.plan or args.execute or args.undo):
+        parser.error('--watch нельзя совмещать с --plan, --execute и --undo')
+    if args.shard_dir and (args.plan or args.execute or args.undo or args.watch or args.resume):
+        parser.error('--shard-dir нельзя совмещать с --plan, --execute, --undo, --watch и --resume')
+    if args.mode != fs_utils.MODE_MOVE and (args.plan or args.execute or args.undo):
+        parser.error('--mode нельзя совмещать с --plan, --execute и --undo')
+    if args.similar_report and not args.similar:
+        parser.error('--similar-report требует --similar')
+    if args.similar and not args.cache:
+        parser.error('--similar требует --cache (хеши уже отсортированных фото хранятся в кэше)')
 
     return args
 
@@ -38,7 +168,72 @@ def main(argv: list[str] | None = None):
     if args.no_group_no_exif or args._legacy_no_ex:
         config.set_group_no_exif(False)
 
-    sort_files(source_path=args.source, result_path=args.result)
+    if args.undo:
+        undone = undo_journal(args.undo)
+        print(f'{undone} files moved back by {args.undo}')
+        return
+
+    if args.execute:
+        moved = execute_manifest(args.execute)
+        print(f'{moved} files moved by {args.execute}')
+        return
+
+    try:
+        if args.watch:
+            watch_files(
+                source_path=args.source,
+                result_path=args.result,
+                jobs=args.jobs,
+                cache_path=args.cache,
+                dedupe=args.dedupe,
+                journal_path=args.journal,
+                move_workers=args.move_workers,
+                verify=args.verify,
+                profile=args.profile,
+                metrics_path=args.metrics_json,
+                metrics_interval=args.metrics_interval,
+                adaptive_backends=args.adaptive_backends,
+                backend_stats_path=args.backend_stats,
+                mode=args.mode,
+                similar=args.similar,
+                similar_threshold=args.similar_threshold,
+                similar_report=args.similar_report,
+                name_dates=args.name_dates,
+            )
+            return
+
+        result = sort_files(
+            source_path=args.source,
+            result_path=args.result,
+            jobs=args.jobs,
+            cache_path=args.cache,
+            dedupe=args.dedupe,
+            plan_path=args.plan,
+            journal_path=args.journal,
+            resume=args.resume,
+            move_workers=args.move_workers,
+            verify=args.verify,
+            profile=args.profile,
+            metrics_path=args.metrics_json,
+            metrics_interval=args.metrics_interval,
+            adaptive_backends=args.adaptive_backends,
+            backend_stats_path=args.backend_stats,
+            device_schedule=args.device_schedule,
+            device_jobs=args.device_jobs,
+            shard_dir=args.shard_dir,
+            worker_id=args.worker_id,
+            mode=args.mode,
+            similar=args.similar,
+            similar_threshold=args.similar_threshold,
+            similar_report=args.similar_report,
+            name_dates=args.name_dates,
+        )
+    except (SourcePathError, SourceScanError) as e:
+        sys.exit(str(e))
+    except WatchUnavailableError as e:
+        sys.exit(f'--watch недоступен: {e}')
+    if result.errors:
+        sys.exit(f'{result.errors} errors, see {config.LOG_FILE}')
 
 
 if __name__ == '__main__':
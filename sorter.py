@@ -1,76 +1,712 @@
 import logging
 import os
-import sys
+import queue
+import threading
+import time
+from collections import deque
+from functools import partial
+from typing import Iterable
 
 from tqdm import tqdm
 
 import config
-from exif_utils import get_exif
+from backend_utils import BACKEND_STATS
+from cache_utils import ExifCache
+from exif_utils import exif_executor, iter_exif
 from fs_utils import (
+    MODE_MOVE,
+    MOVE_WORKERS,
+    FolderCleaner,
+    FolderIndex,
+    MoveEngine,
     duples_in_folder,
     make_files_list,
     make_new_folder,
+    make_sidecar_index,
     move_files,
-    remove_folder,
+    walk_folders,
 )
+from hash_utils import ContentIndex
+from journal_utils import MoveJournal, read_journal
 from language_utils import path_contains_cyrillic
+from metrics_utils import METRICS, SNAPSHOT_SECONDS, MetricsReporter, format_summary
+from plan_utils import VERDICT_DUPLICATE, VERDICT_MOVE, ManifestWriter
+from progress_utils import PROGRESS_EVERY, PROGRESS_INTERVAL, ProgressThrottle, SortProgress
+from scheduler_utils import DEVICE_JOBS, DeviceScheduler
+from shard_utils import DestinationLocks, WorkClaims
+from similar_utils import HASH_EXTENSIONS, SIMILAR_THRESHOLD, SimilarIndex
+from watch_utils import DEBOUNCE_SECONDS, SIDECAR_WAIT_SECONDS, InotifyWatcher
 
+SCAN_QUEUE_SIZE = 10000
+REPORT_FOLDERS = 10  # not emptied source folders printed at the end
 
-def sort_files(source_path=None, result_path=None):
+
+class SourcePathError(ValueError):
+    """Source path can't be sorted (see language_utils.path_contains_cyrillic)."""
+
+
+class SourceScanError(OSError):
+    """Source folder can't be listed or the scan failed, files found before are sorted."""
+
+
+class SourceScanner(threading.Thread):
     """
-    Sort files with SUPPORTED_EXTENSIONS by creation date and
-    put them to directories Year/Month/Day by exif Date.
+    Scan source folder in background and put (path, file, sidecars) to a bounded queue.
+    Entries of each folder are counted in 'cleaner' before its files are queued.
+    Folders that can't be listed are kept in 'failed_folders', 'error' is set when
+    the source folder itself can't be listed or the scan fails.
+    """
+
+    def __init__(self, source_path: str, queue_size: int = SCAN_QUEUE_SIZE, cleaner: FolderCleaner | None = None):
+        super().__init__(name='source-scanner', daemon=True)
+        self.source_path = source_path
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.cleaner = cleaner
+        self.scanned = 0
+        self.error: Exception | None = None
+        self.failed_folders: list[tuple[str, OSError]] = []
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        try:
+            folders = walk_folders(self.source_path, on_error=self._folder_failed)
+            while True:
+                with METRICS.timer('scan'):
+                    entry = next(folders, None)
+                if entry is None:
+                    break
+                path, folder_names, folder_files = entry
+                if self.cleaner is not None:
+                    self.cleaner.add_folder(path, len(folder_names) + len(folder_files))
+
+                sidecars = make_sidecar_index(folder_files)
+                for file in folder_files:
+                    if file.lower().endswith(config.SUPPORTED_EXTENSIONS):
+                        if not self._put((path, file, sidecars)):
+                            return
+                        self.scanned += 1
+        except Exception as e:  # noqa: BLE001
+            logging.exception(f"can't scan {self.source_path} error: {e}")
+            self.error = e
+        finally:
+            self._put(None)
+
+    def _folder_failed(self, path: str, error: OSError) -> None:
+        if path == self.source_path:
+            self.error = error
+        else:
+            self.failed_folders.append((path, error))
+
+    def _put(self, item) -> bool:
+        """Wait for a place in the queue, return False if the scanner was stopped."""
+        while not self._stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def __iter__(self):
+        """Yield scanned items until the scan is finished."""
+        while (item := self.queue.get()) is not None:
+            yield item
+
+
+class SortRun:
+    """
+    State of one sort run: destination index, EXIF cache, dedupe and near-duplicate indexes,
+    manifest and journal.
     """
+
+    def __init__(
+        self,
+        source_path: str,
+        result_path: str,
+        index: FolderIndex,
+        jobs=1,
+        cache_path=None,
+        dedupe=False,
+        plan_path=None,
+        journal_path=None,
+        resume=False,
+        move_workers=MOVE_WORKERS,
+        verify=False,
+        adaptive_backends=False,
+        backend_stats_path=None,
+        locks: DestinationLocks | None = None,
+        cleaner: FolderCleaner | None = None,
+        mode=MODE_MOVE,
+        similar=False,
+        similar_threshold=SIMILAR_THRESHOLD,
+        name_dates=None,
+    ):
+        if similar and not cache_path:
+            # without a persistent store every photo of the result folder is decoded on every run
+            raise ValueError('similar needs cache_path to keep image hashes of sorted photos')
+        self.source_path = source_path
+        self.result_path = result_path
+        self.index = index
+        self.jobs = jobs
+        self.name_dates = name_dates
+        self.extracted = 0
+        self.moved = 0
+        self.duplicates = 0
+        self.errors = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+
+        self.cache = ExifCache(cache_path) if cache_path else None
+        self.manifest = ManifestWriter(plan_path, source_path, result_path) if plan_path else None
+        self.completed: set[str] = set()
+        if journal_path and resume:
+            done, skipped = read_journal(journal_path)
+            self.completed = set(done) | skipped
+            print(f'Resume: {len(self.completed)} files are already processed')
+        self.journal = None
+        if journal_path and not plan_path:
+            self.journal = MoveJournal(journal_path, source_path, result_path, mode=mode)
+        self.content = None
+        if dedupe:
+            self.content = ContentIndex()
+            self.content.add_tree(result_path)
+        self.backend_stats_path = backend_stats_path
+        BACKEND_STATS.reset(adaptive_backends)
+        if backend_stats_path:
+            BACKEND_STATS.load(backend_stats_path)
+        # one pool of EXIF processes for the run (the watch daemon sorts many batches)
+        self.executor = exif_executor(jobs)
+        # image hashes are read by EXIF workers only when they are needed
+        self.image_hash = bool(similar)
+        self.similar = None
+        if similar:
+            self.similar = SimilarIndex(similar_threshold)
+            self._add_similar_tree(result_path)
+        self.locks = locks
+        self.cleaner = cleaner
+        self.engine = None
+        if not index.dry_run:
+            # with other workers a file must be in place before the destination lock is released
+            self.engine = MoveEngine(workers=move_workers, verify=verify, mode=mode, sync=locks is not None)
+
+    def _add_similar_tree(self, top: str) -> None:
+        """Add image hashes of already sorted photos, unchanged files are taken from the EXIF cache."""
+        file_paths = (
+            os.path.join(path, name)
+            for path, folder_names, folder_files in walk_folders(top)
+            for name in folder_files
+            if name.lower().endswith(HASH_EXTENSIONS)
+        )
+        for file_exif in iter_exif(
+            file_paths, jobs=self.jobs, cache=self.cache, image_hash=True, executor=self.executor
+        ):
+            if file_exif.image_hash is not None:
+                self.similar.add(file_exif.file_path, file_exif.image_hash)
+        print(f'Similar: {len(self.similar)} sorted photos indexed, {self.similar.found} similar')
+
+    def sort_items(
+        self, items: Iterable[tuple[str, str, dict]], on_file=None, stop_event: threading.Event | None = None
+    ) -> None:
+        """
+        Extract EXIF of (path, file, sidecars) items and move files in items order,
+        'on_file(path, file)' is called after each file. Stops when 'stop_event' is set.
+        """
+        in_flight: deque = deque()
+
+        def file_paths():
+            for item in items:
+                file_path = os.path.join(item[0], item[1])
+                if file_path in self.completed:
+                    continue
+                in_flight.append(item)
+                yield file_path
+
+        exifs = iter_exif(
+            file_paths(),
+            jobs=self.jobs,
+            cache=self.cache,
+            name_dates=self.name_dates,
+            image_hash=self.image_hash,
+            executor=self.executor,
+        )
+        try:
+            while stop_event is None or not stop_event.is_set():
+                with METRICS.timer('extract'):
+                    file_exif = next(exifs, None)
+                if file_exif is None:
+                    break
+                path, file, sidecars = in_flight.popleft()
+                self.extracted += 1
+                try:
+                    self.sort_file(path=path, file=file, sidecars=sidecars, file_exif=file_exif)
+                except OSError as e:
+                    # removed or renamed since it was found (the watch daemon keeps running)
+                    logging.error(f"can't sort {os.path.join(path, file)} error: {e}")
+                    self.errors += 1
+                if on_file is not None:
+                    on_file(path, file)
+        finally:
+            # batches already sent to EXIF processes are finished by close()
+            exifs.close()
+
+    def sort_file(self, path: str, file: str, sidecars: dict, file_exif) -> bool:
+        """Move file with its setting files to the result folder, return True if moved."""
+        index, manifest, journal, content = self.index, self.manifest, self.journal, self.content
+        files = make_files_list(file=file, path=path, sidecars=sidecars)
+        file_path = os.path.join(path, file)
+        if content is not None:
+            with METRICS.timer('dedupe'):
+                same_file_path = content.find(file_path, file_exif.size)
+            if same_file_path:
+                self.duplicates += 1
+                logging.info(f'DUPLICATE: {path} ({files}) same content as {same_file_path}')
+                if manifest is not None:
+                    manifest.write(path, files, None, VERDICT_DUPLICATE, same_as=same_file_path)
+                if journal is not None:
+                    journal.skip(file_path, f'same content as {same_file_path}')
+                return False
+
+        with METRICS.timer('destination'):
+            new_path = file_exif.make_new_path(path=self.result_path, index=index)
+
+        if self.locks is None:
+            return self._place_file(path, file, files, file_exif, new_path)
+        with self.locks.lock(new_path):
+            # other workers may have moved files to the folder since it was listed
+            index.forget(new_path)
+            index.forget(os.path.join(new_path, os.path.splitext(file)[0]))
+            return self._place_file(path, file, files, file_exif, new_path)
+
+    def _place_file(self, path: str, file: str, files: list[str], file_exif, new_path: str) -> bool:
+        """Check duplicates in the destination folder and move files there."""
+        index, manifest, journal, content = self.index, self.manifest, self.journal, self.content
+        file_path = os.path.join(path, file)
+        with METRICS.timer('duplicates'):
+            new_path, skip = duples_in_folder(
+                new_path=new_path,
+                file=file,
+                file_exif=file_exif,
+                index=index,
+                name_dates=self.name_dates,
+                engine=self.engine,
+            )
+        if skip:
+            self.duplicates += 1
+            logging.info(f'DUPLICATE: {path} ({files}) already in {new_path}')
+            if manifest is not None:
+                manifest.write(path, files, new_path, VERDICT_DUPLICATE)
+            if journal is not None:
+                journal.skip(file_path, f'already in {new_path}')
+            return False
+
+        if not move_files(
+            files=files,
+            path=path,
+            new_path=new_path,
+            index=index,
+            journal=journal,
+            engine=self.engine,
+            cleaner=self.cleaner,
+            on_placed=partial(self._placed, int(file_exif.size or 0)),
+        ):
+            self.errors += 1
+            return False
+
+        if manifest is not None:
+            manifest.write(path, files, new_path, VERDICT_MOVE)
+        else:
+            logging.info(f'Moved: {path} ({files}) -> {new_path}')
+        if content is not None:
+            # planned files stay in source until the manifest is executed
+            moved_path = file_path if index.dry_run else os.path.join(new_path, file)
+            content.add(moved_path, file_exif.size, previous_path=file_path)
+        if self.similar is not None and file_exif.image_hash is not None:
+            moved_path = file_path if index.dry_run else os.path.join(new_path, file)
+            with METRICS.timer('similar'):
+                match = self.similar.add(moved_path, file_exif.image_hash)
+            if match is not None:
+                logging.info(f'SIMILAR: {moved_path} to {match[0]} (distance {match[1]})')
+        return True
+
+    def _placed(self, size: int) -> None:
+        """The file is in place (called by copy threads of the engine)."""
+        with self._lock:
+            self.moved += 1
+            self.bytes += size
+
+    def counters(self) -> dict:
+        """Run counters for metrics summary."""
+        elapsed = time.monotonic() - self.started
+        counters = {
+            'extracted': self.extracted,
+            'moved': self.moved,
+            'duplicates': self.duplicates,
+            'errors': self.errors_count(),
+            'files_per_sec': round(self.extracted / elapsed, 1) if elapsed else None,
+        }
+        if self.engine is not None:
+            counters['bytes_copied'] = self.engine.bytes_copied
+            if self.engine.mode != MODE_MOVE:
+                counters['linked'] = self.engine.linked
+                counters['fallbacks'] = self.engine.fallbacks
+        if self.similar is not None:
+            counters['similar'] = self.similar.found
+        if self.cache is not None:
+            counters['cache_hits'] = self.cache.hits
+            counters['cache_misses'] = self.cache.misses
+        return counters
+
+    def errors_count(self) -> int:
+        """Failed moves, including cross-device copies failed in the engine threads."""
+        return self.errors + (self.engine.errors if self.engine is not None else 0)
+
+    def progress(self, scanned: int = 0, finished: bool = False, cancelled: bool = False) -> SortProgress:
+        return SortProgress(
+            scanned=scanned,
+            extracted=self.extracted,
+            moved=self.moved,
+            duplicates=self.duplicates,
+            errors=self.errors_count(),
+            bytes=self.bytes,
+            elapsed=time.monotonic() - self.started,
+            finished=finished,
+            cancelled=cancelled,
+        )
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+        if self.engine is not None:
+            self.engine.close()
+        if self.locks is not None:
+            self.locks.close()
+        if self.backend_stats_path:
+            BACKEND_STATS.save(self.backend_stats_path)
+        if self.cache is not None:
+            self.cache.close()
+        if self.manifest is not None:
+            self.manifest.close()
+        if self.journal is not None:
+            self.journal.close()
+
+
+def _prepare_paths(source_path, result_path, index: FolderIndex) -> tuple[str, str]:
+    """Absolute source and result paths (default are SOURCE_FOLDER and RESULT_FOLDER)."""
     current_path = os.path.abspath(os.curdir)
     if source_path is None:
         source_path = os.path.join(current_path, config.SOURCE_FOLDER)
     source_path = os.path.abspath(source_path)
 
     if result_path is None:
-        result_path = make_new_folder(path=current_path, folder_name=config.RESULT_FOLDER)
+        result_path = make_new_folder(path=current_path, folder_name=config.RESULT_FOLDER, index=index)
     else:
         result_path = os.path.abspath(result_path)
-        os.makedirs(result_path, exist_ok=True)
+        if not index.dry_run:
+            os.makedirs(result_path, exist_ok=True)
+
+    if path_contains_cyrillic(source_path, source_path):
+        raise SourcePathError(f'Path contains invalid symbols {source_path}')
+
+    return source_path, result_path
 
+
+def _start_metrics(profile: bool, metrics_path, metrics_interval, counters) -> MetricsReporter | None:
+    """Enable METRICS, with 'metrics_interval' write snapshots to 'metrics_path' periodically."""
+    if not profile and not metrics_path:
+        return None
+    METRICS.enable()
+    if not metrics_path:
+        return None
+    reporter = MetricsReporter(metrics_path, interval=metrics_interval or SNAPSHOT_SECONDS, extra=counters)
+    if metrics_interval:
+        reporter.start()
+    return reporter
+
+
+def _finish_metrics(profile: bool, reporter: MetricsReporter | None, counters) -> None:
+    """Write the final metrics summary, print it with 'profile' and disable METRICS."""
+    if not METRICS.enabled:
+        return
+    if reporter is not None:
+        reporter.stop()
+    if profile:
+        print(format_summary(METRICS.summary(**counters())))
+    METRICS.enable(False)
+
+
+def sort_files(
+    source_path=None,
+    result_path=None,
+    jobs=1,
+    cache_path=None,
+    dedupe=False,
+    plan_path=None,
+    journal_path=None,
+    resume=False,
+    move_workers=MOVE_WORKERS,
+    verify=False,
+    profile=False,
+    metrics_path=None,
+    metrics_interval=None,
+    adaptive_backends=False,
+    backend_stats_path=None,
+    device_schedule=False,
+    device_jobs=DEVICE_JOBS,
+    shard_dir=None,
+    worker_id=None,
+    progress=None,
+    progress_every=PROGRESS_EVERY,
+    progress_interval=PROGRESS_INTERVAL,
+    stop_event: threading.Event | None = None,
+    mode=MODE_MOVE,
+    similar=False,
+    similar_threshold=SIMILAR_THRESHOLD,
+    similar_report=None,
+    name_dates=None,
+) -> SortProgress:
+    """
+    Sort files with SUPPORTED_EXTENSIONS by creation date and
+    put them to directories Year/Month/Day by exif Date.
+    Scan, EXIF extraction and moves run as a pipeline: files are moved while the source is scanned.
+    EXIF is parsed in 'jobs' processes (0 - all CPUs), files are moved in scan order.
+    If 'cache_path' is set, EXIF of unchanged files is taken from SQLite cache.
+    If 'dedupe', files with the same content as already sorted ones are skipped.
+    If 'plan_path' is set, nothing is moved: decisions are written to the manifest
+    (see plan_utils.execute_manifest).
+    If 'journal_path' is set, moves are written to the journal; with 'resume'
+    files already moved or skipped by the journal are not processed again.
+    Cross-device moves are copied in 'move_workers' threads, with 'verify' copy size is checked.
+    With 'profile' stage and backend metrics are printed at the end, with 'metrics_path'
+    they are written as JSON (every 'metrics_interval' seconds if it is set).
+    With 'adaptive_backends' EXIF library backends are ordered by hit rates of the run
+    (a file's date may then depend on the files before it, see backend_utils.BackendStats),
+    hit rates are loaded from and saved to 'backend_stats_path'.
+    With 'device_schedule' files are read grouped by device in inode order, headers are
+    prefetched by 'device_jobs' threads per device (EXIF is still read in one ordered stream).
+    With 'shard_dir' (shared by workers) several processes sort one source: each claims
+    units of files there and locks destination folders (see shard_utils).
+    Files are placed by 'mode' (fs_utils.MODES): moved, copied, hardlinked or reflinked;
+    in 'move' mode source folders are removed as soon as all their entries are moved.
+    With 'similar' near-duplicate photos (resized, re-compressed, edited) of the run and of the
+    result folder are grouped by image hash within 'similar_threshold' bits (see similar_utils),
+    groups are written to 'similar_report' as JSON lines; hashes of sorted photos are kept
+    in the EXIF cache, so 'similar' needs 'cache_path'.
+    Dates and screenshot flags are taken from file names by 'name_dates' mode (see exif_utils.iter_exif).
+    'progress(SortProgress)' is called every 'progress_every' files or 'progress_interval'
+    seconds and once at the end. The run stops after the current file when 'stop_event' is set.
+    Return the final counters (folders that can't be listed are counted as errors),
+    SourcePathError is raised for an invalid source path, SourceScanError if the source
+    folder can't be listed or the scan fails.
+    """
+    index = FolderIndex(dry_run=plan_path is not None)
+    source_path, result_path = _prepare_paths(source_path, result_path, index)
     print(f'Поиск файлов в {source_path}')
+    cleaner = FolderCleaner(source_path) if plan_path is None and mode == MODE_MOVE else None
 
-    if path_contains_cyrillic(source_path, source_path):
-        print(f'Path contains invalid symbols {source_path}')
-        sys.exit()
+    run = SortRun(
+        source_path,
+        result_path,
+        index,
+        jobs=jobs,
+        cache_path=cache_path,
+        dedupe=dedupe,
+        plan_path=plan_path,
+        journal_path=journal_path,
+        resume=resume,
+        move_workers=move_workers,
+        verify=verify,
+        adaptive_backends=adaptive_backends,
+        backend_stats_path=backend_stats_path,
+        locks=DestinationLocks(shard_dir, worker_id) if shard_dir else None,
+        cleaner=cleaner,
+        mode=mode,
+        similar=similar,
+        similar_threshold=similar_threshold,
+        name_dates=name_dates,
+    )
+    scanner = SourceScanner(source_path, cleaner=cleaner)
+    scheduler = DeviceScheduler(device_jobs=device_jobs) if device_schedule else None
+    claims = WorkClaims(shard_dir, source_path, worker_id) if shard_dir else None
 
-    folders: list[str] = []
-    files_with_path: list[tuple[str, str]] = []
+    def counters() -> dict:
+        counters = {'scanned': scanner.scanned, **run.counters()}
+        if scheduler is not None:
+            counters['devices'] = scheduler.device_stats()
+        if claims is not None:
+            counters['claimed_units'] = claims.claimed
+        return counters
 
-    for path, _, folder_files in os.walk(top=source_path, topdown=False):
-        if path != source_path:
-            folders.append(path)
+    def snapshot() -> SortProgress:
+        return run.progress(scanner.scanned)
 
-        for file in folder_files:
-            if file.lower().endswith(config.SUPPORTED_EXTENSIONS):
-                files_with_path.append((path, file))
+    throttle = ProgressThrottle(progress, snapshot, progress_every, progress_interval) if progress else None
+    reporter = _start_metrics(profile, metrics_path, metrics_interval, counters)
+    scanner.start()
+    bar = tqdm(desc='sort files', unit=' files', ncols=100)
 
-    print(f'{len(files_with_path)} files found')
+    def on_file(path: str, file: str):
+        if scheduler is not None:
+            scheduler.done(path, file)
+        if claims is not None:
+            claims.done(path, file)
+        if throttle is not None:
+            throttle.tick()
+        bar.update()
+        if run.extracted % PROGRESS_EVERY == 0:
+            bar.set_postfix(scanned=scanner.scanned, extracted=run.extracted, moved=run.moved, refresh=False)
 
-    for path, file in tqdm(files_with_path, desc='move files', ncols=100):
-        file_path = os.path.join(path, file)
+    try:
+        items = scanner if claims is None else claims.claim_items(scanner)
+        run.sort_items(items if scheduler is None else scheduler.schedule(items), on_file=on_file, stop_event=stop_event)
+    finally:
+        scanner.stop()
+        scanner.join()
+        if scheduler is not None:
+            scheduler.close()
+        if claims is not None:
+            claims.finish()
+        bar.set_postfix(scanned=scanner.scanned, extracted=run.extracted, moved=run.moved)
+        bar.close()
+        run.close()
+        _finish_metrics(profile, reporter, counters)
 
-        files = make_files_list(file=file, path=path)
-        file_exif = get_exif(file_path=file_path)
-        new_path = file_exif.make_new_path(path=result_path)
+    if scanner.error is not None:
+        raise SourceScanError(f"can't scan {source_path}: {scanner.error}") from scanner.error
+    # files of folders that can't be listed are not sorted
+    run.errors += len(scanner.failed_folders)
+    cancelled = stop_event is not None and stop_event.is_set()
+    result = run.progress(scanner.scanned, finished=True, cancelled=cancelled)
+    if progress is not None:
+        progress(result)
+    if cancelled:
+        print(f'Stopped: {run.extracted} of {scanner.scanned} found files processed')
 
-        new_path, skip = duples_in_folder(new_path=new_path, file=file, file_exif=file_exif)
-        if skip:
-            logging.info(f'DUPLICATE: {path} ({files}) already in {new_path}')
-            continue
+    if run.similar is not None:
+        _report_similar(run.similar, similar_report)
+    if plan_path is not None:
+        print(f'{scanner.scanned} files found, {run.moved} planned to move, manifest: {plan_path}')
+        _report_failed_folders(scanner.failed_folders)
+        return result
 
-        if move_files(files=files, path=path, new_path=new_path):
-            logging.info(f'Moved: {path} ({files}) -> {new_path}')
+    print(f'{scanner.scanned} files found, {run.moved} {"moved" if mode == MODE_MOVE else f"placed by {mode}"}')
+    _report_failed_folders(scanner.failed_folders)
+    if scheduler is not None:
+        for name, stats in scheduler.device_stats().items():
+            print(f"device {name}: {stats['files']} files, {stats['files_per_sec']} files/s, {stats['mb_per_sec']} MB/s")
+
+    if cleaner is None:
+        return result
+    if shard_dir:
+        # files of other workers are not counted here
+        cleaner.sweep()
+    _report_folders(cleaner)
+    return result
+
+
+def _report_failed_folders(failed_folders: list[tuple[str, OSError]]) -> None:
+    """Print source folders that can't be listed (their files are not sorted)."""
+    if not failed_folders:
+        return
+    print(f"{len(failed_folders)} source folders can't be scanned, their files are not sorted")
+    for path, error in failed_folders[:REPORT_FOLDERS]:
+        print(f'  {path}: {error.strerror or error}')
+    if len(failed_folders) > REPORT_FOLDERS:
+        print(f'  ... {len(failed_folders) - REPORT_FOLDERS} more in {config.LOG_FILE}')
+
+
+def _report_similar(similar: SimilarIndex, report_path) -> None:
+    """Print near-duplicate groups count, write groups to 'report_path'."""
+    if report_path:
+        groups = similar.write_report(report_path)
+        print(f'{similar.found} similar photos in {groups} groups, report: {report_path}')
+    else:
+        print(f'{similar.found} similar photos in {len(similar.groups())} groups, see {config.LOG_FILE}')
+
+
+def _report_folders(cleaner: FolderCleaner) -> None:
+    """Print removed and not emptied source folders, the full list goes to the log."""
+    not_empty = cleaner.not_empty()
+    print(f'{cleaner.removed} source folders removed, {len(not_empty)} not empty')
+    for path, remaining in not_empty[:REPORT_FOLDERS]:
+        print(f'  {path}: {remaining} entries left')
+    if len(not_empty) > REPORT_FOLDERS:
+        print(f'  ... {len(not_empty) - REPORT_FOLDERS} more in {config.LOG_FILE}')
+    for path, remaining in not_empty:
+        logging.info(f'not empty: {path} ({remaining} entries left)')
+
+
+def watch_files(
+    source_path=None,
+    result_path=None,
+    jobs=1,
+    cache_path=None,
+    dedupe=False,
+    journal_path=None,
+    move_workers=MOVE_WORKERS,
+    verify=False,
+    profile=False,
+    metrics_path=None,
+    metrics_interval=None,
+    adaptive_backends=False,
+    backend_stats_path=None,
+    debounce=DEBOUNCE_SECONDS,
+    sidecar_wait=SIDECAR_WAIT_SECONDS,
+    stop_event: threading.Event | None = None,
+    mode=MODE_MOVE,
+    similar=False,
+    similar_threshold=SIMILAR_THRESHOLD,
+    similar_report=None,
+    name_dates=None,
+):
+    """
+    Sort files as they arrive to the source folder (Linux inotify) until
+    'stop_event' is set or the process is interrupted. Files already in
+    the source are sorted first. Source folders are not removed.
+    Files are placed by 'mode' as in sort_files, near-duplicates and 'name_dates' are as in sort_files.
+    Metrics are printed at the end with 'profile', with 'metrics_path' they are
+    written as JSON every 'metrics_interval' seconds.
+    """
+    index = FolderIndex()
+    source_path, result_path = _prepare_paths(source_path, result_path, index)
+    print(f'Ожидание файлов в {source_path}')
 
-    not_removed_paths: list[str] = []
-    for path in tqdm(sorted(set(folders), key=len, reverse=True), desc='remove folders:', ncols=100):
-        if not remove_folder(path):
-            not_removed_paths.append(path)
+    run = SortRun(
+        source_path,
+        result_path,
+        index,
+        jobs=jobs,
+        cache_path=cache_path,
+        dedupe=dedupe,
+        journal_path=journal_path,
+        move_workers=move_workers,
+        verify=verify,
+        adaptive_backends=adaptive_backends,
+        backend_stats_path=backend_stats_path,
+        mode=mode,
+        similar=similar,
+        similar_threshold=similar_threshold,
+        name_dates=name_dates,
+    )
+    reporter = _start_metrics(profile, metrics_path, metrics_interval or SNAPSHOT_SECONDS, run.counters)
+    try:
+        with InotifyWatcher(source_path, debounce=debounce, sidecar_wait=sidecar_wait) as watcher:
+            while stop_event is None or not stop_event.is_set():
+                items = watcher.poll(timeout=0.5)
+                if items:
+                    run.sort_items(items)
+                    logging.info(f'watch: {len(items)} files processed, {run.moved} moved in total')
+                    if run.journal is not None:
+                        run.journal.sync()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        run.close()
+        _finish_metrics(profile, reporter, run.counters)
 
-    if not_removed_paths:
-        not_removed_paths = ',\n'.join(not_removed_paths)
-        print(f'The following folders are not empty:\n{not_removed_paths}')
+    print(f'{run.extracted} files processed, {run.moved} moved')
+    if run.similar is not None:
+        _report_similar(run.similar, similar_report)
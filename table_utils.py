@@ -0,0 +1,58 @@
+"""Compact table of file paths for runs over millions of files."""
+import os
+from array import array
+from typing import Iterator
+
+
+class FileTable:
+    """
+    Files as rows of (folder id, name): folder paths are interned (each is stored once),
+    names are kept as bytes in one shared buffer. A file is referred to by its row number.
+    A row takes 12 bytes plus the name, a (path, name) tuple of strings takes about 150.
+    """
+
+    def __init__(self):
+        self.folders: list[str] = []
+        self._folder_ids: dict[str, int] = {}
+        self._folder = array('I')
+        self._end = array('Q')  # end offsets of names in the buffer
+        self._names = bytearray()
+
+    def __len__(self) -> int:
+        return len(self._folder)
+
+    def __iter__(self) -> Iterator[tuple[str, str]]:
+        """Yield (folder, name) of rows."""
+        for row in range(len(self._folder)):
+            yield self.folder(row), self.name(row)
+
+    def folder_id(self, path: str) -> int:
+        folder_id = self._folder_ids.get(path)
+        if folder_id is None:
+            folder_id = self._folder_ids[path] = len(self.folders)
+            self.folders.append(path)
+        return folder_id
+
+    def add(self, path: str, name: str) -> int:
+        """Add file 'name' of folder 'path', return its row."""
+        self._folder.append(self.folder_id(path))
+        # surrogateescape keeps undecodable names as they are on disk
+        self._names += name.encode('utf-8', 'surrogateescape')
+        self._end.append(len(self._names))
+        return len(self._folder) - 1
+
+    def add_path(self, file_path: str) -> int:
+        return self.add(*os.path.split(file_path))
+
+    def folder(self, row: int) -> str:
+        return self.folders[self._folder[row]]
+
+    def row_folder_id(self, row: int) -> int:
+        return self._folder[row]
+
+    def name(self, row: int) -> str:
+        start = self._end[row - 1] if row else 0
+        return self._names[start:self._end[row]].decode('utf-8', 'surrogateescape')
+
+    def path(self, row: int) -> str:
+        return os.path.join(self.folder(row), self.name(row))
@@ -0,0 +1,59 @@
+import io
+
+from PIL import Image
+
+import backend_utils
+import exif_utils
+from backend_utils import BackendStats
+
+
+def test_order_by_hit_rate_and_skip_useless(monkeypatch):
+    monkeypatch.setattr(backend_utils, 'EXPLORE_EVERY', 1000)
+    stats = BackendStats(adaptive=True)
+    key = stats.key('.PNG', 3000)
+    names = ['pil', 'exifread', 'piexif']
+    assert stats.order(key, names) == names
+
+    for _ in range(60):
+        stats.record(key, 'pil', False)
+        stats.record(key, 'exifread', True)
+    assert stats.order(key, names) == ['exifread', 'piexif']
+    # other sizes are not affected
+    assert stats.order(stats.key('.png', 30_000_000), names) == names
+
+    # default order unless adaptive ordering is asked for
+    fixed = BackendStats()
+    fixed.merge(stats.counts())
+    assert fixed.order(key, names) == names
+
+
+def test_save_load_and_worker_delta(tmp_path):
+    stats = BackendStats()
+    key = stats.key('.jpg', 100)
+    stats.record(key, 'pil', True)
+    assert stats.pop_delta() == {key: {'pil': [1, 1]}}
+    assert stats.pop_delta() == {}
+
+    path = str(tmp_path / 'stats.json')
+    stats.save(path)
+    loaded = BackendStats()
+    loaded.load(path)
+    assert loaded.counts() == stats.counts()
+    assert loaded.to_dict()['stats'][0]['backends']['pil']['hit_rate'] == 1.0
+
+
+def test_fallback_records_backend_hits(tmp_path, monkeypatch):
+    stats = BackendStats()
+    monkeypatch.setattr(exif_utils, 'BACKEND_STATS', stats)
+    exif = Image.Exif()
+    exif[0x0132] = '2020:05:04 10:00:00'
+    buffer = io.BytesIO()
+    Image.new('RGB', (16, 16)).save(buffer, 'PNG', exif=exif)
+    file_path = tmp_path / 'image.png'
+    file_path.write_bytes(buffer.getvalue())
+
+    exifdata = exif_utils.get_exif(str(file_path))
+
+    assert exifdata.date is not None
+    key = stats.key('.png', exifdata.size)
+    assert stats.counts()[key]['pil'] == [1, 1]
@@ -0,0 +1,35 @@
+import json
+import os
+
+import config
+from benchmarks import bench_memory, bench_stages
+from benchmarks.corpus import make_corpus
+
+
+def test_corpus_and_stage_report(tmp_path):
+    source_dir = tmp_path / 'source'
+    counts = make_corpus(str(source_dir), files=200, depth=3, files_per_folder=20, seed=1)
+    assert sum(counts[kind] for kind in ('jpeg', 'png_screenshot', 'no_exif', 'video', 'duplicate')) == 200
+    assert counts['duplicate'] and counts['sidecar']
+
+    found = [file for _, _, files in os.walk(source_dir) for file in files]
+    assert sum(file.lower().endswith(config.SUPPORTED_EXTENSIONS) for file in found) == 200
+    assert any(file.endswith('.AAE') for file in found)
+
+    output = tmp_path / 'result.json'
+    bench_stages.main(['--corpus', str(source_dir), '--sample', '20', '--output', str(output)])
+    results = json.loads(output.read_text())
+    assert results['files'] == 200
+    assert {'scan', 'exif:native', 'get_exif', 'make_timestamp', 'make_new_path', 'duplicates', 'move'} <= set(results['stages'])
+    assert results['stages']['dedupe']['found'] == counts['duplicate']
+    assert results['stages']['move']['moved'] == 200
+    # the given corpus is not changed
+    assert sorted(file for _, _, files in os.walk(source_dir) for file in files) == sorted(found)
+
+    assert bench_stages.compare(results, results, tolerance=0.2) == []
+
+
+def test_memory_report():
+    results = bench_memory.measure(2000)
+    assert results['file_table']['bytes_per_file'] < results['tuples']['bytes_per_file'] / 2
+    assert all(result['bytes_per_file'] > 0 for result in results.values())
@@ -0,0 +1,57 @@
+import shutil
+from pathlib import Path
+from types import SimpleNamespace
+
+import cache_utils
+import exif_utils
+from cache_utils import ExifCache
+
+
+def test_cache_skips_unchanged_files(tmp_path, monkeypatch):
+    image = tmp_path / 'IMG_8089.JPG'
+    shutil.copy(Path(__file__).parent / 'IMG_8089.JPG', image)
+    cache_path = str(tmp_path / 'exif.sqlite')
+
+    with ExifCache(cache_path) as cache:
+        first = next(exif_utils.iter_exif([str(image)], cache=cache))
+
+    def fail(self):
+        raise AssertionError('file must not be parsed')
+
+    monkeypatch.setattr(exif_utils.ExifData, 'get_exif_tags', fail)
+    with ExifCache(cache_path) as cache:
+        second = next(exif_utils.iter_exif([str(image)], cache=cache))
+        assert cache.hits == 1
+
+    assert repr(first) == repr(second)
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    with ExifCache(str(tmp_path / 'exif.sqlite'), max_entries=2, batch_size=1) as cache:
+        for n in range(3):
+            cache.put((f'file_{n}.jpg', n, n, n), exif_utils.ExifData(file_path=f'file_{n}.jpg'))
+        count = cache.connection.execute('SELECT COUNT(*) FROM exif').fetchone()[0]
+
+    assert count == 2
+
+
+def test_cache_counts_rows_and_stamps_puts(tmp_path, monkeypatch):
+    clock = [100]
+    monkeypatch.setattr(cache_utils, 'time', SimpleNamespace(time=lambda: clock[0]))
+    cache_path = str(tmp_path / 'exif.sqlite')
+
+    def put(cache, n):
+        clock[0] += 100
+        cache.put((f'file_{n}.jpg', n, n, n), exif_utils.ExifData(file_path=f'file_{n}.jpg'))
+
+    with ExifCache(cache_path, max_entries=2, batch_size=1) as cache:
+        for n in range(3):
+            put(cache, n)
+    with ExifCache(cache_path, max_entries=2, batch_size=1) as cache:
+        assert cache._count == 2
+        # a changed file replaces its row, nothing is evicted
+        put(cache, 1)
+        put(cache, 3)
+        paths = [row[0] for row in cache.connection.execute('SELECT path FROM exif ORDER BY path')]
+
+    assert paths == ['file_1.jpg', 'file_3.jpg']
@@ -0,0 +1,75 @@
+import struct
+
+import piexif
+from PIL import Image
+
+import exif_utils
+from exif_reader import read_exif_header
+
+
+def _exif_bytes() -> bytes:
+    return piexif.dump({
+        '0th': {
+            piexif.ImageIFD.Make: b'Apple',
+            piexif.ImageIFD.Model: b'iPhone 12',
+            piexif.ImageIFD.DateTime: b'2021:05:04 10:00:00',
+        },
+        'Exif': {
+            piexif.ExifIFD.DateTimeOriginal: b'2021:05:04 09:59:58',
+            piexif.ExifIFD.PixelXDimension: 1170,
+            piexif.ExifIFD.PixelYDimension: 2532,
+            piexif.ExifIFD.UserComment: b'ASCII\x00\x00\x00Screenshot',
+        },
+    })
+
+
+def test_read_jpeg_header(tmp_path):
+    path = tmp_path / 'shot.jpg'
+    Image.new('RGB', (8, 8)).save(path, exif=_exif_bytes())
+
+    header = read_exif_header(str(path))
+
+    assert header.dates == ['2021:05:04 10:00:00', '2021:05:04 09:59:58']
+    assert (header.brand, header.model) == ('Apple', 'iPhone 12')
+    assert (header.width, header.height) == (1170, 2532)
+    assert header.is_screenshot()
+
+
+def test_read_tiff_header(tmp_path):
+    path = tmp_path / 'scan.tiff'
+    Image.new('RGB', (8, 8)).save(path, exif=_exif_bytes())
+
+    header = read_exif_header(str(path))
+
+    assert '2021:05:04 09:59:58' in header.dates
+    assert header.brand == 'Apple'
+
+
+def test_read_unsupported_header(tmp_path):
+    path = tmp_path / 'image.png'
+    Image.new('RGB', (8, 8)).save(path)
+
+    assert read_exif_header(str(path)) is None
+
+
+def test_big_segments_before_exif_fall_back_to_libraries(tmp_path):
+    path = tmp_path / 'profile.jpg'
+    Image.new('RGB', (8, 8)).save(path, exif=_exif_bytes())
+    data = path.read_bytes()
+    # ICC-like APP2 segments push APP1 past the native reader limit
+    app2 = b''.join(b'\xff\xe2' + struct.pack('>H', 60_002) + b'\x00' * 60_000 for _ in range(5))
+    path.write_bytes(data[:2] + app2 + data[2:])
+
+    assert read_exif_header(str(path)) is None
+    assert exif_utils.get_exif(str(path)).date is not None
+
+
+def test_jpeg_without_exif_falls_back_to_libraries(tmp_path, monkeypatch):
+    path = tmp_path / 'plain.jpg'
+    Image.new('RGB', (8, 8)).save(path)
+    tried = []
+    monkeypatch.setattr(exif_utils.ExifData, 'get_exif_fallback', lambda self, ext: tried.append(ext))
+
+    assert read_exif_header(str(path)) is None
+    exif_utils.get_exif(str(path))
+    assert tried == ['.jpg']
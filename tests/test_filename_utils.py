@@ -0,0 +1,71 @@
+import datetime
+import shutil
+from pathlib import Path
+
+import pytest
+
+import config
+import exif_utils
+from exif_utils import ExifData
+from filename_utils import NAME_CROSS_CHECK, NAME_FALLBACK, NAME_PRIMARY, parse_name, parse_names
+from sorter import sort_files
+
+
+def _stamp(*args) -> int:
+    return int(datetime.datetime(*args).timestamp())
+
+
+@pytest.mark.parametrize(
+    'name, expected',
+    [
+        ('IMG_20190312_143501.jpg', (_stamp(2019, 3, 12, 14, 35, 1), False)),
+        ('VID-20200101-WA0003.mp4', (_stamp(2020, 1, 1), False)),
+        ('PXL_20210504_102030123.jpg', (_stamp(2021, 5, 4, 10, 20, 30), False)),
+        ('WhatsApp Image 2021-05-04 at 10.20.30.jpeg', (_stamp(2021, 5, 4, 10, 20, 30), False)),
+        ('20190312_143501.jpg', (_stamp(2019, 3, 12, 14, 35, 1), False)),
+        ('IMG_20190312_996612.jpg', (_stamp(2019, 3, 12), False)),
+        ('Screenshot_2021-05-04-10-20-30-123_com.app.png', (_stamp(2021, 5, 4, 10, 20, 30), True)),
+        ('Screen Shot 2021-05-04 at 1.20.30 PM.png', (_stamp(2021, 5, 4, 13, 20, 30), True)),
+        ('Screenshot (3).png', (None, True)),
+        ('IMG_8089.JPG', None),
+        ('IMG_20191332_000000.jpg', None),
+        ('20190312.jpg', None),
+        ('invoice_20190312_101010.jpg', None),
+        ('Holiday_20190312_143501.jpg', None),
+        ('20190312_996612.jpg', None),
+    ],
+)
+def test_parse_name(name, expected):
+    assert parse_name(name) == expected
+
+
+def test_apply_name_date_modes():
+    name_date = parse_name('IMG_20190312_143501.jpg')
+    exif_date = _stamp(2019, 3, 20)
+
+    for mode, expected in ((NAME_PRIMARY, name_date[0]), (NAME_FALLBACK, exif_date), (NAME_CROSS_CHECK, exif_date)):
+        exifdata = ExifData(file_path='IMG_20190312_143501.jpg', date=exif_date)
+        exifdata.apply_name_date(name_date, mode)
+        assert exifdata.date == expected
+
+    exifdata = ExifData(file_path='Screenshot (3).png')
+    exifdata.apply_name_date(*parse_names(['Screenshot (3).png']), NAME_FALLBACK)
+    assert exifdata.is_screenshot is True and exifdata.date is None
+
+
+def test_sort_files_name_dates_primary_does_not_open_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+    source_dir, result_dir = tmp_path / 'source', tmp_path / 'result'
+    source_dir.mkdir()
+    fixture = Path(__file__).parent / '1cde9h.jpg'
+    shutil.copy(fixture, source_dir / 'IMG_20190312_143501.jpg')
+    shutil.copy(fixture, source_dir / 'Screenshot_20210504-102030.jpg')
+
+    def read_file(self):
+        raise AssertionError(f'{self.file_path} is opened')
+
+    monkeypatch.setattr(exif_utils.ExifData, 'get_exif_tags', read_file)
+    sort_files(source_path=str(source_dir), result_path=str(result_dir), name_dates=NAME_PRIMARY)
+
+    assert (result_dir / '2019' / '3' / '12' / 'IMG_20190312_143501.jpg').exists()
+    assert (result_dir / config.SCREENSHOTS_FOLDER / 'Screenshot_20210504-102030.jpg').exists()
@@ -0,0 +1,202 @@
+import errno
+import os
+import shutil
+import time
+from pathlib import Path
+
+import fs_utils
+from exif_utils import get_exif
+
+
+def test_folder_index_lists_folder_once(tmp_path, monkeypatch):
+    source_dir = tmp_path / 'source'
+    result_dir = tmp_path / 'result'
+    source_dir.mkdir()
+    result_dir.mkdir()
+    (result_dir / 'EXIST.JPG').write_bytes(b'x')
+    for n in range(3):
+        (source_dir / f'{n}.jpg').write_bytes(b'x')
+
+    calls = []
+    listdir = os.listdir
+    monkeypatch.setattr(os, 'listdir', lambda path: calls.append(path) or listdir(path))
+
+    index = fs_utils.FolderIndex()
+    day_path = fs_utils.make_new_folder(path=str(result_dir), folder_name=1, index=index)
+    for n in range(3):
+        assert fs_utils.move_files(files=[f'{n}.jpg'], path=str(source_dir), new_path=day_path, index=index)
+        assert fs_utils.is_file_in_folder(file=f'{n}.JPG', path=day_path, index=index)
+
+    assert fs_utils.is_file_in_folder(file='exist.jpg', path=str(result_dir), index=index)
+    assert calls == [str(result_dir)]
+
+
+def _cross_device(monkeypatch):
+    """Source files are on another device: they are copied, the copies are linked into place."""
+    link = os.link
+
+    def cross_device_link(src, dst):
+        if not src.endswith('.part'):
+            raise OSError(errno.EXDEV, 'Invalid cross-device link')
+        link(src, dst)
+
+    monkeypatch.setattr(os, 'link', cross_device_link)
+
+
+def test_move_engine_copies_across_devices(tmp_path, monkeypatch):
+    source_dir = tmp_path / 'source'
+    result_dir = tmp_path / 'result'
+    source_dir.mkdir()
+    result_dir.mkdir()
+    for n in range(5):
+        (source_dir / f'{n}.jpg').write_bytes(bytes([n]) * 1000)
+
+    _cross_device(monkeypatch)
+
+    done = []
+    with fs_utils.MoveEngine(workers=2, verify=True) as engine:
+        for n in range(5):
+            assert fs_utils.move_files(files=[f'{n}.jpg'], path=str(source_dir), new_path=str(result_dir), engine=engine)
+        engine.move(str(source_dir / 'missing.jpg'), str(result_dir / 'missing.jpg'), on_done=lambda: done.append(1))
+
+    assert engine.bytes_copied == 5000
+    assert engine.errors == 1
+    assert not done
+    assert os.listdir(source_dir) == []
+    assert sorted(os.listdir(result_dir)) == [f'{n}.jpg' for n in range(5)]
+    assert (result_dir / '3.jpg').read_bytes() == bytes([3]) * 1000
+
+
+def test_pending_copy_meets_file_with_same_name(tmp_path, monkeypatch):
+    fixture = Path(__file__).parent / 'IMG_8089.JPG'
+    for folder in ('a', 'b', 'c'):
+        (tmp_path / folder).mkdir()
+        shutil.copy(fixture, tmp_path / folder / fixture.name)
+    result_dir = tmp_path / 'result'
+    result_dir.mkdir()
+
+    copy_file = fs_utils.copy_file
+
+    def slow_copy(src, dst):
+        time.sleep(0.2)
+        if os.path.dirname(src) == str(tmp_path / 'c'):
+            raise OSError(errno.EIO, 'Input/output error')
+        return copy_file(src, dst)
+
+    _cross_device(monkeypatch)
+    monkeypatch.setattr(fs_utils, 'copy_file', slow_copy)
+    index = fs_utils.FolderIndex()
+    placed = []
+    with fs_utils.MoveEngine(workers=2) as engine:
+        # the same photo: skipped after the copy of the first one is in place
+        for folder in ('a', 'b'):
+            new_path, skip = fs_utils.duples_in_folder(
+                str(result_dir), fixture.name, get_exif(str(tmp_path / folder / fixture.name)), index, engine=engine
+            )
+            if not skip:
+                fs_utils.move_files(
+                    [fixture.name], str(tmp_path / folder), new_path, index, engine=engine,
+                    on_placed=lambda: placed.append(1),
+                )
+        # the second file waited for the copy of the first one
+        assert skip and placed == [1]
+
+        # a failed copy frees the name
+        (result_dir / fixture.name).unlink()
+        index.forget(str(result_dir))
+        fs_utils.move_files([fixture.name], str(tmp_path / 'c'), str(result_dir), index, engine=engine)
+        new_path, skip = fs_utils.duples_in_folder(
+            str(result_dir), fixture.name, get_exif(str(tmp_path / 'b' / fixture.name)), index, engine=engine
+        )
+        assert new_path == str(result_dir) and not skip
+        assert not index.contains(str(result_dir), fixture.name)
+    assert engine.errors == 1
+
+
+def test_move_keeps_file_written_after_listing(tmp_path, monkeypatch):
+    source_dir = tmp_path / 'source'
+    result_dir = tmp_path / 'result'
+    source_dir.mkdir()
+    result_dir.mkdir()
+    names = ['same.jpg', 'other.jpg', 'fat.jpg']
+    for name in names:
+        (source_dir / name).write_bytes(b'ours')
+    index = fs_utils.FolderIndex()
+    assert not index.names(str(result_dir))
+    # another process writes the names after the folder was listed
+    for name in names:
+        (result_dir / name).write_bytes(b'theirs')
+
+    with fs_utils.MoveEngine() as engine:
+        assert not fs_utils.move_files(['same.jpg'], str(source_dir), str(result_dir), index, engine=engine)
+    assert index.contains(str(result_dir), 'same.jpg')
+
+    with monkeypatch.context() as patch:
+        _cross_device(patch)
+        with fs_utils.MoveEngine() as engine:
+            fs_utils.move_files(['other.jpg'], str(source_dir), str(result_dir), index, engine=engine)
+        assert engine.errors == 1
+
+    def no_links(src, dst):
+        raise OSError(errno.EPERM, 'Operation not permitted')
+
+    monkeypatch.setattr(os, 'link', no_links)
+    with fs_utils.MoveEngine() as engine:
+        assert not fs_utils.move_files(['fat.jpg'], str(source_dir), str(result_dir), index, engine=engine)
+
+    assert sorted(os.listdir(source_dir)) == sorted(names)
+    assert sorted(os.listdir(result_dir)) == sorted(names)
+    assert all((result_dir / name).read_bytes() == b'theirs' for name in names)
+
+
+def test_folder_cleaner_removes_emptied_folders(tmp_path):
+    source_dir = tmp_path / 'source'
+    result_dir = tmp_path / 'result'
+    (source_dir / 'a' / 'b').mkdir(parents=True)
+    (source_dir / 'c').mkdir()
+    (source_dir / 'd').mkdir()
+    result_dir.mkdir()
+    (source_dir / 'a' / 'b' / '1.jpg').write_bytes(b'x')
+    (source_dir / 'c' / '2.jpg').write_bytes(b'x')
+    (source_dir / 'c' / 'notes.txt').write_bytes(b'x')
+
+    cleaner = fs_utils.FolderCleaner(str(source_dir))
+    for path, folder_names, folder_files in os.walk(source_dir):
+        cleaner.add_folder(path, len(folder_names) + len(folder_files))
+    assert not (source_dir / 'd').exists()
+
+    for path, file in (('a/b', '1.jpg'), ('c', '2.jpg')):
+        assert fs_utils.move_files(files=[file], path=str(source_dir / path), new_path=str(result_dir), cleaner=cleaner)
+
+    assert os.listdir(source_dir) == ['c']
+    assert cleaner.removed == 3
+    assert cleaner.not_empty() == [(str(source_dir / 'c'), 1)]
+
+
+def test_move_engine_link_and_reflink_keep_source(tmp_path, monkeypatch):
+    source_dir = tmp_path / 'source'
+    source_dir.mkdir()
+    (source_dir / 'a.jpg').write_bytes(b'a' * 100)
+    (source_dir / 'b.jpg').write_bytes(b'b' * 100)
+
+    link_dir = tmp_path / 'link'
+    link_dir.mkdir()
+    with fs_utils.MoveEngine(mode=fs_utils.MODE_LINK) as engine:
+        assert fs_utils.move_files(files=['a.jpg'], path=str(source_dir), new_path=str(link_dir), engine=engine)
+    assert engine.linked == 1
+    assert os.path.samefile(source_dir / 'a.jpg', link_dir / 'a.jpg')
+
+    def ioctl(fd, request, arg):
+        raise OSError(errno.EOPNOTSUPP, 'Operation not supported')
+
+    monkeypatch.setattr(fs_utils.fcntl, 'ioctl', ioctl)
+    reflink_dir = tmp_path / 'reflink'
+    reflink_dir.mkdir()
+    done = []
+    with fs_utils.MoveEngine(mode=fs_utils.MODE_REFLINK) as engine:
+        engine.move(str(source_dir / 'b.jpg'), str(reflink_dir / 'b.jpg'), on_done=lambda: done.append(1))
+    # not supported by the file system: copied
+    assert (engine.linked, engine.fallbacks, engine.bytes_copied, done) == (0, 1, 100, [1])
+    assert (reflink_dir / 'b.jpg').read_bytes() == b'b' * 100
+    assert sorted(os.listdir(source_dir)) == ['a.jpg', 'b.jpg']
+    assert os.listdir(reflink_dir) == ['b.jpg']
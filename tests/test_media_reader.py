@@ -0,0 +1,52 @@
+import struct
+
+from media_reader import MP4_EPOCH_OFFSET, read_media_dates
+from timestamp_utils import make_timestamp
+
+
+def _box(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>L4s', 8 + len(data), kind) + data
+
+
+def test_read_mp4_dates(tmp_path):
+    mvhd = _box(b'mvhd', b'\x00\x00\x00\x00' + struct.pack('>L', 1368720283 + MP4_EPOCH_OFFSET) + b'\x00' * 92)
+    key = b'com.apple.quicktime.creationdate'
+    keys = _box(b'keys', b'\x00' * 4 + struct.pack('>L', 1) + struct.pack('>L4s', 8 + len(key), b'mdta') + key)
+    data = _box(b'data', b'\x00\x00\x00\x01' + b'\x00' * 4 + b'2019-03-12T14:35:01+0300')
+    ilst = _box(b'ilst', _box(struct.pack('>L', 1), data))
+    moov = _box(b'moov', mvhd + _box(b'meta', _box(b'hdlr', b'\x00' * 24) + keys + ilst))
+    path = tmp_path / 'clip.mov'
+    path.write_bytes(_box(b'ftyp', b'qt  \x00\x00\x00\x00') + _box(b'mdat', b'\x00' * 4096) + moov)
+
+    assert read_media_dates(str(path)) == [1368720283, make_timestamp('2019-03-12 14:35:01')]
+
+
+def test_read_mp4_broken_keys(tmp_path):
+    mvhd = _box(b'mvhd', b'\x00\x00\x00\x00' + struct.pack('>L', 1368720283 + MP4_EPOCH_OFFSET) + b'\x00' * 92)
+    # key size 0 (below its 8-byte header) must not read the rest of the file
+    keys = _box(b'keys', b'\x00' * 4 + struct.pack('>L', 2) + struct.pack('>L4s', 0, b'mdta') + b'\x00' * 8)
+    moov = _box(b'moov', mvhd + _box(b'meta', _box(b'hdlr', b'\x00' * 24) + keys))
+    path = tmp_path / 'clip.mov'
+    path.write_bytes(_box(b'ftyp', b'qt  \x00\x00\x00\x00') + moov + _box(b'mdat', b'\x00' * 4096))
+
+    assert read_media_dates(str(path)) == [1368720283]
+
+
+def test_read_avi_idit(tmp_path):
+    idit = b'IDIT' + struct.pack('<L', 26) + b'THU OCT 22 13:04:37 2009\n\x00'
+    hdrl = b'LIST' + struct.pack('<L', 4 + len(idit)) + b'hdrl' + idit
+    movi = b'LIST' + struct.pack('<L', 4 + 1000) + b'movi' + b'\x00' * 1000
+    body = b'AVI ' + hdrl + movi
+    path = tmp_path / 'clip.avi'
+    path.write_bytes(b'RIFF' + struct.pack('<L', len(body)) + body)
+
+    assert read_media_dates(str(path)) == [make_timestamp('2009:10:22 13:04:37')]
+
+
+def test_read_mp3_id3(tmp_path):
+    text = b'\x03' + b'2020-01-01T10:20:30'
+    frame = b'TDRC' + bytes((0, 0, 0, len(text))) + b'\x00\x00' + text
+    path = tmp_path / 'song.mp3'
+    path.write_bytes(b'ID3\x04\x00\x00' + bytes((0, 0, 0, len(frame) + 10)) + frame + b'\x00' * 10 + b'\xff\xfb')
+
+    assert read_media_dates(str(path)) == [make_timestamp('2020-01-01T10:20:30')]
@@ -0,0 +1,35 @@
+from metrics_utils import Histogram, Metrics
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for _ in range(90):
+        histogram.add(0.000_010)
+    for _ in range(10):
+        histogram.add(0.010)
+
+    assert histogram.count == 100
+    assert histogram.percentile(0.5) <= 0.000_016
+    assert 0.008 <= histogram.percentile(0.95) <= 0.010
+    assert histogram.percentile(1.0) == 0.010
+
+
+def test_metrics_merge_and_disabled():
+    metrics = Metrics()
+    metrics.count('files')
+    with metrics.timer('exif.pil'):
+        pass
+    assert metrics.snapshot() == {'counters': {}, 'histograms': {}}
+
+    worker = Metrics()
+    worker.enable()
+    with worker.timer('exif.pil'):
+        pass
+    worker.count('exif.pil.date')
+
+    metrics.enable()
+    metrics.merge(worker.pop())
+    summary = metrics.summary(moved=1)
+    assert summary['moved'] == 1
+    assert summary['backends']['pil'] == {'calls': 1, 'dates': 1, 'hit_rate': 1.0}
+    assert worker.snapshot() == {'counters': {}, 'histograms': {}}
@@ -0,0 +1,68 @@
+import os
+
+import scheduler_utils
+from scheduler_utils import DeviceScheduler
+
+
+def test_schedule_groups_devices_by_inode(monkeypatch):
+    # files a* are on device 1, b* on device 2, inodes are reversed to scan order
+    items = [(f'/{disk}', f'{disk}{n}.jpg', {}) for n in range(4) for disk in 'ab']
+    inodes = {'/a': (1, {}), '/b': (2, {})}
+    for n, (path, file, _) in enumerate(items):
+        inodes[path][1][file] = 100 - n
+    listed = []
+    monkeypatch.setattr(scheduler_utils, 'folder_inodes', lambda path: listed.append(path) or inodes[path])
+    prefetched = []
+
+    def prefetch(file_paths, sizes):
+        prefetched.extend(file_paths)
+        sizes.update(dict.fromkeys(file_paths, 10))
+
+    monkeypatch.setattr(scheduler_utils, 'prefetch_headers', prefetch)
+    monkeypatch.setattr(scheduler_utils, 'device_name', str)
+
+    scheduler = DeviceScheduler(window=100, chunk=2)
+    ordered = [file for _, file, _ in scheduler.schedule(items)]
+    # close() cancels queued prefetches, let them finish first
+    for pool in scheduler._pools.values():
+        pool.shutdown(wait=True)
+    scheduler.close()
+
+    assert ordered == ['a3.jpg', 'a2.jpg', 'b3.jpg', 'b2.jpg', 'a1.jpg', 'a0.jpg', 'b1.jpg', 'b0.jpg']
+    # one listing per folder, not a stat per file
+    assert sorted(listed) == ['/a', '/b']
+    assert sorted(prefetched) == sorted(os.path.join(path, file) for path, file, _ in items)
+
+    for file in ordered[:3]:
+        scheduler.done(f'/{file[0]}', file)
+    devices = scheduler.device_stats()
+    assert devices['1']['files'] == 2 and devices['1']['bytes'] == 20
+    assert devices['2']['files'] == 1
+
+
+def test_schedule_lists_big_folder_once(monkeypatch):
+    items = [('/a', f'{n}.jpg', {}) for n in range(5)]
+    listed = []
+    monkeypatch.setattr(scheduler_utils, 'folder_inodes', lambda path: listed.append(path) or (1, {}))
+    monkeypatch.setattr(scheduler_utils, 'prefetch_headers', lambda file_paths, sizes: None)
+
+    scheduler = DeviceScheduler(window=2)
+    assert list(scheduler.schedule(items)) == items
+    scheduler.close()
+    assert listed == ['/a']
+
+
+def test_folder_inodes(tmp_path):
+    (tmp_path / 'IMG.jpg').write_bytes(b'x')
+    dev, inodes = scheduler_utils.folder_inodes(str(tmp_path))
+    assert dev == os.stat(tmp_path).st_dev
+    assert inodes == {'IMG.jpg': os.stat(tmp_path / 'IMG.jpg').st_ino}
+    assert scheduler_utils.folder_inodes(str(tmp_path / 'missing')) == (-1, {})
+
+
+def test_prefetch_headers_skips_missing_files(tmp_path):
+    file_path = tmp_path / 'IMG.jpg'
+    file_path.write_bytes(b'x' * 100)
+    sizes = {}
+    scheduler_utils.prefetch_headers([str(file_path), str(tmp_path / 'missing.jpg')], sizes=sizes)
+    assert sizes == {str(file_path): 100}
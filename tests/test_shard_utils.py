@@ -0,0 +1,127 @@
+import io
+import multiprocessing
+import os
+import time
+
+import pytest
+from PIL import Image
+
+import config
+import shard_utils
+from shard_utils import SHARD_BUCKETS, DestinationLocks, WorkClaims
+from sorter import sort_files
+
+
+def _write_jpeg(file_path, model: str, date: str, color: int) -> None:
+    exif = Image.Exif()
+    exif[0x0110] = model
+    exif[0x0132] = date
+    buffer = io.BytesIO()
+    Image.new('RGB', (16, 16), (color, 0, 0)).save(buffer, 'JPEG', exif=exif)
+    file_path.write_bytes(buffer.getvalue())
+
+
+def _sort_worker(source_dir: str, result_dir: str, shard_dir: str, worker_id: str) -> None:
+    config.GROUP_NO_EXIF = True
+    sort_files(source_path=source_dir, result_path=result_dir, shard_dir=shard_dir, worker_id=worker_id)
+
+
+def test_claims_are_exclusive(tmp_path):
+    items = [(str(tmp_path / 'a'), f'{n}.jpg', {}) for n in range(40)]
+    first = WorkClaims(str(tmp_path / 'shard'), str(tmp_path), worker_id='first', buckets=4)
+    second = WorkClaims(str(tmp_path / 'shard'), str(tmp_path), worker_id='second', buckets=4)
+
+    first_items = first.claim_items(items)
+    taken = [next(first_items)]
+    rest = list(second.claim_items(items))
+    # other units of the folder are claimed by the second worker
+    taken += list(first_items)
+    assert first.claimed == 1 and second.claimed == 3
+    assert sorted(taken + rest) == sorted(items)
+
+    for _, file, _ in taken:
+        first.done(str(tmp_path / 'a'), file)
+    # done units are not claimed again, even after the claim is released
+    third = WorkClaims(str(tmp_path / 'shard'), str(tmp_path), worker_id='third', buckets=4)
+    assert not {file for _, file, _ in third.claim_items(items)} & {file for _, file, _ in taken}
+
+
+def test_late_worker_claims_only_unprocessed_files(tmp_path):
+    folder = str(tmp_path / 'a')
+    files = [f'IMG_{n:04d}.JPG' for n in range(SHARD_BUCKETS * 20)]
+    shard_dir = str(tmp_path / 'shard')
+    early = WorkClaims(shard_dir, str(tmp_path), worker_id='early')
+    claimed = iter(early.claim_items((folder, file, {}) for file in files))
+    processed = set()
+    # the first unit is done and its files are moved, the second one is in progress
+    for _, file, _ in claimed:
+        processed.add(file)
+        early.done(folder, file)
+        if early.claimed == 2:
+            break
+    in_progress = {file for (_, file), unit in early._units.items()} | {file}
+    processed.discard(file)
+
+    # the late worker lists the folder without the moved files
+    late = WorkClaims(shard_dir, str(tmp_path), worker_id='late')
+    late_files = {file for _, file, _ in late.claim_items((folder, file, {}) for file in files if file not in processed)}
+    assert late_files == set(files) - processed - in_progress
+
+
+def test_next_run_sees_new_files(tmp_path):
+    folder = str(tmp_path / 'a')
+    shard_dir = str(tmp_path / 'shard')
+    worker = WorkClaims(shard_dir, str(tmp_path), worker_id='night1')
+    for _, file, _ in list(worker.claim_items([(folder, 'IMG_0001.JPG', {})])):
+        worker.done(folder, file)
+    worker.finish()
+
+    worker = WorkClaims(shard_dir, str(tmp_path), worker_id='night2')
+    items = [(folder, 'IMG_0001.JPG', {}), (folder, 'IMG_9999.JPG', {})]
+    assert list(worker.claim_items(items)) == items
+
+
+def test_destination_lock_is_kept_and_removed_only_by_owner(tmp_path):
+    locks = DestinationLocks(str(tmp_path / 'shard'), worker_id='slow', stale_seconds=0.2)
+    with locks.lock('/result/2020/5/4'):
+        # a copy longer than stale_seconds: the lock is touched, nobody takes it over
+        time.sleep(0.5)
+        lock_path, = (tmp_path / 'shard' / 'locks').iterdir()
+        assert not shard_utils._take_over_stale(str(lock_path), 0.2, 'other')
+        # taken over anyway (clock skew): this worker does not remove the other's lock
+        lock_path.write_text('other')
+    locks.close()
+    assert lock_path.read_text() == 'other'
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='needs fork')
+def test_sharded_workers_sort_every_file_once(tmp_path):
+    source_dir = tmp_path / 'source'
+    result_dir = tmp_path / 'result'
+    shard_dir = tmp_path / 'shard'
+    # folders 2k and 2k+1 have files with the same names and dates but other content,
+    # so workers race for the same destination names
+    for folder in range(8):
+        folder_dir = source_dir / f'folder{folder}'
+        folder_dir.mkdir(parents=True)
+        for n in range(10):
+            _write_jpeg(folder_dir / f'IMG_{folder // 2}{n:02d}.jpg', f'Camera {folder}', '2020:05:04 10:00:00', n * 20)
+    result_dir.mkdir()
+
+    context = multiprocessing.get_context('fork')
+    workers = [
+        context.Process(target=_sort_worker, args=(str(source_dir), str(result_dir), str(shard_dir), f'worker{n}'))
+        for n in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    sorted_files = [file for _, _, files in os.walk(result_dir) for file in files]
+    assert len(sorted_files) == 80
+    assert not [file for _, _, files in os.walk(source_dir) for file in files]
+    # the last worker clears the run
+    assert os.listdir(shard_dir / 'done') == [] and os.listdir(shard_dir / 'claims') == []
+    assert os.listdir(shard_dir / 'workers') == [] and os.listdir(shard_dir / 'locks') == []
@@ -0,0 +1,111 @@
+import json
+import os
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+
+import config
+import exif_utils
+from similar_utils import HashIndex, SimilarIndex, hamming, image_hash
+from sorter import sort_files
+
+
+def _make_image(path, seed: int, size=(640, 480)) -> None:
+    rng = random.Random(seed)
+    image = Image.new('RGB', size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        draw.ellipse((x, y, x + size[0] // 3, y + size[1] // 3), fill=color)
+    image.save(path, quality=95)
+
+
+def test_image_hash_of_resized_copy(tmp_path):
+    original, copy, other = tmp_path / 'original.jpg', tmp_path / 'copy.jpg', tmp_path / 'other.jpg'
+    _make_image(original, seed=1)
+    _make_image(other, seed=2)
+    with Image.open(original) as image:
+        image.resize((320, 240)).save(copy, quality=40)
+
+    assert hamming(image_hash(original), image_hash(copy)) <= 6
+    assert hamming(image_hash(original), image_hash(other)) > 6
+
+
+def test_hash_index_matches_brute_force():
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(64) - (1 << 63) for _ in range(2000)]
+    # near copies: a few flipped bits
+    hashes += [value ^ (1 << rng.randrange(63)) ^ (1 << rng.randrange(63)) for value in hashes[:200]]
+    index = HashIndex(threshold=6)
+    for value in hashes:
+        index.add(value)
+
+    for value in hashes[:300]:
+        expected = sorted((hamming(value, other), row) for row, other in enumerate(hashes) if hamming(value, other) <= 6)
+        assert index.search(value) == expected
+    assert index.candidates < 300 * len(hashes) // 10
+
+
+def test_similar_index_groups(tmp_path):
+    similar = SimilarIndex(threshold=2)
+    assert similar.add('/a/1.jpg', 0b1111) is None
+    assert similar.add('/b/2.jpg', 0b0111) == ('/a/1.jpg', 1)
+    assert similar.add('/c/3.jpg', -1) is None
+    assert similar.add('/d/4.jpg', 0b0011) == ('/b/2.jpg', 1)
+
+    assert similar.groups() == [['/a/1.jpg', '/b/2.jpg', '/d/4.jpg']]
+    report = tmp_path / 'similar.jsonl'
+    assert similar.write_report(str(report)) == 1
+    assert json.loads(report.read_text(encoding='utf-8')) == {'files': ['/a/1.jpg', '/b/2.jpg', '/d/4.jpg']}
+
+
+def test_sort_files_similar_report(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+    source_dir, result_dir = tmp_path / 'source', tmp_path / 'result'
+    (result_dir / config.NO_EXIF_FOLDER).mkdir(parents=True)
+    source_dir.mkdir()
+    _make_image(result_dir / config.NO_EXIF_FOLDER / 'sorted.jpg', seed=1)
+    _make_image(source_dir / 'other.jpg', seed=2)
+    with Image.open(result_dir / config.NO_EXIF_FOLDER / 'sorted.jpg') as image:
+        image.resize((320, 240)).save(source_dir / 'messenger.jpg', quality=40)
+    report = tmp_path / 'similar.jsonl'
+
+    result = sort_files(
+        source_path=str(source_dir), result_path=str(result_dir), cache_path=str(tmp_path / 'cache.sqlite'),
+        similar=True, similar_report=str(report),
+    )
+
+    assert result.moved == 2
+    groups = [json.loads(line)['files'] for line in report.read_text(encoding='utf-8').splitlines()]
+    assert groups == [[
+        str(result_dir / config.NO_EXIF_FOLDER / 'sorted.jpg'),
+        str(result_dir / config.NO_EXIF_FOLDER / 'messenger.jpg'),
+    ]]
+
+
+def test_sort_files_similar_hashes_sorted_photos_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+    source_dir, result_dir = tmp_path / 'source', tmp_path / 'result'
+    (result_dir / config.NO_EXIF_FOLDER).mkdir(parents=True)
+    source_dir.mkdir()
+    for n in range(3):
+        _make_image(result_dir / config.NO_EXIF_FOLDER / f'sorted{n}.jpg', seed=n)
+    hashed = []
+    monkeypatch.setattr(exif_utils, 'image_hash', lambda path: hashed.append(path) or image_hash(path))
+    cache_path = str(tmp_path / 'cache.sqlite')
+
+    sort_files(source_path=str(source_dir), result_path=str(result_dir), cache_path=cache_path, similar=True)
+    assert len(hashed) == 3
+    # next run takes hashes of sorted photos from the cache
+    _make_image(source_dir / 'new.jpg', seed=10)
+    sort_files(source_path=str(source_dir), result_path=str(result_dir), cache_path=cache_path, similar=True)
+    assert [os.path.basename(path) for path in hashed[3:]] == ['new.jpg']
+    # a run without similar does not hash photos
+    _make_image(source_dir / 'plain.jpg', seed=11)
+    sort_files(source_path=str(source_dir), result_path=str(result_dir), cache_path=cache_path)
+    assert len(hashed) == 4
+
+    with pytest.raises(ValueError):
+        sort_files(source_path=str(source_dir), result_path=str(result_dir), similar=True)
@@ -3,6 +3,7 @@ import pytest
 
 import timestamp_utils
 import exif_utils
+import language_utils
 
 
 @pytest.fixture(scope="function", params=[
@@ -36,6 +37,12 @@ def test_organize_photos_make_timestamp(test_timestamp):
     assert date_stamp == expected_output
 
 
+def test_make_timestamps_matches_make_timestamp():
+    values = ['2013:05:16 19:04:43', '2016-06-05T21:06:76', '2013:05:16 19:04:43', '2013:02:30 10:00:00', None]
+    expected = [timestamp_utils.parse_timestamp(value) if value else None for value in values]
+    assert timestamp_utils.make_timestamps(values) == expected
+
+
 # def test_media_sort():
 #     sort_files.sort_files()
 
@@ -72,3 +79,13 @@ def _find_case_insensitive(path: str):
     except FileNotFoundError:
         return None
     return None
+
+
+@pytest.mark.parametrize('path, source_path, expected', [
+    (os.path.join('photos', 'Отпуск'), None, True),
+    (os.path.join('photos', 'summer'), None, False),
+    (os.path.join('Фото', 'summer'), 'Фото', False),
+    (os.path.join('Фото', 'Лето'), 'Фото', True),
+])
+def test_path_contains_cyrillic(path, source_path, expected):
+    assert language_utils.path_contains_cyrillic(path, source_path) is expected
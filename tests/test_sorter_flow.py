@@ -1,8 +1,21 @@
+import json
+import os
 import shutil
+import threading
+import time
 from pathlib import Path
 
+import pytest
+
 import config
-from sorter import sort_files
+import exif_utils
+import sort_files as sort_files_cli
+import watch_utils
+from journal_utils import read_journal, undo_journal
+from plan_utils import execute_manifest
+from fs_utils import FolderIndex
+from sorter import SortRun, SourceScanError, sort_files, watch_files
+from watch_utils import HAS_INOTIFY, InotifyWatcher
 
 
 def _copy_fixtures(target_dir: Path, filenames: list[str]) -> None:
@@ -30,3 +43,338 @@ def test_sort_files_moves_and_groups(tmp_path, monkeypatch):
 
     no_exif = result_dir / config.NO_EXIF_FOLDER / '1cde9h.jpg'
     assert no_exif.exists()
+
+
+def test_sort_files_parallel_matches_serial(tmp_path, monkeypatch):
+    filenames = ['IMG_8089.JPG', '1cde9h.jpg', 'Foto-0271_e1.jpg']
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+
+    layouts = []
+    for jobs in (1, 2):
+        source_dir = tmp_path / f'source_{jobs}'
+        result_dir = tmp_path / f'result_{jobs}'
+        _copy_fixtures(source_dir, filenames)
+
+        sort_files(source_path=str(source_dir), result_path=str(result_dir), jobs=jobs)
+
+        layouts.append(sorted(str(p.relative_to(result_dir)) for p in result_dir.rglob('*')))
+
+    assert layouts[0] == layouts[1]
+
+
+def test_sort_files_device_schedule(tmp_path, monkeypatch):
+    filenames = ['IMG_8089.JPG', '1cde9h.jpg', 'Foto-0271_e1.jpg']
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+    source_dir = tmp_path / 'source'
+    result_dir = tmp_path / 'result'
+    _copy_fixtures(source_dir, filenames)
+
+    sort_files(source_path=str(source_dir), result_path=str(result_dir), device_schedule=True)
+
+    for name in filenames:
+        assert list(result_dir.rglob(name))
+
+
+def test_sort_files_metrics_json(tmp_path, monkeypatch):
+    filenames = ['IMG_8089.JPG', '1cde9h.jpg', 'Foto-0271_e1.jpg']
+    source_dir = tmp_path / 'source'
+    metrics_path = tmp_path / 'metrics.json'
+    _copy_fixtures(source_dir, filenames)
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+
+    sort_files(
+        source_path=str(source_dir), result_path=str(tmp_path / 'result'), jobs=2, metrics_path=str(metrics_path)
+    )
+
+    metrics = json.loads(metrics_path.read_text())
+    assert metrics['scanned'] == 3 and metrics['moved'] == 3
+    assert metrics['stages']['move']['count'] == 3
+    assert metrics['stages']['extract']['count'] >= 3
+    # backends run in worker processes, their metrics are merged
+    assert metrics['backends']['native']['dates'] == 2
+    assert metrics['counters']['bytes_moved'] == sum(os.path.getsize(Path(__file__).parent / name) for name in filenames)
+
+
+def test_sort_files_progress_and_stop(tmp_path, monkeypatch):
+    filenames = ['IMG_8089.JPG', '1cde9h.jpg', 'Foto-0271_e1.jpg']
+    source_dir = tmp_path / 'source'
+    _copy_fixtures(source_dir / 'a', filenames)
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+
+    stop_event = threading.Event()
+    events = []
+
+    def progress(event):
+        events.append(event)
+        if event.moved >= 1:
+            stop_event.set()
+
+    result = sort_files(
+        source_path=str(source_dir),
+        result_path=str(tmp_path / 'result'),
+        progress=progress,
+        progress_every=1,
+        stop_event=stop_event,
+    )
+
+    assert result.cancelled and result.finished
+    assert result.moved == 1 and result.errors == 0
+    assert result.bytes == os.path.getsize(next((tmp_path / 'result').rglob('*.*')))
+    assert [event.finished for event in events] == [False, True]
+    assert len(list((source_dir / 'a').iterdir())) == 2
+
+    # the rest is sorted by the next run, the emptied folder is removed
+    result = sort_files(source_path=str(source_dir), result_path=str(tmp_path / 'result'))
+    assert result.moved == 2 and not result.cancelled
+    assert list(source_dir.iterdir()) == []
+
+
+def test_sort_files_reports_scan_errors(tmp_path, monkeypatch):
+    source_dir = tmp_path / 'source'
+    _copy_fixtures(source_dir / 'a', ['IMG_8089.JPG'])
+    _copy_fixtures(source_dir / 'locked', ['1cde9h.jpg'])
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+    scandir = os.scandir
+
+    def locked_scandir(path):
+        if os.path.basename(path) == 'locked':
+            raise PermissionError(13, 'Permission denied', path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', locked_scandir)
+    result = sort_files(source_path=str(source_dir), result_path=str(tmp_path / 'result'))
+    assert result.moved == 1 and result.errors == 1
+
+    with pytest.raises(SourceScanError):
+        sort_files(source_path=str(tmp_path / 'missing'), result_path=str(tmp_path / 'result'))
+
+
+def test_sort_files_moves_sidecars(tmp_path, monkeypatch):
+    source_dir = tmp_path / 'source'
+    result_dir = tmp_path / 'result'
+    _copy_fixtures(source_dir, ['IMG_8089.JPG'])
+    (source_dir / 'IMG_8089.AAE').write_text('<plist/>')
+    (source_dir / 'IMG_8090.AAE').write_text('<plist/>')
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+
+    sort_files(source_path=str(source_dir), result_path=str(result_dir))
+
+    moved = list(result_dir.rglob('IMG_8089.*'))
+    assert sorted(p.name for p in moved) == ['IMG_8089.AAE', 'IMG_8089.JPG']
+    assert moved[0].parent == moved[1].parent
+    assert (source_dir / 'IMG_8090.AAE').exists()
+
+
+def test_sort_files_dedupe_renamed_copies(tmp_path, monkeypatch):
+    source_dir = tmp_path / 'source'
+    result_dir = tmp_path / 'result'
+    _copy_fixtures(source_dir, ['IMG_8089.JPG'])
+    shutil.copy(source_dir / 'IMG_8089.JPG', source_dir / 'copy.jpg')
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+
+    sort_files(source_path=str(source_dir), result_path=str(result_dir), dedupe=True)
+
+    moved = [p.name for p in result_dir.rglob('*') if p.is_file()]
+    assert len(moved) == 1
+    assert (source_dir / ({'IMG_8089.JPG', 'copy.jpg'} - set(moved)).pop()).exists()
+
+
+def test_sort_files_plan_and_execute(tmp_path, monkeypatch):
+    filenames = ['IMG_8089.JPG', '1cde9h.jpg', 'Foto-0271_e1.jpg']
+    source_dir = tmp_path / 'source'
+    result_dir = tmp_path / 'result'
+    manifest = tmp_path / 'plan.jsonl'
+    _copy_fixtures(source_dir / 'day', filenames)
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+
+    sort_files(source_path=str(source_dir), result_path=str(result_dir), plan_path=str(manifest))
+
+    assert not result_dir.exists()
+    assert all((source_dir / 'day' / name).exists() for name in filenames)
+
+    assert execute_manifest(str(manifest)) == len(filenames)
+    for name in filenames:
+        assert list(result_dir.rglob(name))
+    assert not (source_dir / 'day').exists()
+
+
+def test_sort_files_journal_undo(tmp_path, monkeypatch):
+    filenames = ['IMG_8089.JPG', 'Foto-0271_e1.jpg']
+    source_dir = tmp_path / 'source'
+    result_dir = tmp_path / 'result'
+    journal = tmp_path / 'moves.jsonl'
+    _copy_fixtures(source_dir / 'day', filenames)
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+
+    sort_files(source_path=str(source_dir), result_path=str(result_dir), journal_path=str(journal))
+
+    done, skipped = read_journal(str(journal))
+    assert sorted(os.path.basename(src) for src in done) == sorted(filenames)
+
+    assert undo_journal(str(journal)) == len(filenames)
+    assert all((source_dir / 'day' / name).exists() for name in filenames)
+    assert not list(result_dir.iterdir())
+
+
+@pytest.mark.skipif(not hasattr(os, 'link'), reason='hardlinks are not supported')
+def test_sort_files_link_mode_and_undo(tmp_path, monkeypatch):
+    filenames = ['IMG_8089.JPG', '1cde9h.jpg']
+    source_dir = tmp_path / 'source'
+    result_dir = tmp_path / 'result'
+    journal_path = tmp_path / 'journal.jsonl'
+    _copy_fixtures(source_dir / 'a', filenames)
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+
+    result = sort_files(
+        source_path=str(source_dir), result_path=str(result_dir), journal_path=str(journal_path), mode='link'
+    )
+
+    assert result.moved == 2
+    for name in filenames:
+        assert os.path.samefile(source_dir / 'a' / name, next(result_dir.rglob(name)))
+
+    assert undo_journal(str(journal_path)) == 2
+    assert sorted(os.listdir(source_dir / 'a')) == sorted(filenames)
+    assert not [path for path in result_dir.rglob('*') if path.is_file()]
+
+
+def test_sort_files_copy_mode_same_names(tmp_path, monkeypatch):
+    source_dir = tmp_path / 'source'
+    result_dir = tmp_path / 'result'
+    for folder in ('a', 'b', 'c'):
+        _copy_fixtures(source_dir / folder, ['IMG_8089.JPG'])
+    # other content, the same name and date
+    with open(source_dir / 'c' / 'IMG_8089.JPG', 'ab') as f:
+        f.write(b'edited')
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+
+    result = sort_files(source_path=str(source_dir), result_path=str(result_dir), mode='copy')
+
+    assert result.moved == 2 and result.duplicates == 1 and result.errors == 0
+    placed = sorted(path.relative_to(result_dir) for path in result_dir.rglob('IMG_8089.JPG'))
+    assert len(placed) == 2 and placed[0].parent.parent == placed[1].parent
+    assert len(list(source_dir.rglob('IMG_8089.JPG'))) == 3
+
+
+def test_watch_files_sorts_new_files(tmp_path, monkeypatch):
+    source_dir = tmp_path / 'source'
+    result_dir = tmp_path / 'result'
+    source_dir.mkdir()
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+
+    stop_event = threading.Event()
+    watcher = threading.Thread(
+        target=watch_files,
+        kwargs={
+            'source_path': str(source_dir),
+            'result_path': str(result_dir),
+            'debounce': 0.1,
+            'sidecar_wait': 0.2,
+            'stop_event': stop_event,
+        },
+    )
+    watcher.start()
+    try:
+        time.sleep(0.3)
+        _copy_fixtures(source_dir / 'upload', ['IMG_8089.JPG'])
+        (source_dir / 'upload' / 'IMG_8089.AAE').write_text('<plist/>')
+
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and not list(result_dir.rglob('IMG_8089.AAE')):
+            time.sleep(0.1)
+    finally:
+        stop_event.set()
+        watcher.join()
+
+    assert list(result_dir.rglob('IMG_8089.JPG'))
+    assert list(result_dir.rglob('IMG_8089.AAE'))
+
+
+def test_watch_files_keeps_one_exif_pool(tmp_path, monkeypatch):
+    source_dir = tmp_path / 'source'
+    result_dir = tmp_path / 'result'
+    source_dir.mkdir()
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+    pools = []
+    pool_class = exif_utils.ProcessPoolExecutor
+
+    def make_pool(*args, **kwargs):
+        pools.append(kwargs)
+        return pool_class(*args, **kwargs)
+
+    monkeypatch.setattr(exif_utils, 'ProcessPoolExecutor', make_pool)
+    stop_event = threading.Event()
+    watcher = threading.Thread(
+        target=watch_files,
+        kwargs={
+            'source_path': str(source_dir),
+            'result_path': str(result_dir),
+            'jobs': 2,
+            'debounce': 0.1,
+            'sidecar_wait': 0.1,
+            'stop_event': stop_event,
+        },
+    )
+    watcher.start()
+    try:
+        # two uploads are sorted by separate flushes
+        for name in ('IMG_8089.JPG', '1cde9h.jpg'):
+            time.sleep(0.3)
+            _copy_fixtures(source_dir / 'upload', [name])
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline and (source_dir / 'upload' / name).exists():
+                time.sleep(0.1)
+    finally:
+        stop_event.set()
+        watcher.join()
+
+    assert list(result_dir.rglob('IMG_8089.JPG')) and list(result_dir.rglob('1cde9h.jpg'))
+    assert len(pools) == 1
+    # workers are not forked from a process with running threads
+    assert pools[0]['mp_context'].get_start_method() != 'fork'
+
+
+def test_cli_watch_without_inotify_exits_with_message(tmp_path, monkeypatch):
+    monkeypatch.setattr(watch_utils, 'HAS_INOTIFY', False)
+    (tmp_path / 'source').mkdir()
+
+    with pytest.raises(SystemExit) as error:
+        sort_files_cli.main(['--watch', '--source', str(tmp_path / 'source'), '--result', str(tmp_path / 'result')])
+
+    assert 'inotify' in str(error.value.code)
+
+
+def test_sort_items_counts_removed_file_as_error(tmp_path, monkeypatch):
+    source_dir = tmp_path / 'source'
+    _copy_fixtures(source_dir, ['IMG_8089.JPG'])
+    (tmp_path / 'result').mkdir()
+    monkeypatch.setattr(config, 'GROUP_NO_EXIF', True, raising=False)
+    run = SortRun(str(source_dir), str(tmp_path / 'result'), FolderIndex())
+    try:
+        # 'gone.jpg' was removed between the inotify event and extraction
+        run.sort_items([(str(source_dir), 'gone.jpg', {}), (str(source_dir), 'IMG_8089.JPG', {})])
+    finally:
+        run.close()
+
+    assert run.errors == 1 and run.moved == 1
+
+
+@pytest.mark.skipif(not HAS_INOTIFY, reason='inotify is available only on Linux')
+def test_watcher_forgets_removed_files(tmp_path):
+    with InotifyWatcher(str(tmp_path), debounce=0, sidecar_wait=0.2) as watcher:
+        with open(tmp_path / 'IMG_0001.JPG', 'wb') as f:
+            f.write(b'partial')
+            f.flush()
+            watcher.poll(timeout=0.1)
+            # removed before it was closed
+            (tmp_path / 'IMG_0001.JPG').unlink()
+            watcher.poll(timeout=0.1)
+        (tmp_path / 'IMG_0002.AAE').write_text('<plist/>')
+        watcher.poll(timeout=0.1)
+        (tmp_path / 'IMG_0002.AAE').rename(tmp_path.parent / 'IMG_0002.AAE')
+        watcher.poll(timeout=0.1)
+        assert not watcher._writing and not watcher._sidecars
+
+        # the close event of the removed file expires without an item
+        time.sleep(0.2)
+        assert watcher.poll(timeout=0.1) == [] and not watcher._pending
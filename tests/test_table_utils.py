@@ -0,0 +1,33 @@
+import os
+
+from hash_utils import ContentIndex
+from table_utils import FileTable
+
+
+def test_file_table_rows():
+    table = FileTable()
+    names = ['IMG_0001.JPG', 'Фото 2.jpg', os.fsdecode(b'bad\xff.jpg'), '']
+    rows = [table.add('/source/a', name) for name in names]
+    rows.append(table.add_path('/source/b/IMG_0002.JPG'))
+
+    assert rows == [0, 1, 2, 3, 4]
+    assert table.folders == ['/source/a', '/source/b']
+    assert [table.name(row) for row in rows[:4]] == names
+    assert table.path(4) == os.path.join('/source/b', 'IMG_0002.JPG')
+    assert list(table)[1] == ('/source/a', 'Фото 2.jpg')
+
+
+def test_content_index_keeps_hashes_of_moved_file(tmp_path, monkeypatch):
+    for name in ('a.jpg', 'b.jpg', 'c.jpg'):
+        (tmp_path / name).write_bytes(b'same')
+    calls = []
+    monkeypatch.setattr('hash_utils.partial_hash', lambda path, size: calls.append(path) or b'hash')
+
+    content = ContentIndex()
+    content.add(str(tmp_path / 'a.jpg'), 4)
+    assert content.find(str(tmp_path / 'b.jpg'), 4) == str(tmp_path / 'a.jpg')
+    content.add(str(tmp_path / 'moved_b.jpg'), 4, previous_path=str(tmp_path / 'b.jpg'))
+    assert content.find(str(tmp_path / 'c.jpg'), 4) == str(tmp_path / 'a.jpg')
+
+    assert calls == [str(tmp_path / name) for name in ('b.jpg', 'a.jpg', 'c.jpg')]
+    assert len(content) == 2
@@ -1,25 +1,67 @@
 import datetime
 import logging
 import re
+from functools import lru_cache
+from typing import Iterable
+
+DATE_START = 315522000
+DATE_PATTERN = re.compile(r'\d{4}[-:]?.\d[-:]?.\d[ T]?.{,2}:.{,2}:.{,2}')
+DASH_DATE_PATTERN = re.compile(r'\d{4}-.\d-.\d[ T]?.{,2}:.{,2}:.{,2}')
+COLON_DATE_PATTERN = re.compile(r'\d{4}:.\d:.\d[ T]?.{,2}:.{,2}:.{,2}')
+# EXIF 'YYYY:MM:DD HH:MM:SS'
+CANONICAL_DATE_PATTERN = re.compile(r'(\d{4}):(\d\d):(\d\d) (\d\d):(\d\d):(\d\d)')
 
 
 def make_timestamp(value: str):
-    """Construct timestamp from different datetime formats."""
+    """Construct timestamp from different datetime formats (results are memoized)."""
+    if not value:
+        return None
+    return _make_timestamp(value)
+
+
+def make_timestamps(values: Iterable[str]) -> list:
+    """Construct timestamps of many values, each distinct value is parsed once."""
+    values = list(values)
+    stamps = {value: make_timestamp(value) for value in set(values)}
+    return [stamps[value] for value in values]
+
+
+@lru_cache(maxsize=65536)
+def _make_timestamp(value: str):
+    """Fast path for the canonical EXIF format, other formats are parsed by parse_timestamp."""
+    match = CANONICAL_DATE_PATTERN.match(value)
+    if match:
+        yy, mm, dd, h, m, s = map(int, match.groups())
+        if yy <= 1980:
+            return None
+        if 1 <= mm <= 12 and 1 <= dd <= 31 and h <= 23 and m <= 59 and s <= 59:
+            try:
+                date_stamp = int(datetime.datetime(yy, mm, dd, h, m, s).timestamp())
+            except ValueError:
+                # wrong day of month, parse_timestamp logs it
+                return parse_timestamp(value)
+            return date_stamp if date_stamp >= DATE_START else None
+
+    return parse_timestamp(value)
+
+
+def parse_timestamp(value: str):
+    """Construct timestamp from different datetime formats (out of range values are clamped)."""
     values = []
     date_value = None
     date_stamp = None
-    date_start = 315522000
+    date_start = DATE_START
 
     splitter = None
     try:
         if value:
-            if re.match(r'\d{4}[-:]?.\d[-:]?.\d[ T]?.{,2}:.{,2}:.{,2}', value):
+            if DATE_PATTERN.match(value):
                 values.append(value[:10])
                 values.append(value[11:19])
                 values.append(value[20:])
-                if re.match(r'\d{4}-.\d-.\d[ T]?.{,2}:.{,2}:.{,2}', value):
+                if DASH_DATE_PATTERN.match(value):
                     splitter = '-'
-                elif re.match(r'\d{4}:.\d:.\d[ T]?.{,2}:.{,2}:.{,2}', value):
+                elif COLON_DATE_PATTERN.match(value):
                     splitter = ':'
 
                 if splitter:
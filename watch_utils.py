@@ -0,0 +1,180 @@
+"""Linux inotify watcher of the source folder for continuous sorting."""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+
+import config
+from fs_utils import make_sidecar_index
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+EVENT_HEADER = struct.Struct('iIII')
+DEBOUNCE_SECONDS = 2.0
+SIDECAR_WAIT_SECONDS = 5.0
+
+HAS_INOTIFY = sys.platform.startswith('linux')
+
+
+class WatchUnavailableError(OSError):
+    """inotify can't be used (not Linux or the instance limit of the user is reached)."""
+
+
+class InotifyWatcher:
+    """
+    Watch the folder tree for new files. A file is ready when it was not written
+    for 'debounce' seconds and either its setting file (.AAE, .THM) has arrived
+    or 'sidecar_wait' seconds passed since the file appeared.
+    """
+
+    def __init__(self, top: str, debounce: float = DEBOUNCE_SECONDS, sidecar_wait: float = SIDECAR_WAIT_SECONDS):
+        if not HAS_INOTIFY:
+            raise WatchUnavailableError('inotify is available only on Linux')
+        self.top = top
+        self.debounce = debounce
+        self.sidecar_wait = sidecar_wait
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise WatchUnavailableError(errno, f'inotify_init1 failed: {os.strerror(errno)}')
+
+        self._watches: dict[int, str] = {}
+        # (path, file) -> [first seen, last event]
+        self._pending: dict[tuple[str, str], list[float]] = {}
+        # (path, stem) of arrived setting files
+        self._sidecars: set[tuple[str, str]] = set()
+        self._writing: set[tuple[str, str]] = set()
+        self._add_tree(top, existing_at=0.0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def _add_watch(self, path: str) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            logging.error(f"watch: can't watch {path} error: {os.strerror(ctypes.get_errno())}")
+            return
+        self._watches[wd] = path
+
+    def _add_tree(self, top: str, existing_at: float) -> None:
+        """Watch folder tree, files already in it are pending since 'existing_at'."""
+        for path, folders, files in os.walk(top):
+            self._add_watch(path)
+            for file in files:
+                self._file_event(path, file, existing_at)
+
+    def _file_event(self, path: str, file: str, now: float) -> None:
+        stem, ext = os.path.splitext(file)
+        if ext in config.SETTING_EXTENSIONS:
+            self._sidecars.add((path, stem))
+            for key, times in self._pending.items():
+                if key[0] == path and os.path.splitext(key[1])[0] == stem:
+                    times[1] = max(times[1], now)
+        elif file.lower().endswith(config.SUPPORTED_EXTENSIONS):
+            times = self._pending.setdefault((path, file), [now, now])
+            times[1] = max(times[1], now)
+
+    def _file_removed(self, path: str, file: str) -> None:
+        """Forget a file removed or moved away (maybe before it was closed)."""
+        self._writing.discard((path, file))
+        self._pending.pop((path, file), None)
+        stem, ext = os.path.splitext(file)
+        if ext in config.SETTING_EXTENSIONS:
+            self._sidecars.discard((path, stem))
+
+    def _read_events(self, timeout: float) -> None:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        now = time.monotonic()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\x00')
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                logging.warning(f'watch: event queue overflow, rescan {self.top}')
+                self._add_tree(self.top, existing_at=now)
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            path = self._watches.get(wd)
+            if path is None or not name:
+                continue
+
+            file = os.fsdecode(name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # files may be written before the watch is added
+                    self._add_tree(os.path.join(path, file), existing_at=now)
+            elif mask & (IN_CREATE | IN_MODIFY):
+                self._writing.add((path, file))
+                if (path, file) in self._pending:
+                    self._pending[(path, file)][1] = now
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._writing.discard((path, file))
+                self._file_event(path, file, now)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._file_removed(path, file)
+
+    def poll(self, timeout: float = 1.0) -> list[tuple[str, str, dict]]:
+        """Wait for events up to 'timeout', return ready (path, file, sidecars) items."""
+        self._read_events(timeout)
+
+        now = time.monotonic()
+        ready = []
+        for (path, file), (first_seen, last_event) in list(self._pending.items()):
+            if (path, file) in self._writing or now - last_event < self.debounce:
+                continue
+            stem = os.path.splitext(file)[0]
+            if (path, stem) not in self._sidecars and now - first_seen < self.sidecar_wait:
+                continue
+            del self._pending[(path, file)]
+            ready.append((path, file))
+
+        if not ready:
+            return []
+
+        items = []
+        listings: dict[str, dict] = {}
+        for path, file in sorted(ready):
+            if path not in listings:
+                try:
+                    listings[path] = make_sidecar_index(os.listdir(path))
+                except OSError as e:
+                    logging.error(f"watch: can't list {path} error: {e}")
+                    listings[path] = {}
+            if os.path.exists(os.path.join(path, file)):
+                items.append((path, file, listings[path]))
+            self._sidecars.discard((path, os.path.splitext(file)[0]))
+        return items